@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+autotune_ddp.py
+
+Tune DDP's bucket size, gradient_as_bucket_view and static_graph options for
+one emulated network profile, then persist the winner so later train.py runs
+(--tuned_config/--net_profile, or run_fat_tree.py --tuned_config) start with it.
+
+Each trial launches train.py on every rank for a short, bounded window
+(--max_steps) and reads back the steady-state step time rank 0 prints after
+its warm-up steps. Two search strategies:
+  grid     every configuration once, with the full trial window
+  halving  successive halving: all configurations on a short window, keep
+           the fastest half, double the window, repeat until one is left
+
+Example:
+  sudo python3 autotune_ddp.py --k 2 --core-bw 10mbit \
+      --bucket-mb 1,5,10,25,50 --search halving
+"""
+
+import argparse
+import itertools
+import json
+import os
+import re
+import time
+from mininet.net      import Mininet
+from mininet.node     import OVSKernelSwitch, RemoteController
+from mininet.link     import TCLink
+from fat_tree         import make_topo
+from run_sim_fat_tree import apply_core_rate, apply_netem
+from readiness        import wait_for_fabric
+
+TRAIN_PY = "/home/mininet/train.py"
+PYTHON   = "/home/mininet/torch-env/bin/python"
+STEP_RE  = re.compile(r"STEP_TIME mean_s=([0-9.]+) median_s=([0-9.]+) steps=([0-9]+)")
+
+def profile_key(k, core_bw=None, netem_args=None, topo=None):
+    """
+    Identify an emulated network setting; used as the key in the tuning file.
+    Fabrics other than the default fat-tree (--topo) are part of the key.
+    """
+    key = f"k={k},core_bw={core_bw or 'unlimited'},netem={netem_args or 'none'}"
+    return f"topo={topo},{key}" if topo else key
+
+def search_space(bucket_mbs, views, statics):
+    return [{'bucket_cap_mb': b, 'gradient_as_bucket_view': v, 'static_graph': g}
+            for b, v, g in itertools.product(bucket_mbs, views, statics)]
+
+def config_flags(cfg):
+    flags = f"--bucket_cap_mb {cfg['bucket_cap_mb']} "
+    if cfg['gradient_as_bucket_view']:
+        flags += "--gradient_as_bucket_view "
+    if cfg['static_graph']:
+        flags += "--static_graph "
+    return flags
+
+def run_trial(hosts, cfg, steps, warmup, port, args):
+    """Run one bounded train.py window on `hosts`; return rank 0's median step time."""
+    master_ip = hosts[0].IP()
+    procs = []
+    for rank, host in enumerate(hosts):
+        cmd = (f"{PYTHON} {TRAIN_PY} --rank {rank} --world_size {len(hosts)} "
+               f"--master_addr {master_ip} --master_port {port} "
+               f"--epochs 1000 --batch_size {args.batch_size} "
+               f"--data_mode {args.data_mode} --model {args.model} "
+               f"--max_steps {steps + warmup} --warmup_steps {warmup} "
+               f"{config_flags(cfg)}")
+        procs.append(host.popen(cmd, shell=True))
+    deadline = time.time() + args.trial_timeout
+    outputs = []
+    for proc in procs:
+        try:
+            out, _ = proc.communicate(timeout=max(1.0, deadline - time.time()))
+        except Exception:
+            proc.kill()
+            out, _ = proc.communicate()
+        outputs.append(out.decode(errors='replace') if isinstance(out, bytes) else (out or ''))
+    m = STEP_RE.search(outputs[0])
+    if not m:
+        print(f"WARNING: no STEP_TIME from rank 0 for {cfg}")
+        return None
+    return float(m.group(2))
+
+def grid_search(trial, space, steps):
+    results = []
+    for cfg in space:
+        results.append((trial(cfg, steps), cfg, steps))
+    return results
+
+def successive_halving(trial, space, steps):
+    """Keep the faster half each round while doubling the trial window."""
+    results = []
+    survivors = list(space)
+    rounds, n = 0, len(space)
+    while n > 1:
+        rounds, n = rounds + 1, n // 2
+    # Size the first window so the final round runs the full `steps`
+    window = max(1, steps // (2 ** max(0, rounds - 1)))
+    while survivors:
+        scored = []
+        for cfg in survivors:
+            t = trial(cfg, window)
+            results.append((t, cfg, window))
+            if t is not None:
+                scored.append((t, cfg))
+        scored.sort(key=lambda x: x[0])
+        if len(scored) <= 1:
+            break
+        survivors = [cfg for _, cfg in scored[:max(1, len(scored) // 2)]]
+        if len(survivors) == 1:
+            break
+        window *= 2
+    return results
+
+def save_winner(path, key, winner, step_time, results):
+    tuned = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            tuned = json.load(f)
+    tuned[key] = {
+        'config': winner,
+        'step_time_s': step_time,
+        'tuned_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'trials': [{'config': c, 'steps': s, 'step_time_s': t} for t, c, s in results],
+    }
+    with open(path, 'w') as f:
+        json.dump(tuned, f, indent=2)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--k',             type=int,   default=2)
+    p.add_argument('--topo',          type=str,   default=None,
+                   help='Fabric from fat_tree.topos, e.g. leafspine,leaves=8,oversub=3 (default: fat-tree)')
+    p.add_argument('--world-size',    type=int,   default=None,
+                   help='Ranks to launch (default: every host)')
+    p.add_argument('--core-bw',       type=str,   default=None)
+    p.add_argument('--netem-args',    type=str,   default=None)
+    p.add_argument('--bucket-mb',     type=str,   default='1,5,10,25,50,100')
+    p.add_argument('--search',        choices=['grid','halving'], default='halving')
+    p.add_argument('--steps',         type=int,   default=40,
+                   help='Measured steps per trial (final round for halving)')
+    p.add_argument('--warmup',        type=int,   default=5)
+    p.add_argument('--batch-size',    type=int,   default=32)
+    p.add_argument('--model',         type=str,   default='resnet18')
+    p.add_argument('--data-mode',     type=str,   default='synthetic')
+    p.add_argument('--trial-timeout', type=float, default=600.0)
+    p.add_argument('--master-port',   type=int,   default=23456)
+    p.add_argument('--output',        type=str,   default='/home/mininet/ddp_tuning.json')
+    args = p.parse_args()
+
+    key = profile_key(args.k, args.core_bw, args.netem_args, args.topo)
+    space = search_space([float(b) for b in args.bucket_mb.split(',')],
+                         [False, True], [False, True])
+    print(f"*** Tuning {len(space)} DDP configurations for profile {key}")
+
+    topo = make_topo(args.topo, k=args.k)
+    net  = Mininet(topo=topo,
+                   controller=RemoteController,
+                   switch=OVSKernelSwitch,
+                   link=TCLink,
+                   autoSetMacs=True,
+                   autoStaticArp=True)
+    net.start()
+    if args.core_bw:
+        apply_core_rate(net, args.core_bw)
+    if args.netem_args:
+        apply_netem(net, args.netem_args)
+    hosts = net.hosts[:args.world_size or len(net.hosts)]
+    wait_for_fabric(net, [(hosts[0], h) for h in hosts[1:]])
+
+    port = [args.master_port]
+    def trial(cfg, steps):
+        port[0] += 1
+        t = run_trial(hosts, cfg, steps, args.warmup, port[0], args)
+        print(f"*** {cfg} steps={steps}: median step {t}")
+        return t
+
+    if args.search == 'grid':
+        results = grid_search(trial, space, args.steps)
+    else:
+        results = successive_halving(trial, space, args.steps)
+    net.stop()
+
+    # The winner is judged on the longest window it was measured with
+    measured = [r for r in results if r[0] is not None]
+    if not measured:
+        print("ERROR: no trial produced a step time")
+        return
+    longest = max(s for _, _, s in measured)
+    step_time, winner, _ = min((r for r in measured if r[2] == longest), key=lambda r: r[0])
+    save_winner(args.output, key, winner, step_time, results)
+    print(f"*** Best for {key}: {winner} ({step_time * 1000:.1f} ms/step), saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+bench.py
+
+Benchmarks for the hot paths of the experiment pipeline, with
+machine-readable output and stored baselines:
+
+  topo_build    MyTopo construction time and peak Python memory vs k
+  replay        traffic_replay.py client->server throughput over loopback
+  pacing        how closely the replay client follows its interval_s schedule
+  parse         parse_latency.py throughput on large synthetic logs (MB/s)
+  report        visualize_results.py run time on a synthetic results tree
+
+Usage:
+  python3 bench.py --output bench.json                  # run, write JSON
+  python3 bench.py --save-baseline bench_baseline.json  # record a baseline
+  python3 bench.py --baseline bench_baseline.json       # exit 1 on regression
+
+A metric regresses when it is worse than the baseline by more than
+--tolerance (relative). Benchmarks whose dependencies are missing (Mininet,
+pandas/matplotlib) are reported as skipped rather than failing.
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import parse_latency
+from readiness import wait_for_line
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPLAY = os.path.join(HERE, "traffic_replay.py")
+VISUALIZE = os.path.abspath(os.path.join(HERE, "..", "..", "visualize_results.py"))
+
+# metric name -> True if higher is better
+DIRECTIONS = {
+    'build_s': False, 'peak_mb': False,
+    'mbytes_per_s': True,
+    'mean_abs_error_ms': False, 'p99_abs_error_ms': False,
+    'seconds': False,
+}
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def bench_topo_build(ks=(4, 8, 16)):
+    try:
+        from fat_tree import MyTopo
+    except ImportError as e:
+        return {'skipped': f"Mininet not importable: {e}"}
+    out = {}
+    for k in ks:
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        MyTopo(k=k)
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        out[f'k{k}'] = {'build_s': elapsed, 'peak_mb': peak / 1e6}
+    return out
+
+
+def _replay_once(tmp, csv_path=None, burst_bytes=None):
+    """Run server + client; return (client log, server log) paths."""
+    port = free_port()
+    server_log = os.path.join(tmp, f"server_{port}.log")
+    client_log = os.path.join(tmp, f"client_{port}.log")
+    server = subprocess.Popen([sys.executable, '-u', REPLAY, '--mode', 'server', '--port', str(port)],
+                              stdout=open(server_log, 'w'), stderr=subprocess.STDOUT)
+    wait_for_line(server_log, "Listening", 10)
+    if csv_path:
+        cmd = ['--mode', 'client', '--csv', csv_path]
+    else:
+        cmd = ['--mode', 'burst', '--burst-bytes', str(burst_bytes),
+               '--start-at', f"{time.time() + 0.3:.6f}"]
+    subprocess.run([sys.executable, '-u', REPLAY, '--host', '127.0.0.1', '--port', str(port)] + cmd,
+                   stdout=open(client_log, 'w'), stderr=subprocess.STDOUT)
+    server.wait(timeout=60)
+    return client_log, server_log
+
+
+def bench_replay(tmp, mbytes=256):
+    size = mbytes * 1024 * 1024
+    rates = []
+    for _ in range(3):
+        _, server_log = _replay_once(tmp, burst_bytes=size)
+        hdr = parse_latency.extract_timestamps(server_log, r"Received header .* at ([0-9]+\.[0-9]+)")
+        done = parse_latency.extract_timestamps(server_log, r"Completed receiving .* at ([0-9]+\.[0-9]+)")
+        if hdr and done and done[0] > hdr[0]:
+            rates.append(size / (done[0] - hdr[0]) / 1e6)
+    return {'mbytes_per_s': statistics.median(rates)} if rates else {'skipped': 'no transfer'}
+
+
+def bench_pacing(tmp, rows=200, interval=0.005, size=1024):
+    profile = os.path.join(tmp, "pacing.csv")
+    with open(profile, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(['epoch', 'batch', 'interval_s', 'grad_bytes'])
+        for i in range(rows):
+            w.writerow([1, i, interval, size])
+    client_log, _ = _replay_once(tmp, csv_path=profile)
+    sends = parse_latency.extract_timestamps(client_log, r"Sent .* at ([0-9]+\.[0-9]+)")
+    if len(sends) < 2:
+        return {'skipped': 'no sends'}
+    errors = sorted(abs((t - sends[0]) - i * interval) * 1000 for i, t in enumerate(sends))
+    return {'mean_abs_error_ms': statistics.mean(errors),
+            'p99_abs_error_ms': errors[min(len(errors) - 1, int(0.99 * len(errors)))]}
+
+
+def bench_parse(tmp, rows=200000):
+    client_log = os.path.join(tmp, "parse_client.log")
+    server_log = os.path.join(tmp, "parse_server.log")
+    t = 1.7e9
+    with open(client_log, 'w') as c, open(server_log, 'w') as s:
+        for i in range(rows):
+            c.write(f"[Client] [{i}] Sleeping 0.0300s before sending 248024 bytes\n")
+            c.write(f"[Client] [{i}] Sent 248024 bytes at {t + i * 0.03:.6f}\n")
+            s.write(f"[Server] Received header for 248024 bytes at {t + i * 0.03 + 0.001:.6f}\n")
+            s.write(f"[Server] Completed receiving 248024 bytes (in 4 chunks) at "
+                    f"{t + i * 0.03 + 0.02:.6f}\n")
+    nbytes = os.path.getsize(client_log) + os.path.getsize(server_log)
+    out_csv = os.path.join(tmp, "parse_latencies.csv")
+    t0 = time.perf_counter()
+    parse_latency.main(['--client-log', client_log, '--server-log', server_log, '--output', out_csv])
+    elapsed = time.perf_counter() - t0
+    return {'mbytes_per_s': nbytes / elapsed / 1e6, 'seconds': elapsed}
+
+
+def bench_report(tmp, rows=5000):
+    if not os.path.exists(VISUALIZE):
+        return {'skipped': f"{VISUALIZE} not found"}
+    try:
+        import pandas, matplotlib  # noqa: F401
+    except ImportError as e:
+        return {'skipped': f"report dependencies missing: {e}"}
+    root = os.path.join(tmp, "report")
+    rng = random.Random(0)
+    for name in ("tcp_10mbit", "dctcp_10mbit", "bw_5mbit_new", "test_run_2"):
+        d = os.path.join(root, "results", name)
+        os.makedirs(d, exist_ok=True)
+        with open(os.path.join(d, "latencies.csv"), 'w') as f:
+            f.write("batch,latency_s\n")
+            for i in range(rows):
+                f.write(f"{i},{rng.uniform(0.01, 0.3):.6f}\n")
+        with open(os.path.join(d, "throughput.csv"), 'w') as f:
+            f.write("metric,value\nthroughput_mbps,9.5\n")
+    env = dict(os.environ, MPLBACKEND='Agg')
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, VISUALIZE], cwd=root, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    elapsed = time.perf_counter() - t0
+    if proc.returncode != 0:
+        return {'skipped': f"visualize_results.py failed: {proc.stderr.decode()[-200:]}"}
+    return {'seconds': elapsed}
+
+
+BENCHMARKS = {
+    'topo_build': lambda tmp: bench_topo_build(),
+    'replay': bench_replay,
+    'pacing': bench_pacing,
+    'parse': bench_parse,
+    'report': bench_report,
+}
+
+
+def flatten(results, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1}, numeric leaves only."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of (metric, baseline, current, relative change) regressions."""
+    regressions = []
+    current = flatten(results['benchmarks'])
+    for metric, base in flatten(baseline['benchmarks']).items():
+        if metric not in current or not base:
+            continue
+        higher_better = DIRECTIONS.get(metric.rsplit('.', 1)[-1], False)
+        change = (current[metric] - base) / abs(base)
+        worse = -change if higher_better else change
+        if worse > tolerance:
+            regressions.append((metric, base, current[metric], change))
+    return regressions
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark topology, replay and parsing hot paths")
+    p.add_argument('--only',          type=str,   default=None,
+                   help=f"Comma-separated subset of: {','.join(BENCHMARKS)}")
+    p.add_argument('--output',        type=str,   default=None, help='Write results JSON here')
+    p.add_argument('--baseline',      type=str,   default=None, help='Compare against this JSON')
+    p.add_argument('--save-baseline', type=str,   default=None, help='Store results as a baseline')
+    p.add_argument('--tolerance',     type=float, default=0.2,
+                   help='Relative slowdown tolerated before flagging a regression')
+    args = p.parse_args()
+
+    selected = args.only.split(',') if args.only else list(BENCHMARKS)
+    results = {
+        'meta': {'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                 'python': platform.python_version(), 'machine': platform.node(),
+                 'cpus': os.cpu_count()},
+        'benchmarks': {},
+    }
+    tmp = tempfile.mkdtemp(prefix="fattree_bench_")
+    try:
+        for name in selected:
+            print(f"*** Running {name}", file=sys.stderr)
+            results['benchmarks'][name] = BENCHMARKS[name](tmp)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                f.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for metric, base, cur, change in regressions:
+            print(f"REGRESSION {metric}: {base:.4g} -> {cur:.4g} ({change:+.1%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
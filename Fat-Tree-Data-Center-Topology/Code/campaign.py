@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+campaign.py
+
+Repeated-run experiment campaigns with run-to-run statistics:
+
+  run       run every configuration N times through run_sim_fat_tree.py,
+            adding repeats (up to --max-repeats) while a metric's confidence
+            interval is still wider than --target-ci
+  analyze   bootstrap confidence intervals per configuration on mean and
+            p99 latency and on throughput, plus the repeats needed to reach
+            --target-ci
+  compare   flag statistically significant changes against a stored
+            baseline campaign (exit 1 on a significant regression)
+
+A campaign directory holds one sub-directory per configuration, and one
+run_sim_fat_tree.py result directory per repeat inside it:
+  campaign/<config>/run00/{latencies.csv, throughput.csv, fidelity.json, ...}
+
+Each run is one sample. Batches within a run are correlated, so the
+statistics use one value per run (its mean latency, p99 latency and
+throughput). Runs that fidelity.json marks invalid are left out.
+
+Usage:
+  sudo python3 campaign.py run configs.json --campaign results/campaign --repeats 5
+  sudo python3 campaign.py run configs.json --campaign results/campaign --repeats 6 --jobs 3
+  python3 campaign.py analyze results/campaign --save-baseline campaign_baseline.json
+  python3 campaign.py compare results/campaign --baseline campaign_baseline.json
+
+configs.json maps a configuration name to its run_sim_fat_tree.py flags:
+  {"tbf10": "--core-bw 10mbit --qdisc tbf", "dctcp10": "--core-bw 10mbit --qdisc dctcp"}
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import shlex
+import statistics
+import subprocess
+import sys
+import run_parallel
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# metric name -> True if higher is better
+DIRECTIONS = {
+    'mean_latency_s': False,
+    'p99_latency_s': False,
+    'throughput_mbps': True,
+}
+
+Z95 = 1.96
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile, q in [0, 100]."""
+    values = sorted(values)
+    if not values:
+        return None
+    pos = (len(values) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def run_metrics(run_dir):
+    """Per-run summary, or None when fidelity.json marks the run invalid."""
+    fidelity = os.path.join(run_dir, "fidelity.json")
+    if os.path.exists(fidelity):
+        with open(fidelity) as f:
+            if not json.load(f).get('valid', True):
+                return None
+    out = {}
+    latencies = []
+    path = os.path.join(run_dir, "latencies.csv")
+    if os.path.exists(path):
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    latencies.append(float(row['latency_s']))
+                except (KeyError, ValueError):
+                    pass
+    if latencies:
+        out['mean_latency_s'] = statistics.mean(latencies)
+        out['p99_latency_s'] = percentile(latencies, 99)
+    path = os.path.join(run_dir, "throughput.csv")
+    if os.path.exists(path):
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                if row.get('metric') == 'throughput_mbps':
+                    try:
+                        out['throughput_mbps'] = float(row['value'])
+                    except ValueError:
+                        pass
+    return out
+
+def load_campaign(campaign_dir):
+    """{config: {metric: [one value per valid run]}} from a campaign directory."""
+    samples = {}
+    for config in sorted(os.listdir(campaign_dir)):
+        cdir = os.path.join(campaign_dir, config)
+        if not os.path.isdir(cdir):
+            continue
+        runs = [d for d in sorted(os.listdir(cdir)) if d.startswith('run')]
+        metrics = {}
+        for run in runs:
+            m = run_metrics(os.path.join(cdir, run))
+            if m is None:
+                print(f"Skipping {config}/{run}: marked invalid by fidelity.json")
+                continue
+            for name, value in m.items():
+                metrics.setdefault(name, []).append(value)
+        if metrics:
+            samples[config] = metrics
+    return samples
+
+def load_samples(path):
+    """A campaign directory or a baseline JSON written by analyze --save-baseline."""
+    if os.path.isdir(path):
+        return load_campaign(path)
+    with open(path) as f:
+        return json.load(f)['samples']
+
+
+def bootstrap_ci(values, resamples=2000, confidence=0.95, rng=None):
+    """Percentile bootstrap CI of the mean."""
+    rng = rng or random.Random(1)
+    if len(values) < 2:
+        return values[0], values[0]
+    means = sorted(statistics.mean(rng.choices(values, k=len(values))) for _ in range(resamples))
+    tail = (1 - confidence) / 2
+    return means[int(tail * resamples)], means[min(resamples - 1, int((1 - tail) * resamples))]
+
+def repeats_needed(values, target):
+    """
+    Runs needed for a 95% CI on the mean whose full width is `target`
+    times the mean (normal approximation, at least 3).
+    """
+    if len(values) < 2:
+        return None
+    mean = statistics.mean(values)
+    sd = statistics.stdev(values)
+    if mean == 0 or sd == 0:
+        return len(values)
+    return max(3, math.ceil((2 * Z95 * sd / (target * abs(mean))) ** 2))
+
+def summarize(samples, target, resamples=2000, seed=1):
+    rng = random.Random(seed)
+    summary = {}
+    for config, metrics in samples.items():
+        summary[config] = {}
+        for name, values in metrics.items():
+            lo, hi = bootstrap_ci(values, resamples, rng=rng)
+            mean = statistics.mean(values)
+            summary[config][name] = {
+                'runs': len(values), 'mean': mean,
+                'sd': statistics.stdev(values) if len(values) > 1 else None,
+                'ci_low': lo, 'ci_high': hi,
+                'ci_rel_width': (hi - lo) / abs(mean) if mean else None,
+                'repeats_needed': repeats_needed(values, target),
+            }
+    return summary
+
+
+def permutation_p(a, b, resamples=10000, rng=None):
+    """Two-sided permutation test p-value for a difference in means."""
+    rng = rng or random.Random(1)
+    observed = abs(statistics.mean(a) - statistics.mean(b))
+    pooled = list(a) + list(b)
+    hits = 0
+    for _ in range(resamples):
+        rng.shuffle(pooled)
+        if abs(statistics.mean(pooled[:len(a)]) - statistics.mean(pooled[len(a):])) >= observed - 1e-15:
+            hits += 1
+    return (hits + 1) / (resamples + 1)
+
+def diff_ci(a, b, resamples=2000, rng=None):
+    """Bootstrap CI of mean(b) - mean(a), resampling each campaign independently."""
+    rng = rng or random.Random(1)
+    diffs = sorted(statistics.mean(rng.choices(b, k=len(b))) - statistics.mean(rng.choices(a, k=len(a)))
+                   for _ in range(resamples))
+    return diffs[int(0.025 * resamples)], diffs[min(resamples - 1, int(0.975 * resamples))]
+
+def compare(baseline, current, alpha=0.05, min_effect=0.0, resamples=10000, seed=1):
+    """
+    Rows for every (config, metric) present in both campaigns. A change is
+    significant when the permutation p-value is below alpha, the bootstrap
+    CI of the difference excludes zero and the relative change is at least
+    min_effect; it is a regression when it moves in the worse direction.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for config in sorted(set(baseline) & set(current)):
+        for name in sorted(set(baseline[config]) & set(current[config])):
+            a, b = baseline[config][name], current[config][name]
+            if len(a) < 2 or len(b) < 2:
+                rows.append({'config': config, 'metric': name, 'verdict': 'too few runs',
+                             'baseline_runs': len(a), 'current_runs': len(b)})
+                continue
+            ma, mb = statistics.mean(a), statistics.mean(b)
+            change = (mb - ma) / abs(ma) if ma else 0.0
+            p = permutation_p(a, b, resamples, rng)
+            lo, hi = diff_ci(a, b, min(resamples, 2000), rng)
+            significant = p < alpha and (lo > 0 or hi < 0) and abs(change) >= min_effect
+            worse = (change < 0) if DIRECTIONS.get(name, False) else (change > 0)
+            verdict = ('regression' if worse else 'improvement') if significant else 'no change'
+            rows.append({'config': config, 'metric': name, 'verdict': verdict,
+                         'baseline_mean': ma, 'current_mean': mb, 'change': change,
+                         'p_value': p, 'diff_ci_low': lo, 'diff_ci_high': hi,
+                         'baseline_runs': len(a), 'current_runs': len(b)})
+    return rows
+
+
+def run_config(name, flags, campaign_dir, index, sim_args):
+    result_dir = os.path.join(campaign_dir, name, f"run{index:02d}")
+    os.makedirs(result_dir, exist_ok=True)
+    cmd = [sys.executable, os.path.join(HERE, "run_sim_fat_tree.py"), *sim_args,
+           *shlex.split(flags), '--auto-exit', '--result-dir', result_dir]
+    print(f"*** {name} run {index}: {' '.join(cmd)}")
+    subprocess.run(["mn", "-c"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with open(os.path.join(result_dir, "campaign_run.log"), "w") as log:
+        subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT, cwd=HERE)
+    return run_metrics(result_dir)
+
+def run_campaign(configs, campaign_dir, repeats, max_repeats, target, sim_args, jobs=1, cpus_per_run=None):
+    """
+    Run every configuration `repeats` times, then keep adding runs to those
+    whose widest CI is still above `target` (relative) until the estimated
+    repeats are met or max_repeats is reached. With jobs > 1 each round of
+    runs goes through run_parallel.run_jobs, isolated and `jobs` at a time.
+    """
+    index, pending = {}, {}
+    for name in configs:
+        cdir = os.path.join(campaign_dir, name)
+        # Resume: runs already in the campaign directory count towards the total
+        index[name] = len([d for d in os.listdir(cdir) if d.startswith('run')]) if os.path.isdir(cdir) else 0
+        pending[name] = max(repeats - index[name], 0)
+    while any(pending.values()):
+        batch = []
+        for name, count in pending.items():
+            batch += [(name, index[name] + i) for i in range(count)]
+            index[name] += count
+        if jobs > 1:
+            run_parallel.run_jobs(
+                [(f"{name} run {i}", [*sim_args, *shlex.split(configs[name])],
+                  os.path.join(campaign_dir, name, f"run{i:02d}")) for name, i in batch],
+                jobs, cpus_per_run, log_name="campaign_run.log")
+        else:
+            for name, i in batch:
+                run_config(name, configs[name], campaign_dir, i, sim_args)
+        pending = {}
+        for name in configs:
+            if index[name] >= max_repeats:
+                continue
+            stats = summarize({name: load_campaign(campaign_dir).get(name, {})}, target)[name]
+            needed = min(max([s['repeats_needed'] or repeats for s in stats.values()] or [repeats]),
+                         max_repeats)
+            if index[name] < needed:
+                print(f"*** {name}: CI still wider than {target:.0%}, about {needed} runs needed")
+                pending[name] = 1 if jobs == 1 else needed - index[name]
+
+
+def print_summary(summary, target):
+    print(f"{'config':<16} {'metric':<16} {'runs':>4} {'mean':>12} {'95% CI':>27} {'width':>7} {'need':>5}")
+    for config, metrics in summary.items():
+        for name, s in sorted(metrics.items()):
+            width = f"{s['ci_rel_width']:.1%}" if s['ci_rel_width'] is not None else '-'
+            need = s['repeats_needed'] if s['repeats_needed'] is not None else '-'
+            flag = ' *' if s['ci_rel_width'] and s['ci_rel_width'] > target else ''
+            print(f"{config:<16} {name:<16} {s['runs']:>4} {s['mean']:>12.6g} "
+                  f"[{s['ci_low']:>12.6g}, {s['ci_high']:>12.6g}] {width:>7} {need:>5}{flag}")
+    print(f"(* CI wider than the {target:.0%} target; 'need' is the estimated number of runs)")
+
+def main():
+    p = argparse.ArgumentParser(description="Repeated experiment campaigns with bootstrap CIs "
+                                            "and significance tests against a baseline")
+    sub = p.add_subparsers(dest='cmd', required=True)
+    r = sub.add_parser('run', help='Run every configuration N times')
+    r.add_argument('configs', help='JSON file: {name: "run_sim_fat_tree.py flags"}')
+    r.add_argument('--campaign',    type=str,   required=True, help='Campaign directory')
+    r.add_argument('--repeats',     type=int,   default=5)
+    r.add_argument('--max-repeats', type=int,   default=None,
+                   help='Add runs until the CI target is met, up to this many (default: --repeats)')
+    r.add_argument('--csv',         type=str,   default='cifar_traffic_profile.csv')
+    r.add_argument('--target-ci',   type=float, default=0.05,
+                   help='Target full 95%% CI width relative to the mean')
+    r.add_argument('--jobs',        type=int,   default=1,
+                   help='Isolated runs at the same time (see run_parallel.py)')
+    r.add_argument('--cpus-per-run', type=int,  default=None)
+    a = sub.add_parser('analyze', help='Bootstrap CIs and repeats needed per configuration')
+    a.add_argument('campaign')
+    a.add_argument('--target-ci',   type=float, default=0.05)
+    a.add_argument('--resamples',   type=int,   default=2000)
+    a.add_argument('--output',      type=str,   default=None, help='Write the summary as JSON')
+    a.add_argument('--save-baseline', type=str, default=None,
+                   help='Store the per-run samples as a baseline for compare')
+    c = sub.add_parser('compare', help='Significant changes against a baseline campaign')
+    c.add_argument('campaign')
+    c.add_argument('--baseline',    type=str,   required=True,
+                   help='Baseline JSON from analyze --save-baseline, or a campaign directory')
+    c.add_argument('--alpha',       type=float, default=0.05)
+    c.add_argument('--min-effect',  type=float, default=0.0,
+                   help='Ignore significant changes smaller than this (relative)')
+    c.add_argument('--resamples',   type=int,   default=10000)
+    c.add_argument('--output',      type=str,   default=None, help='Write the comparison as CSV')
+    args = p.parse_args()
+
+    if args.cmd == 'run':
+        with open(args.configs) as f:
+            configs = json.load(f)
+        run_campaign(configs, os.path.abspath(args.campaign), args.repeats,
+                     args.max_repeats or args.repeats, args.target_ci,
+                     ['--csv', os.path.abspath(args.csv)], args.jobs, args.cpus_per_run)
+        print_summary(summarize(load_campaign(args.campaign), args.target_ci), args.target_ci)
+    elif args.cmd == 'analyze':
+        samples = load_campaign(args.campaign)
+        summary = summarize(samples, args.target_ci, args.resamples)
+        print_summary(summary, args.target_ci)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(summary, f, indent=2)
+        if args.save_baseline:
+            with open(args.save_baseline, 'w') as f:
+                json.dump({'campaign': os.path.abspath(args.campaign), 'samples': samples}, f, indent=2)
+            print(f"Saved baseline to {args.save_baseline}")
+    else:
+        rows = compare(load_samples(args.baseline), load_samples(args.campaign),
+                       args.alpha, args.min_effect, args.resamples)
+        for r in rows:
+            if 'change' in r:
+                print(f"{r['config']:<16} {r['metric']:<16} {r['change']:+8.2%}  p={r['p_value']:.4f}  "
+                      f"{r['verdict']}")
+            else:
+                print(f"{r['config']:<16} {r['metric']:<16} {r['verdict']} "
+                      f"({r['baseline_runs']} vs {r['current_runs']} runs)")
+        if args.output:
+            fields = ['config', 'metric', 'verdict', 'baseline_mean', 'current_mean', 'change',
+                      'p_value', 'diff_ci_low', 'diff_ci_high', 'baseline_runs', 'current_runs']
+            with open(args.output, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
+        regressions = [r for r in rows if r['verdict'] == 'regression']
+        if regressions:
+            print(f"{len(regressions)} significant regression(s)")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+capacity.py
+
+Static capacity analysis of a fabric from topologies.py, with the agg→core
+(core_uplink) rate limit of apply_core_rate applied to the shaped direction
+of each link:
+
+  bisection   smallest directed cut found between two equal host halves,
+              computed as a max-flow (Dinic) per candidate split: hosts in
+              index order (pod/leaf aligned), interleaved, and --trials
+              random splits. This is exact for the tree-like fabrics, whose
+              worst split is the contiguous one, and an upper bound on the
+              bisection of Jellyfish/BCube.
+  max concurrent flow
+              largest lambda such that lambda * demand can be routed for
+              every pair of a traffic matrix at once. Hosts are single-homed,
+              so access links are solved exactly; the switch fabric is
+              solved by multiplicative weights over shortest-path DAGs (flow
+              split evenly over equal-cost hops), stopping when the feasible
+              (lower) and dual (upper) bounds are within --epsilon.
+
+Traffic matrices (--tm):
+  all-to-all            every host to every other host, demand 1
+  permutation[:seed]    random derangement, demand 1
+  ps:<host>             every worker pushes to and pulls from <host>
+  pairs:h1-h16,h2-h15   explicit pairs, demand 1
+  <file>.csv            src,dst,demand rows (demand in Mbit/s)
+
+With unit demands, lambda * total demand is the best aggregate throughput
+in Mbit/s. --measured compares a throughput.csv or a number against it.
+
+Example:
+  python3 capacity.py --topo fattree,k=32 --core-bw 10mbit --tm permutation
+  python3 capacity.py --tm pairs:h1-h16 --core-bw 5mbit --measured results/bw_5mbit/throughput.csv
+"""
+
+import argparse
+import csv
+import heapq
+import json
+import math
+import os
+import random
+from collections import deque
+
+from shaping_proxy import parse_rate
+from topologies import core_uplink, fabric
+
+
+class Network:
+    """Directed arcs of a fabric with capacities in Mbit/s."""
+
+    def __init__(self, topo, core_bw=None):
+        self.hosts = topo.hosts()
+        self.switches = topo.switches()
+        self.index = {s: i for i, s in enumerate(self.switches)}
+        has_core = any(s.startswith('c') for s in self.switches)
+        core_mbps = parse_rate(core_bw) * 8 / 1e6 if core_bw else None
+        self.attach = {}     # host -> switch index
+        self.access = {}     # host -> (up Mbit/s, down Mbit/s)
+        self.tail, self.head, self.cap = [], [], []
+        for a, b, info in topo.links(withInfo=True):
+            bw = float(info.get('bw') or 1000)
+            if a.startswith('h') or b.startswith('h'):
+                host, sw = (a, b) if a.startswith('h') else (b, a)
+                self.attach[host] = self.index[sw]
+                self.access[host] = (bw, bw)
+                continue
+            for u, v in ((a, b), (b, a)):
+                c = bw
+                if core_mbps is not None and core_uplink(u, v, has_core):
+                    c = min(c, core_mbps)
+                self.tail.append(self.index[u])
+                self.head.append(self.index[v])
+                self.cap.append(c)
+        self.out_arcs = [[] for _ in self.switches]
+        self.in_arcs = [[] for _ in self.switches]
+        for e, (u, v) in enumerate(zip(self.tail, self.head)):
+            self.out_arcs[u].append(e)
+            self.in_arcs[v].append(e)
+
+
+# ---------------------------------------------------------------- max flow
+
+def max_flow(n, arcs, s, t):
+    """Dinic's algorithm over (u, v, cap) arcs; returns the flow value."""
+    graph = [[] for _ in range(n)]
+    to, res = [], []
+    for u, v, c in arcs:
+        graph[u].append(len(to)); to.append(v); res.append(c)
+        graph[v].append(len(to)); to.append(u); res.append(0.0)
+    total = 0.0
+    while True:
+        level = [-1] * n
+        level[s] = 0
+        q = deque([s])
+        while q:
+            u = q.popleft()
+            for e in graph[u]:
+                if res[e] > 1e-9 and level[to[e]] < 0:
+                    level[to[e]] = level[u] + 1
+                    q.append(to[e])
+        if level[t] < 0:
+            return total
+        it = [0] * n
+
+        def push(u, f):
+            if u == t:
+                return f
+            while it[u] < len(graph[u]):
+                e = graph[u][it[u]]
+                v = to[e]
+                if res[e] > 1e-9 and level[v] == level[u] + 1:
+                    d = push(v, min(f, res[e]))
+                    if d > 0:
+                        res[e] -= d
+                        res[e ^ 1] += d
+                        return d
+                it[u] += 1
+            return 0.0
+
+        while True:
+            f = push(s, math.inf)
+            if f <= 0:
+                break
+            total += f
+
+def cut_capacity(net, side_a, side_b):
+    """Max flow from the hosts in side_a to the hosts in side_b."""
+    n = len(net.switches)
+    s, t = n, n + 1
+    arcs = list(zip(net.tail, net.head, net.cap))
+    src, dst = {}, {}
+    for h in side_a:
+        src[net.attach[h]] = src.get(net.attach[h], 0.0) + net.access[h][0]
+    for h in side_b:
+        dst[net.attach[h]] = dst.get(net.attach[h], 0.0) + net.access[h][1]
+    arcs += [(s, sw, c) for sw, c in src.items()]
+    arcs += [(sw, t, c) for sw, c in dst.items()]
+    return max_flow(n + 2, arcs, s, t)
+
+def bisection(net, trials=4, seed=1):
+    """(smallest cut in Mbit/s, name of the split that produced it)."""
+    hosts = sorted(net.hosts, key=lambda h: int(h[1:]))
+    half = len(hosts) // 2
+    splits = {'contiguous': (hosts[:half], hosts[half:2 * half]),
+              'interleaved': (hosts[0::2][:half], hosts[1::2][:half])}
+    rng = random.Random(seed)
+    for i in range(trials):
+        shuffled = hosts[:]
+        rng.shuffle(shuffled)
+        splits[f'random{i}'] = (shuffled[:half], shuffled[half:2 * half])
+    best = None
+    for name, (a, b) in splits.items():
+        cut = min(cut_capacity(net, a, b), cut_capacity(net, b, a))
+        if best is None or cut < best[0]:
+            best = (cut, name)
+    return best
+
+
+# ------------------------------------------------------ max concurrent flow
+
+def traffic_matrix(spec, hosts, seed=1):
+    """[(src, dst, demand)] for a --tm spec."""
+    hosts = sorted(hosts, key=lambda h: int(h[1:]))
+    if spec == 'all-to-all':
+        return [(s, d, 1.0) for s in hosts for d in hosts if s != d]
+    if spec.startswith('permutation'):
+        rng = random.Random(int(spec.split(':')[1]) if ':' in spec else seed)
+        while True:
+            perm = hosts[:]
+            rng.shuffle(perm)
+            if all(s != d for s, d in zip(hosts, perm)):
+                return [(s, d, 1.0) for s, d in zip(hosts, perm)]
+    if spec.startswith('ps:'):
+        ps = spec[3:]
+        return [(w, ps, 1.0) for w in hosts if w != ps] + [(ps, w, 1.0) for w in hosts if w != ps]
+    if spec.startswith('pairs:'):
+        return [(*pair.split('-'), 1.0) for pair in spec[6:].split(',') if pair]
+    with open(spec, newline='') as f:
+        return [(r['src'], r['dst'], float(r['demand'])) for r in csv.DictReader(f)]
+
+def sp_dag(net, length, src):
+    """Dijkstra from `src`: (dist, order settled, shortest-path in-arcs per node)."""
+    n = len(net.switches)
+    dist = [math.inf] * n
+    dist[src] = 0.0
+    order = []
+    heap = [(0.0, src)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        order.append(u)
+        for e in net.out_arcs[u]:
+            v = net.head[e]
+            nd = d + length[e]
+            if nd < dist[v]:
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    preds = {}
+    for v in order[1:]:
+        limit = dist[v] * (1 + 1e-9)
+        preds[v] = [e for e in net.in_arcs[v] if dist[net.tail[e]] + length[e] <= limit]
+    return dist, order, preds
+
+def concurrent_flow(net, demands, epsilon=0.02, max_iters=300, step=0.2, target=math.inf):
+    """
+    Max concurrent flow of the switch fabric for {(src_sw, dst_sw): demand}.
+    Returns (lower bound, upper bound, iterations). Each iteration routes
+    every demand over the shortest-path DAG under the current lengths; the
+    average of these routings is feasible at 1 / (max congestion), and the
+    lengths give the dual bound sum(c*l) / sum(d*dist). Arc lengths then grow
+    by exp(step * relative congestion). Stops early once the lower bound
+    reaches `target` (the access links bind first).
+    """
+    if not demands:
+        return math.inf, math.inf, 0
+    by_src = {}
+    for (s, t), d in demands.items():
+        by_src.setdefault(s, []).append((t, d))
+    m = len(net.cap)
+    length = [1.0 / c for c in net.cap]
+    total = [0.0] * m
+    averaged = 0
+    lower, upper = 0.0, math.inf
+    for it in range(1, max_iters + 1):
+        if it & (it - 1) == 0:
+            # Average only the latest half of the routings (doubling restarts)
+            total = [0.0] * m
+            averaged = 0
+        load = [0.0] * m
+        weighted = 0.0
+        for s, dests in by_src.items():
+            dist, order, preds = sp_dag(net, length, s)
+            at = {}
+            for t, d in dests:
+                if math.isinf(dist[t]):
+                    return 0.0, 0.0, it
+                weighted += d * dist[t]
+                at[t] = at.get(t, 0.0) + d
+            for v in reversed(order[1:]):
+                f = at.get(v)
+                if not f:
+                    continue
+                share = f / len(preds[v])
+                for e in preds[v]:
+                    load[e] += share
+                    u = net.tail[e]
+                    at[u] = at.get(u, 0.0) + share
+        upper = min(upper, sum(c * l for c, l in zip(net.cap, length)) / weighted)
+        congestion = max(x / c for x, c in zip(load, net.cap))
+        for e in range(m):
+            total[e] += load[e]
+        averaged += 1
+        average = max(x / c for x, c in zip(total, net.cap)) / averaged
+        lower = max(lower, 1 / congestion, 1 / average)
+        if upper <= lower * (1 + epsilon) or lower >= target:
+            break
+        for e in range(m):
+            length[e] *= math.exp(step * load[e] / net.cap[e] / congestion)
+    return lower, max(lower, upper), it
+
+def max_concurrent_flow(net, tm, epsilon=0.02, max_iters=300, step=0.2):
+    """Bounds on lambda for a host traffic matrix: {'access', 'fabric_lower', 'fabric_upper', ...}."""
+    out_d, in_d, fabric_d = {}, {}, {}
+    for s, t, d in tm:
+        out_d[s] = out_d.get(s, 0.0) + d
+        in_d[t] = in_d.get(t, 0.0) + d
+        key = (net.attach[s], net.attach[t])
+        if key[0] != key[1]:
+            fabric_d[key] = fabric_d.get(key, 0.0) + d
+    access = min([net.access[h][0] / d for h, d in out_d.items()] +
+                 [net.access[h][1] / d for h, d in in_d.items()])
+    lower, upper, iters = concurrent_flow(net, fabric_d, epsilon, max_iters, step, target=access)
+    return {'access_lambda': access, 'fabric_lambda_lower': lower,
+            'fabric_lambda_upper': upper, 'iterations': iters,
+            'lambda_lower': min(access, lower), 'lambda_upper': min(access, upper)}
+
+
+def read_measured(value):
+    """A number, or the throughput_mbps row of a throughput.csv."""
+    if os.path.exists(value):
+        with open(value, newline='') as f:
+            for row in csv.DictReader(f):
+                if row['metric'] == 'throughput_mbps':
+                    return float(row['value'])
+        raise ValueError(f"{value} has no throughput_mbps row")
+    return float(value)
+
+def main():
+    p = argparse.ArgumentParser(description="Bisection bandwidth and max concurrent flow of a fabric")
+    p.add_argument('--topo',       type=str,   default='fattree,k=4',
+                   help='Fabric spec for topologies.py (link bw in Mbit/s via bw=)')
+    p.add_argument('--core-bw',    type=str,   default=None,
+                   help='Rate limit on core uplinks, as given to apply_core_rate')
+    p.add_argument('--tm',         type=str,   default='all-to-all')
+    p.add_argument('--epsilon',    type=float, default=0.02,
+                   help='Stop when the lambda bounds are within this relative gap')
+    p.add_argument('--max-iters',  type=int,   default=300)
+    p.add_argument('--step',       type=float, default=0.2,
+                   help='Multiplicative-weights step size for the arc lengths')
+    p.add_argument('--trials',     type=int,   default=4,
+                   help='Random host splits tried for the bisection')
+    p.add_argument('--no-bisection', action='store_true')
+    p.add_argument('--measured',   type=str,   default=None,
+                   help='Measured aggregate Mbit/s, or a throughput.csv')
+    p.add_argument('--output',     type=str,   default=None, help='Write the report as JSON')
+    args = p.parse_args()
+
+    net = Network(fabric(args.topo), args.core_bw)
+    report = {'topo': args.topo, 'core_bw': args.core_bw, 'hosts': len(net.hosts),
+              'switches': len(net.switches),
+              'switch_ports': len(net.cap) + len(net.hosts)}
+    print(f"*** {args.topo}: {report['hosts']} hosts, {report['switches']} switches, "
+          f"core uplinks {args.core_bw or 'unshaped'}")
+
+    if not args.no_bisection:
+        cut, split = bisection(net, args.trials)
+        report.update({'bisection_mbps': round(cut, 3), 'bisection_split': split,
+                       'bisection_per_host_mbps': round(cut / (len(net.hosts) // 2), 3),
+                       'ports_per_bisection_mbps': round(report['switch_ports'] / cut, 4)
+                       if cut else None})
+        print(f"*** Bisection bandwidth: {cut:.2f} Mbit/s ({split} split), "
+              f"{report['bisection_per_host_mbps']:.2f} Mbit/s per host")
+
+    tm = traffic_matrix(args.tm, net.hosts)
+    total = sum(d for _, _, d in tm)
+    mcf = max_concurrent_flow(net, tm, args.epsilon, args.max_iters, args.step)
+    report.update({'tm': args.tm, 'flows': len(tm), 'total_demand': total})
+    report.update({k: round(v, 6) for k, v in mcf.items()})
+    report['optimal_aggregate_mbps'] = round(mcf['lambda_lower'] * total, 3)
+    print(f"*** Max concurrent flow ({args.tm}, {len(tm)} flows): lambda in "
+          f"[{mcf['lambda_lower']:.4f}, {mcf['lambda_upper']:.4f}] after {mcf['iterations']} "
+          f"iterations; aggregate {report['optimal_aggregate_mbps']:.2f} Mbit/s")
+
+    if args.measured:
+        measured = read_measured(args.measured)
+        report['measured_mbps'] = measured
+        report['fraction_of_optimal'] = round(measured / report['optimal_aggregate_mbps'], 4)
+        print(f"*** Measured {measured:.2f} Mbit/s = {report['fraction_of_optimal']:.1%} "
+              f"of the achievable optimum")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"*** Wrote {args.output}")
+
+if __name__ == '__main__':
+    main()
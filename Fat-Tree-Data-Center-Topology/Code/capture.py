@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+capture.py: Header-only packet capture on the fabric, analysed offline
+
+During a replay, start_capture() runs one ring-buffered tcpdump per
+interface of the selected switch tiers (core and/or aggregation), keeping
+only the first --snaplen bytes of every TCP packet:
+
+  tcpdump -i c1-eth1 -s 96 -C 20 -W 5 -U -w captures/c1-eth1.pcap tcp
+
+so a long run holds at most 5 x 20 MB per interface. The analyzer reads
+the captures in bulk with NumPy: it walks the record offsets once, then
+gathers the Ethernet/IPv4/TCP fields at fixed offsets from every record
+start for all packets at once, with no per-packet Python objects.
+
+Every segment crosses several captured interfaces, so retransmissions
+and out-of-order segments are counted per interface and a connection
+reports its worst interface. A data segment starting at a sequence
+number that interface already saw is a retransmission; one that starts
+below the highest byte seen so far is out of order. Results:
+
+  pcap_flows.csv    per TCP connection: packets, payload bytes, first and
+                    last data packet, completion time, retransmissions,
+                    out-of-order segments
+  pcap_paths.csv    per connection and interface: packets and bytes, i.e.
+                    which core/aggregation links carried it
+  pcap_batches.csv  the replay connection cut at message boundaries and
+                    joined with the client/server logs: send time,
+                    completion, time on the wire, packets, retransmissions,
+                    out-of-order segments and busiest interface per batch
+
+  sudo python3 run_sim_fat_tree.py --csv cifar_traffic_profile.csv --auto-exit \\
+      --result-dir results/cap --capture c,a
+  python3 capture.py results/cap/captures --client-log results/cap/h1_client.log \\
+      --server-log results/cap/h16_server.log
+"""
+
+import argparse
+import csv
+import glob
+import os
+import re
+import signal
+import struct
+import subprocess
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from topologies import role
+
+SNAPLEN = 96
+MAGICS = {b'\xd4\xc3\xb2\xa1': ('<', 1e-6), b'\x4d\x3c\xb2\xa1': ('<', 1e-9),
+          b'\xa1\xb2\xc3\xd4': ('>', 1e-6), b'\xa1\xb2\x3c\x4d': ('>', 1e-9)}
+LINKTYPE_ETHERNET = 1
+SYN, ACK = 0x02, 0x10
+SENT_RE = re.compile(r"\[Client\] \[([0-9]+)\] Sent ([0-9]+) bytes at ([0-9]+\.[0-9]+)")
+DONE_RE = re.compile(r"Completed receiving .* at ([0-9]+\.[0-9]+)")
+
+
+def capture_intfs(net, roles):
+    """Names of the interfaces of every switch whose role is in `roles`."""
+    return [intf.name for sw in net.switches if role(sw.name) in roles
+            for intf in sw.intfList() if intf.name != 'lo']
+
+def start_capture(net, out_dir, roles=('c',), snaplen=SNAPLEN, ring_mb=20, ring_files=5):
+    """Start one header-only ring-buffered tcpdump per interface; returns the processes."""
+    os.makedirs(out_dir, exist_ok=True)
+    log = open(os.path.join(out_dir, "tcpdump.log"), "a")
+    procs = []
+    for intf in capture_intfs(net, roles):
+        procs.append(subprocess.Popen(
+            ['tcpdump', '-i', intf, '-s', str(snaplen), '-C', str(ring_mb), '-W', str(ring_files),
+             '-U', '-n', '-Z', 'root', '-w', os.path.join(out_dir, f"{intf}.pcap"), 'tcp'],
+            stdout=subprocess.DEVNULL, stderr=log))
+    return procs
+
+def stop_capture(procs, timeout=5):
+    for proc in procs:
+        proc.send_signal(signal.SIGINT)
+    for proc in procs:
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _field(raw, idx, width):
+    """Big-endian unsigned integers of `width` bytes starting at every index in idx."""
+    cols = raw[idx[:, None] + np.arange(width)].astype(np.uint64)
+    return (cols << (8 * np.arange(width - 1, -1, -1)).astype(np.uint64)).sum(axis=1)
+
+def read_pcap(path):
+    """
+    TCP packets of one pcap file as a dict of arrays: time, src, dst, sport,
+    dport, seq, flags, payload (TCP payload bytes on the wire).
+    """
+    raw = np.fromfile(path, dtype=np.uint8)
+    empty = {k: np.zeros(0, dtype=np.uint64) for k in
+             ('src', 'dst', 'sport', 'dport', 'seq', 'flags', 'payload')}
+    empty['time'] = np.zeros(0)
+    if len(raw) < 24:
+        return empty
+    endian, scale = MAGICS.get(raw[:4].tobytes(), (None, None))
+    if endian is None:
+        raise ValueError(f"{path}: not a pcap file")
+    linktype = struct.unpack_from(endian + 'I', raw, 20)[0] & 0xFFFF
+    if linktype != LINKTYPE_ETHERNET:
+        raise ValueError(f"{path}: link type {linktype} is not Ethernet")
+
+    # The only sequential step: record offsets (a ring file being written may end mid-record)
+    rec = struct.Struct(endian + 'II')
+    offsets, off, n = [], 24, len(raw)
+    while off + 16 <= n:
+        incl = rec.unpack_from(raw, off + 8)[0]
+        if off + 16 + incl > n:
+            break
+        offsets.append(off)
+        off += 16 + incl
+    offs = np.array(offsets, dtype=np.int64)
+    if not len(offs):
+        return empty
+    words = raw[offs[:, None] + np.arange(12)].view(np.dtype(endian + 'u4'))
+    ts = words[:, 0] + words[:, 1] * scale
+    incl = words[:, 2].astype(np.int64)
+
+    raw = np.concatenate([raw, np.zeros(64, dtype=np.uint8)])  # fields past a short packet read zeros
+    d = offs + 16
+    ip = (_field(raw, d + 12, 2) == 0x0800) & (incl >= 34)
+    ihl = (raw[d + 14] & 0x0F).astype(np.int64) * 4
+    keep = ip & (raw[d + 23] == 6) & (incl >= 14 + ihl + 20)
+    d, ihl, ts = d[keep], ihl[keep], ts[keep]
+    t = d + 14 + ihl
+    thl = (raw[t + 12] >> 4).astype(np.int64) * 4
+    iplen = _field(raw, d + 16, 2).astype(np.int64)
+    return {'time': ts,
+            'src': _field(raw, d + 26, 4), 'dst': _field(raw, d + 30, 4),
+            'sport': _field(raw, t, 2), 'dport': _field(raw, t + 2, 2),
+            'seq': _field(raw, t + 4, 4), 'flags': raw[t + 13].astype(np.uint64),
+            'payload': np.clip(iplen - ihl - thl, 0, None)}
+
+def load_captures(cap_dir):
+    """All packets of every <intf>.pcap* ring file in cap_dir, with an interface index."""
+    files = sorted(glob.glob(os.path.join(cap_dir, "*.pcap*")))
+    intfs = sorted({os.path.basename(f).split('.pcap')[0] for f in files})
+    parts = []
+    for f in files:
+        pkts = read_pcap(f)
+        pkts['intf'] = np.full(len(pkts['time']), intfs.index(os.path.basename(f).split('.pcap')[0]))
+        parts.append(pkts)
+    if not parts:
+        raise ValueError(f"no captures in {cap_dir}")
+    return intfs, {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+
+def ip_str(value):
+    value = int(value)
+    return '.'.join(str((value >> s) & 0xFF) for s in (24, 16, 8, 0))
+
+def analyze(pkts, n_intf):
+    """
+    Per-packet stream offsets and retransmission/out-of-order flags for the
+    data segments, plus the connection table.
+    """
+    # One integer per 4-tuple: address pair index, then the port pair in the low 32 bits
+    _, pair = np.unique((pkts['src'] << np.uint64(32)) | pkts['dst'], return_inverse=True)
+    key = (pair.ravel().astype(np.uint64) << np.uint64(32)) | (pkts['sport'] << np.uint64(16)) | pkts['dport']
+    _, first_seen, conn = np.unique(key, return_index=True, return_inverse=True)
+    conn = conn.ravel()
+    conns = np.stack([pkts[k][first_seen] for k in ('src', 'dst', 'sport', 'dport')], axis=1)
+    # Stream offset 0 is the byte after the SYN when the handshake was captured
+    isn = np.full(len(conns), -1, dtype=np.int64)
+    syn = (pkts['flags'] & SYN).astype(bool) & ~(pkts['flags'] & ACK).astype(bool)
+    isn[conn[syn]] = pkts['seq'][syn].astype(np.int64)
+
+    data = pkts['payload'] > 0
+    order = np.flatnonzero(data)
+    order = order[np.lexsort((pkts['time'][order], pkts['intf'][order], conn[order]))]
+    c, i = conn[order], pkts['intf'][order]
+    g = c * n_intf + i
+    seq = pkts['seq'][order].astype(np.int64)
+    size = pkts['payload'][order].astype(np.int64)
+    n = len(order)
+    start = np.r_[True, g[1:] != g[:-1]] if n else np.zeros(0, dtype=bool)
+
+    # Unwrap 32-bit sequence numbers along each (connection, interface) in time order
+    step = np.zeros(n, dtype=np.int64)
+    step[1:] = (np.diff(seq) + 2 ** 31) % 2 ** 32 - 2 ** 31
+    step[start] = 0
+    cum = np.cumsum(step)
+    first = np.maximum.accumulate(np.where(start, np.arange(n), 0))
+    base = np.where(isn[c] >= 0, (seq[first] - isn[c] - 1) % 2 ** 32, 0)
+    offset = cum - cum[first] + base
+    end = offset + size
+
+    # Same starting offset seen before on this interface -> retransmission
+    by_seq = np.lexsort((pkts['time'][order], offset, g))
+    dup_sorted = np.r_[False, (g[by_seq][1:] == g[by_seq][:-1]) &
+                       (offset[by_seq][1:] == offset[by_seq][:-1])] if n else np.zeros(0, dtype=bool)
+    retrans = np.zeros(n, dtype=bool)
+    retrans[by_seq] = dup_sorted
+    # New data starting below the highest byte already seen -> out of order
+    lo = end.min() if n else 0
+    span = (end.max() - lo + 1) if n else 1
+    cummax = np.maximum.accumulate(end - lo + g * span)
+    prev_end = np.r_[0, cummax[:-1]] - g * span + lo
+    ooo = ~start & ~retrans & (offset < prev_end)
+    return {'conns': conns, 'isn': isn, 'conn': c, 'intf': i, 'time': pkts['time'][order],
+            'offset': offset, 'size': size, 'retrans': retrans, 'ooo': ooo}
+
+def per_intf(index, n_groups, n_intf, intf, weights=None):
+    return np.bincount(index * n_intf + intf, weights=weights,
+                       minlength=n_groups * n_intf).reshape(n_groups, n_intf)
+
+def write_flows(seg, intfs, out_dir):
+    n_conn, n_intf = len(seg['conns']), len(intfs)
+    pkts = per_intf(seg['conn'], n_conn, n_intf, seg['intf'])
+    nbytes = per_intf(seg['conn'], n_conn, n_intf, seg['intf'], seg['size'])
+    retrans = per_intf(seg['conn'], n_conn, n_intf, seg['intf'], seg['retrans'])
+    ooo = per_intf(seg['conn'], n_conn, n_intf, seg['intf'], seg['ooo'])
+    first = np.full(n_conn, np.inf)
+    last = np.full(n_conn, -np.inf)
+    np.minimum.at(first, seg['conn'], seg['time'])
+    np.maximum.at(last, seg['conn'], seg['time'])
+    labels = [f"{ip_str(s)}:{sp}->{ip_str(d)}:{dp}" for s, d, sp, dp in seg['conns']]
+
+    with open(os.path.join(out_dir, "pcap_flows.csv"), "w", newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['flow', 'packets', 'bytes', 'first_s', 'last_s', 'fct_s',
+                         'retransmissions', 'out_of_order'])
+        for k in np.flatnonzero(pkts.sum(axis=1)):
+            writer.writerow([labels[k], int(pkts[k].max()), int(nbytes[k].max()),
+                             f"{first[k]:.6f}", f"{last[k]:.6f}", f"{last[k] - first[k]:.6f}",
+                             int(retrans[k].max()), int(ooo[k].max())])
+    with open(os.path.join(out_dir, "pcap_paths.csv"), "w", newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['flow', 'interface', 'packets', 'bytes'])
+        for k, j in zip(*np.nonzero(pkts)):
+            writer.writerow([labels[k], intfs[j], int(pkts[k, j]), int(nbytes[k, j])])
+    return labels, pkts, retrans, ooo
+
+def read_batches(client_log, server_log):
+    sent, done = [], []
+    with open(client_log) as f:
+        for line in f:
+            m = SENT_RE.search(line)
+            if m:
+                sent.append((int(m.group(1)), int(m.group(2)), float(m.group(3))))
+    if server_log and os.path.exists(server_log):
+        with open(server_log) as f:
+            done = [float(m.group(1)) for m in map(DONE_RE.search, f) if m]
+    return sent, done
+
+def write_batches(seg, intfs, conn, sent, done, out_dir):
+    """Cut connection `conn` at the 8-byte header + payload message boundaries of the client log."""
+    n_intf, n_batch = len(intfs), len(sent)
+    ends = np.cumsum([8 + size for _, size, _ in sent])
+    mine = seg['conn'] == conn
+    batch = np.searchsorted(ends, seg['offset'][mine], side='right')
+    ok = batch < n_batch
+    batch, intf, t = batch[ok], seg['intf'][mine][ok], seg['time'][mine][ok]
+    pkts = per_intf(batch, n_batch, n_intf, intf)
+    retrans = per_intf(batch, n_batch, n_intf, intf, seg['retrans'][mine][ok])
+    ooo = per_intf(batch, n_batch, n_intf, intf, seg['ooo'][mine][ok])
+    first = np.full(n_batch, np.inf)
+    last = np.full(n_batch, -np.inf)
+    np.minimum.at(first, batch, t)
+    np.maximum.at(last, batch, t)
+
+    path = os.path.join(out_dir, "pcap_batches.csv")
+    with open(path, "w", newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['batch', 'grad_bytes', 'sent_at', 'completed_at', 'latency_s',
+                         'first_pkt_s', 'last_pkt_s', 'wire_s', 'packets',
+                         'retransmissions', 'out_of_order', 'busiest_intf'])
+        for b, (idx, size, t_sent) in enumerate(sent):
+            t_done = done[b] if b < len(done) else None
+            seen = pkts[b].any()
+            writer.writerow([idx, size, f"{t_sent:.6f}",
+                             f"{t_done:.6f}" if t_done else '',
+                             f"{t_done - t_sent:.6f}" if t_done else '',
+                             f"{first[b]:.6f}" if seen else '', f"{last[b]:.6f}" if seen else '',
+                             f"{last[b] - first[b]:.6f}" if seen else '',
+                             int(pkts[b].max()), int(retrans[b].max()), int(ooo[b].max()),
+                             intfs[int(pkts[b].argmax())] if seen else ''])
+    return path, int(pkts.any(axis=1).sum()), int(retrans.max(axis=1).sum())
+
+def main():
+    p = argparse.ArgumentParser(description="Flow completion, retransmissions, reordering and "
+                                            "paths from header-only captures")
+    p.add_argument('captures', help='Directory of <interface>.pcap* files')
+    p.add_argument('--client-log', type=str, default=None,
+                   help='Replay client log, to split the replay connection into batches')
+    p.add_argument('--server-log', type=str, default=None)
+    p.add_argument('--port',       type=int, default=5000, help='Replay server port')
+    p.add_argument('--out',        type=str, default=None, help='Output directory (default: captures)')
+    args = p.parse_args()
+    if np is None:
+        sys.exit("capture.py needs NumPy to analyse captures")
+
+    out_dir = args.out or args.captures
+    os.makedirs(out_dir, exist_ok=True)
+    intfs, pkts = load_captures(args.captures)
+    seg = analyze(pkts, len(intfs))
+    labels, flow_pkts, retrans, ooo = write_flows(seg, intfs, out_dir)
+    print(f"*** {len(pkts['time'])} packets on {len(intfs)} interfaces, "
+          f"{int((flow_pkts.sum(axis=1) > 0).sum())} data connections")
+    print(f"*** {int(retrans.max(axis=1).sum())} retransmissions, "
+          f"{int(ooo.max(axis=1).sum())} out-of-order segments")
+
+    if args.client_log:
+        sent, done = read_batches(args.client_log, args.server_log)
+        replay = [k for k, c in enumerate(seg['conns']) if int(c[3]) == args.port]
+        if not sent or not replay:
+            print("WARNING: no replay batches or no connection to the replay port in the captures")
+        else:
+            conn = max(replay, key=lambda k: flow_pkts[k].max())
+            if seg['isn'][conn] < 0:
+                print("WARNING: handshake not captured; batch boundaries assume the capture "
+                      "saw the first data byte")
+            path, seen, lost = write_batches(seg, intfs, conn, sent, done, out_dir)
+            print(f"*** {labels[conn]}: {seen}/{len(sent)} batches on the wire, "
+                  f"{lost} retransmissions -> {path}")
+    print(f"*** Wrote pcap_flows.csv and pcap_paths.csv to {out_dir}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+dilation.py
+
+Time dilation for emulations that would otherwise be CPU-bound (large k,
+fast links). With a dilation factor D every link runs D times slower, every
+delay is D times longer and the replay schedule is stretched by D, so the
+emulator has D times more CPU per unit of emulated time. Measured times are
+divided by D and throughputs multiplied by D to report them in emulated
+(undilated) units.
+
+Queue sizes (tbf limit/burst) are left alone: a byte buffer drained D times
+slower already holds D times more time. Kernel timers that are not
+configured here, such as TCP's minimum RTO, are not dilated.
+"""
+
+import csv
+import os
+import re
+
+from replay_profile import is_binary, iter_rows, write_profile
+from shaping_proxy import parse_rate, parse_time
+
+_TIME_RE = re.compile(r"^[0-9.]+(s|sec|ms|msec|us|usec)?$")
+
+
+def dilate_rate(rate, factor):
+    """tc rate string divided by `factor`, e.g. ('10mbit', 4) -> '2500000bit'."""
+    if rate is None or factor == 1:
+        return rate
+    return f"{parse_rate(rate) * 8 / factor:.0f}bit"
+
+def dilate_bw(bw_mbps, factor):
+    """Mininet TCLink bw (Mbit/s) divided by `factor`."""
+    return bw_mbps / factor
+
+def _scale_time(token, factor):
+    return f"{parse_time(token) * factor * 1e6:.0f}us"
+
+def dilate_netem(netem_args, factor):
+    """Stretch delay/jitter and slow `rate` in a netem argument string."""
+    if not netem_args or factor == 1:
+        return netem_args
+    tokens = netem_args.split()
+    out = []
+    i = 0
+    while i < len(tokens):
+        tok = tokens[i]
+        out.append(tok)
+        i += 1
+        if tok in ('delay', 'slot'):
+            # delay <time> [jitter] [correlation%]
+            while i < len(tokens) and _TIME_RE.match(tokens[i]):
+                out.append(_scale_time(tokens[i], factor))
+                i += 1
+        elif tok == 'rate' and i < len(tokens):
+            out.append(dilate_rate(tokens[i], factor))
+            i += 1
+    return " ".join(out)
+
+def dilate_profile(csv_in, csv_out, factor):
+    """
+    Write a copy of a traffic profile with every interval_s multiplied by
+    `factor` (a binary .rprof profile stays binary).
+    """
+    if is_binary(csv_in):
+        return write_profile(csv_out, ((e, b, interval * factor, size)
+                                       for e, b, interval, size in iter_rows(csv_in)))
+    with open(csv_in, newline='') as src, open(csv_out, 'w', newline='') as dst:
+        reader = csv.DictReader(src)
+        writer = csv.DictWriter(dst, fieldnames=reader.fieldnames)
+        writer.writeheader()
+        for row in reader:
+            row['interval_s'] = f"{float(row['interval_s']) * factor:.9f}"
+            writer.writerow(row)
+    return csv_out
+
+def rescale_csv(path, columns, factor, keep_raw=True):
+    """
+    Multiply numeric `columns` of a CSV in place by `factor` (use 1/D for
+    times, D for rates). The dilated original is kept as <name>_raw.csv.
+    Non-numeric cells ('missing', 'error', '') are left as they are.
+    """
+    if not os.path.exists(path) or factor == 1:
+        return
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames
+        rows = list(reader)
+    if keep_raw:
+        root, ext = os.path.splitext(path)
+        with open(f"{root}_raw{ext}", 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    for row in rows:
+        for col in columns:
+            try:
+                row[col] = f"{float(row[col]) * factor:.9g}"
+            except (KeyError, TypeError, ValueError):
+                pass
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def rescale_throughput(path, factor):
+    """throughput.csv (metric,value rows): multiply *_mbps values by `factor`."""
+    if not os.path.exists(path) or factor == 1:
+        return
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    with open(path, 'w', newline='') as f:
+        f.write("metric,value\n")
+        for row in rows:
+            value = row['value']
+            if row['metric'].endswith('_mbps'):
+                try:
+                    value = f"{float(value) * factor:.2f}"
+                except ValueError:
+                    pass
+            f.write(f"{row['metric']},{value}\n")
+        f.write(f"dilation,{factor}\n")
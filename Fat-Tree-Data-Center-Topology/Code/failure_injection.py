@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+failure_injection.py
+
+Scripted link/switch failures during a traffic replay, and the analysis of
+how long gradient exchanges stall and how long they take to recover.
+
+Schedule file (one event per line, times relative to replay start):
+  # t_s   action  kind    target(s)
+  5.0     down    link    a5 c1
+  15.0    up      link    a5 c1
+  20.0    down    switch  c2
+  30.0    up      switch  c2
+
+Links are toggled with net.configLinkStatus (both ends), or with
+`ip link set dev <intf> down` on the first named node only when the
+injector is created with method='ifdown'. A switch failure takes down
+every link attached to that switch.
+
+Offline analysis of an existing run:
+  python3 failure_injection.py --analyze results/fail_run
+"""
+
+import argparse
+import csv
+import os
+import statistics
+import sys
+import threading
+import time
+
+from parse_latency import extract_timestamps
+
+SEND_PATTERN = r"Sent .* at ([0-9]+\.[0-9]+)"
+RECV_PATTERN = r"Completed receiving .* at ([0-9]+\.[0-9]+)"
+
+
+def load_schedule(path):
+    """Parse a failure schedule into a time-sorted list of event dicts."""
+    events = []
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            parts = line.split()
+            if len(parts) < 4 or parts[1] not in ('down', 'up') \
+                    or parts[2] not in ('link', 'switch'):
+                raise ValueError(f"{path}:{lineno}: expected "
+                                 f"'<t> down|up link <n1> <n2>' or '<t> down|up switch <name>'")
+            if parts[2] == 'link' and len(parts) != 5:
+                raise ValueError(f"{path}:{lineno}: a link event needs two endpoints")
+            events.append({'offset_s': float(parts[0]), 'action': parts[1],
+                           'kind': parts[2], 'targets': parts[3:]})
+    return sorted(events, key=lambda e: e['offset_s'])
+
+
+class FailureInjector(threading.Thread):
+    """Apply a failure schedule against a running Mininet network."""
+
+    def __init__(self, net, events, method='config'):
+        super().__init__(daemon=True)
+        self.net = net
+        self.events = events
+        self.method = method
+        self.records = []
+        self._cancel = threading.Event()
+        self._down = set()
+
+    def _links_of(self, event):
+        if event['kind'] == 'link':
+            return [tuple(event['targets'])]
+        sw = event['targets'][0]
+        pairs = []
+        for link in self.net.links:
+            n1, n2 = link.intf1.node.name, link.intf2.node.name
+            if sw in (n1, n2):
+                pairs.append((n1, n2))
+        return pairs
+
+    def _set_link(self, n1, n2, status):
+        if self.method == 'ifdown':
+            node = self.net.get(n1)
+            for intf in node.connectionsTo(self.net.get(n2)):
+                node.cmd(f"ip link set dev {intf[0].name} {status}")
+        else:
+            self.net.configLinkStatus(n1, n2, status)
+        key = tuple(sorted((n1, n2)))
+        if status == 'down':
+            self._down.add(key)
+        else:
+            self._down.discard(key)
+
+    def apply(self, event):
+        t_start = time.time()
+        links = self._links_of(event)
+        for n1, n2 in links:
+            self._set_link(n1, n2, event['action'])
+        t_done = time.time()
+        rec = dict(event, targets=' '.join(event['targets']),
+                   t_inject=t_start, t_applied=t_done, links=len(links))
+        self.records.append(rec)
+        print(f"*** [{t_start:.6f}] {event['action']} {event['kind']} "
+              f"{rec['targets']} ({len(links)} link(s))")
+
+    def run(self):
+        self.t0 = time.time()
+        for event in self.events:
+            delay = self.t0 + event['offset_s'] - time.time()
+            if delay > 0 and self._cancel.wait(delay):
+                break
+            self.apply(event)
+
+    def stop(self):
+        """Abort pending events and bring every failed link back up."""
+        self._cancel.set()
+        self.join(timeout=5)
+        for n1, n2 in list(self._down):
+            self._set_link(n1, n2, 'up')
+
+    def write_log(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['offset_s', 'action', 'kind', 'targets',
+                                                   't_inject', 't_applied', 'links'])
+            writer.writeheader()
+            for rec in self.records:
+                writer.writerow(rec)
+
+
+def analyze_recovery(sends, recvs, injections, tolerance=0.2, window=5):
+    """
+    Measure the impact of each 'down' injection on the per-batch records.
+
+    sends/recvs are per-batch send and receive-complete timestamps (batch i
+    pairs sends[i] with recvs[i], as in parse_latency.py). For every failure:
+      baseline_s  median batch latency over batches finished before it
+      stall_s     time from injection until the next batch completes
+      recovery_s  time from injection until `window` consecutive batches
+                  complete within (1 + tolerance) * baseline
+    """
+    batches = list(zip(sends, recvs))
+    results = []
+    for inj in injections:
+        if inj['action'] != 'down':
+            continue
+        t_f = float(inj['t_inject'])
+        before = [r - s for s, r in batches if r < t_f]
+        after = [(s, r) for s, r in batches if r >= t_f]
+        baseline = statistics.median(before) if before else None
+        stall = after[0][1] - t_f if after else None
+        recovery = None
+        if baseline is not None:
+            limit = baseline * (1 + tolerance)
+            streak = 0
+            for i, (s, r) in enumerate(after):
+                streak = streak + 1 if r - s <= limit else 0
+                if streak == window:
+                    recovery = after[i - window + 1][1] - t_f
+                    break
+        results.append({
+            'targets': inj['targets'], 'kind': inj['kind'], 't_inject': f"{t_f:.6f}",
+            'baseline_s': '' if baseline is None else f"{baseline:.6f}",
+            'stall_s': '' if stall is None else f"{stall:.6f}",
+            'recovery_s': '' if recovery is None else f"{recovery:.6f}",
+            'batches_after': len(after),
+            'max_latency_after_s': f"{max(r - s for s, r in after):.6f}" if after else '',
+        })
+    return results
+
+
+def write_recovery(result_dir, client_log, server_log, failures_csv, tolerance=0.2, window=5):
+    sends = extract_timestamps(client_log, SEND_PATTERN)
+    recvs = extract_timestamps(server_log, RECV_PATTERN)
+    with open(failures_csv) as f:
+        injections = list(csv.DictReader(f))
+    results = analyze_recovery(sends, recvs, injections, tolerance, window)
+    out = os.path.join(result_dir, "recovery.csv")
+    with open(out, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['targets', 'kind', 't_inject', 'baseline_s',
+                                               'stall_s', 'recovery_s', 'batches_after',
+                                               'max_latency_after_s'])
+        writer.writeheader()
+        writer.writerows(results)
+    for r in results:
+        print(f"*** {r['kind']} {r['targets']}: stall={r['stall_s'] or 'n/a'}s "
+              f"recovery={r['recovery_s'] or 'never'}s")
+    return results
+
+
+def main():
+    p = argparse.ArgumentParser(description="Analyze stall/recovery after injected failures")
+    p.add_argument('--analyze',    type=str, required=True, help='Result directory of a run')
+    p.add_argument('--client-log', type=str, default='h1_client.log')
+    p.add_argument('--server-log', type=str, default='h16_server.log')
+    p.add_argument('--tolerance',  type=float, default=0.2,
+                   help='Latency slack over the pre-failure median that counts as recovered')
+    p.add_argument('--window',     type=int, default=5,
+                   help='Consecutive in-tolerance batches required for recovery')
+    args = p.parse_args()
+
+    failures = os.path.join(args.analyze, "failures.csv")
+    if not os.path.exists(failures):
+        print(f"Error: {failures} not found", file=sys.stderr)
+        sys.exit(1)
+    write_recovery(args.analyze,
+                   os.path.join(args.analyze, args.client_log),
+                   os.path.join(args.analyze, args.server_log),
+                   failures, args.tolerance, args.window)
+
+if __name__ == '__main__':
+    main()
@@ -1,78 +1,131 @@
 from mininet.topo import Topo
 from mininet.link import TCLink
 from mininet.node import OVSKernelSwitch, RemoteController
+from mininet.util import splitArgs
+import os
+import sys
+
+# `mn --custom fat_tree.py` execs this file from the caller's cwd
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import topologies  # noqa: E402
+from topologies import (build_bcube, build_fat_tree, build_jellyfish, build_leaf_spine,  # noqa: E402
+                        build_vl2, export)
+
+DPID_BASE = 0x100
+DPID_STRIDE = 0x10000
 
 # Global DPIDs counter for unique switch IDs
 def new_dpid():
     if not hasattr(new_dpid, 'counter'):
-        new_dpid.counter = 0x100
+        new_dpid.counter = DPID_BASE
     new_dpid.counter += 1
     return f'{new_dpid.counter:016x}'
 
-class MyTopo(Topo):
+def isolate(run_id):
+    """
+    Give the fabric built next its own switch/interface name prefix
+    ('r<run_id>') and DPID range, so that fabrics started by concurrent
+    processes never collide in OVS or the root network namespace. Host
+    names stay h1..hN (hosts live in their own namespaces).
+    """
+    topologies.NAME_PREFIX = f'r{run_id}'
+    new_dpid.counter = DPID_BASE + run_id * DPID_STRIDE
+
+def run_name(name):
+    """Switch name as built in this process ('c2' -> 'r3c2' when isolated); hosts are unchanged."""
+    prefix = topologies.NAME_PREFIX
+    if not prefix or name.startswith('h') or name.startswith(prefix):
+        return name
+    return prefix + name
+
+class FabricTopo(Topo):
+    """
+    Base for every fabric: switches get a unique DPID and OpenFlow 1.3, and
+    export() describes the built graph (see topologies.export). Under
+    isolate() switch names and host interface names carry the run prefix.
+    """
+    def __init__(self, *args, **params):
+        self._host_ports = {}
+        super(FabricTopo, self).__init__(*args, **params)
+
+    def addSwitch(self, name, **opts):
+        opts.setdefault('dpid', new_dpid())
+        opts.setdefault('protocols', 'OpenFlow13')
+        return super(FabricTopo, self).addSwitch(run_name(name), **opts)
+
+    def addLink(self, node1, node2, **opts):
+        prefix = topologies.NAME_PREFIX
+        if prefix:
+            for node, key in ((node1, 'intfName1'), (node2, 'intfName2')):
+                if topologies.role(node) == 'h':
+                    port = self._host_ports.get(node, 0)
+                    opts.setdefault(key, f'{prefix}{node}-eth{port}')
+                    self._host_ports[node] = port + 1
+        return super(FabricTopo, self).addLink(node1, node2, **opts)
+
+    def export(self):
+        return export(self)
+
+class MyTopo(FabricTopo):
     """
     Parameterized k-ary fat-tree topology.
 
     Attributes:
         k (int): number of pods
-        L1, L2, L3 (int): number of switches in core, aggregation, and edge layers respectively
+        bw (float): rate of every link in Mbit/s (lowered for time-dilated runs)
+
+    Layers: (k/2)^2 core switches c*, k*k/2 aggregation switches a*, k*k/2
+    edge switches e*, and 2 hosts per edge switch.
     """
-    def __init__(self, k=4):
+    def __init__(self, k=4, bw=10):
         super(MyTopo, self).__init__()
         self.k = k
-        pods = self.k
-
-        # Number of switches per layer
-        L1 = (pods // 2) ** 2
-        L2 = pods * (pods // 2)
-        L3 = L2
-
-        # Lists to hold switch references
-        core_switches = []
-        agg_switches  = []
-        edge_switches = []
-
-        # Core layer: c1…cL1
-        for i in range(L1):
-            name = f'c{i+1}'
-            sw = self.addSwitch(name, dpid=new_dpid(), protocols='OpenFlow13')
-            core_switches.append(sw)
-
-        # Aggregation layer: a{L1+1}…a{L1+L2}
-        for i in range(L2):
-            name = f'a{L1 + i + 1}'
-            sw = self.addSwitch(name, dpid=new_dpid(), protocols='OpenFlow13')
-            agg_switches.append(sw)
-
-        # Edge layer: e{L1+L2+1}…e{L1+L2+L3}
-        for i in range(L3):
-            name = f'e{L1 + L2 + i + 1}'
-            sw = self.addSwitch(name, dpid=new_dpid(), protocols='OpenFlow13')
-            edge_switches.append(sw)
-
-        # Links: core → aggregation
-        for i, c_sw in enumerate(core_switches):
-            start = i % (pods // 2)
-            for j in range(pods):
-                a_idx = start + j * (pods // 2)
-                self.addLink(c_sw, agg_switches[a_idx], bw=10)
-
-        # Links: aggregation → edge
-        for i, a_sw in enumerate(agg_switches):
-            group = i // (pods // 2)
-            for j in range(pods // 2):
-                e_idx = group * (pods // 2) + j
-                self.addLink(a_sw, edge_switches[e_idx], bw=10)
-
-        # Links: edge → hosts (2 hosts per edge switch)
-        host_id = 1
-        for e_sw in edge_switches:
-            for _ in range(2):
-                h_name = f'h{host_id}'
-                host = self.addHost(h_name)
-                self.addLink(e_sw, host, bw=10)
-                host_id += 1
+        self.bw = bw
+        build_fat_tree(self, k, bw)
+
+class LeafSpineTopo(FabricTopo):
+    """Leaf-spine with `oversub`:1 oversubscription at the leaves (spines are c*, leaves e*)."""
+    def __init__(self, leaves=4, spines=2, hosts_per_leaf=4, oversub=1.0, bw=10):
+        super(LeafSpineTopo, self).__init__()
+        build_leaf_spine(self, leaves, spines, hosts_per_leaf, oversub, bw)
+
+class VL2Topo(FabricTopo):
+    """VL2 Clos (intermediate c*, aggregation a*, ToR e*)."""
+    def __init__(self, da=4, di=4, hosts_per_tor=2, bw=10, uplink_factor=10):
+        super(VL2Topo, self).__init__()
+        build_vl2(self, da, di, hosts_per_tor, bw, uplink_factor)
+
+class JellyfishTopo(FabricTopo):
+    """Jellyfish random regular graph of ToRs (all e*)."""
+    def __init__(self, switches=8, degree=3, hosts_per_switch=2, seed=1, bw=10):
+        super(JellyfishTopo, self).__init__()
+        build_jellyfish(self, switches, degree, hosts_per_switch, seed, bw)
+
+class BCubeTopo(FabricTopo):
+    """BCube(n, levels) (per-server relay switches e*, level switches c*)."""
+    def __init__(self, n=4, levels=1, bw=10):
+        super(BCubeTopo, self).__init__()
+        build_bcube(self, n, levels, bw)
 
 # Allow `mn --custom fat_tree.py --topo=mytopo,k=8` style usage
-topos = {'mytopo': (lambda k=4: MyTopo(k))}
+# (also leafspine,leaves=8,oversub=3 / vl2 / jellyfish / bcube)
+topos = {'mytopo':    (lambda k=4, bw=10: MyTopo(k, bw)),
+         'fattree':   (lambda k=4, bw=10: MyTopo(k, bw)),
+         'leafspine': LeafSpineTopo,
+         'vl2':       VL2Topo,
+         'jellyfish': JellyfishTopo,
+         'bcube':     BCubeTopo}
 
+def make_topo(spec=None, k=4, bw=10):
+    """
+    Topology for the runners' --topo flag, in `mn --topo` syntax (e.g.
+    'jellyfish,switches=16,degree=4'); the k-pod fat-tree when spec is None.
+    `k` also applies to a fat-tree spec that does not give its own k.
+    """
+    if not spec:
+        return MyTopo(k, bw)
+    name, args, kwargs = splitArgs(spec)
+    kwargs.setdefault('bw', bw)
+    if name in ('mytopo', 'fattree') and not args:
+        kwargs.setdefault('k', k)
+    return topos[name](*args, **kwargs)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+fidelity.py
+
+Emulation-fidelity watchdog. While a run is in progress it samples, every
+--interval seconds:
+  - host CPU busy share from /proc/stat (aggregate and busiest CPU)
+  - softirq share of the busiest CPU (/proc/stat) and NET_RX/NET_TX softirq
+    rates (/proc/softirqs), plus backlog drops and time_squeeze events from
+    /proc/net/softnet_stat
+  - packet drops inside every Mininet host namespace (/proc/<pid>/net/dev);
+    softirq time itself is per CPU, not per namespace, so drops are what can
+    be attributed to a host
+  - OVS kernel datapath hit/missed/lost counters (`ovs-dpctl show`)
+After the run the client's scheduling lag (how late each paced send woke up,
+logged by traffic_replay.py as "Woke ... late") is added, and the run is
+judged. Samples go to fidelity.csv and the verdict to fidelity.json in the
+result directory; visualize_results.py skips runs whose verdict is invalid.
+
+A run is invalid when any of these hold:
+  - the host CPU was >= --cpu-limit busy in more than --saturated-fraction
+    of the samples
+  - one CPU spent more than --softirq-limit of its time in softirq
+  - the OVS datapath lost upcalls, or the kernel dropped packets from a
+    per-CPU backlog
+  - the 99th-percentile scheduling lag exceeded --lag-limit-ms
+
+Re-judge an existing run with different limits:
+  python3 fidelity.py --check results/bw_10mbit --cpu-limit 0.85
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import statistics
+import subprocess
+import threading
+import time
+
+LAG_PATTERN = re.compile(r"Woke ([0-9.]+)ms late")
+DPCTL_PATTERN = re.compile(r"lookups: hit:(\d+) missed:(\d+) lost:(\d+)")
+FIELDS = ['time', 'cpu_busy', 'cpu_max', 'softirq_max', 'net_rx_per_s', 'net_tx_per_s',
+          'backlog_drops', 'time_squeeze', 'dp_missed_per_s', 'dp_lost', 'ns_drops']
+DEFAULT_LIMITS = {'cpu_limit': 0.9, 'saturated_fraction': 0.1, 'softirq_limit': 0.5,
+                  'lag_limit_ms': 5.0}
+
+
+def read_cpu_times():
+    """{cpu name: (busy jiffies, total jiffies, softirq jiffies)} from /proc/stat."""
+    times = {}
+    with open('/proc/stat') as f:
+        for line in f:
+            if not line.startswith('cpu'):
+                break
+            name, *vals = line.split()
+            vals = [int(v) for v in vals[:8]]
+            total = sum(vals)
+            idle = vals[3] + vals[4]
+            times[name] = (total - idle, total, vals[6])
+    return times
+
+def read_net_softirqs():
+    """(NET_RX, NET_TX) softirq counts summed over CPUs."""
+    counts = {}
+    with open('/proc/softirqs') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key.strip() in ('NET_RX', 'NET_TX'):
+                counts[key.strip()] = sum(int(v) for v in rest.split())
+    return counts.get('NET_RX', 0), counts.get('NET_TX', 0)
+
+def read_softnet():
+    """(backlog drops, time_squeeze) summed over CPUs."""
+    dropped = squeezed = 0
+    with open('/proc/net/softnet_stat') as f:
+        for line in f:
+            cols = line.split()
+            dropped += int(cols[1], 16)
+            squeezed += int(cols[2], 16)
+    return dropped, squeezed
+
+def read_ns_drops(pid):
+    """rx + tx drops over every interface in the namespace of `pid`."""
+    drops = 0
+    try:
+        with open(f'/proc/{pid}/net/dev') as f:
+            for line in f.readlines()[2:]:
+                fields = line.split(':', 1)[1].split()
+                drops += int(fields[3]) + int(fields[11])
+    except (OSError, IndexError, ValueError):
+        pass
+    return drops
+
+def read_dpctl():
+    """(hit, missed, lost) summed over OVS kernel datapaths; None without OVS."""
+    try:
+        out = subprocess.run(['ovs-dpctl', 'show'], capture_output=True, text=True,
+                             timeout=5).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    matches = DPCTL_PATTERN.findall(out)
+    if not matches:
+        return None
+    return tuple(sum(int(m[i]) for m in matches) for i in range(3))
+
+def scheduling_lags(client_log):
+    """Per-send wake-up lag in ms logged by traffic_replay.py."""
+    lags = []
+    if client_log and os.path.exists(client_log):
+        with open(client_log) as f:
+            for line in f:
+                m = LAG_PATTERN.search(line)
+                if m:
+                    lags.append(float(m.group(1)))
+    return lags
+
+
+def judge(samples, lags, cpu_limit=0.9, saturated_fraction=0.1, softirq_limit=0.5,
+          lag_limit_ms=5.0):
+    """Summarize samples and lags; return the verdict dict written to fidelity.json."""
+    reasons = []
+    summary = {'samples': len(samples), 'lag_samples': len(lags)}
+    if samples:
+        busy = [s['cpu_busy'] for s in samples]
+        saturated = sum(1 for s in samples if s['cpu_busy'] >= cpu_limit) / len(samples)
+        summary.update({
+            'cpu_busy_mean': round(statistics.mean(busy), 4),
+            'cpu_busy_max': round(max(busy), 4),
+            'cpu_max_peak': round(max(s['cpu_max'] for s in samples), 4),
+            'saturated_fraction': round(saturated, 4),
+            'softirq_max': round(max(s['softirq_max'] for s in samples), 4),
+            'backlog_drops': sum(s['backlog_drops'] for s in samples),
+            'time_squeeze': sum(s['time_squeeze'] for s in samples),
+            'dp_lost': sum(s['dp_lost'] for s in samples),
+            'ns_drops': sum(s['ns_drops'] for s in samples),
+        })
+        if saturated > saturated_fraction:
+            reasons.append(f"CPU >= {cpu_limit:.0%} busy in {saturated:.0%} of samples")
+        if summary['softirq_max'] > softirq_limit:
+            reasons.append(f"a CPU spent {summary['softirq_max']:.0%} of its time in softirq")
+        if summary['dp_lost']:
+            reasons.append(f"OVS datapath lost {summary['dp_lost']} upcalls")
+        if summary['backlog_drops']:
+            reasons.append(f"kernel dropped {summary['backlog_drops']} packets from CPU backlogs")
+    if lags:
+        ordered = sorted(lags)
+        p99 = ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+        summary.update({'lag_mean_ms': round(statistics.mean(lags), 4),
+                        'lag_p99_ms': round(p99, 4), 'lag_max_ms': round(ordered[-1], 4)})
+        if p99 > lag_limit_ms:
+            reasons.append(f"p99 scheduling lag {p99:.2f} ms > {lag_limit_ms} ms")
+    limits = {'cpu_limit': cpu_limit, 'saturated_fraction': saturated_fraction,
+              'softirq_limit': softirq_limit, 'lag_limit_ms': lag_limit_ms}
+    return {'valid': not reasons, 'reasons': reasons, 'limits': limits, 'summary': summary}
+
+
+class FidelityWatchdog(threading.Thread):
+    """Sample host load in the background while a run is in progress."""
+
+    def __init__(self, result_dir, net=None, interval=0.5, **limits):
+        super().__init__(daemon=True)
+        self.result_dir = result_dir
+        self.interval = interval
+        self.limits = dict(DEFAULT_LIMITS, **limits)
+        self.pids = [h.pid for h in net.hosts] if net else []
+        # A run pinned to a CPU set (run_sim_fat_tree --cpus) is judged on those CPUs only
+        self.cpus = {f'cpu{c}' for c in os.sched_getaffinity(0)}
+        self.pinned = len(self.cpus) < (os.cpu_count() or len(self.cpus))
+        self.samples = []
+        self._cancel = threading.Event()
+
+    def _snapshot(self):
+        dp = read_dpctl()
+        return {'time': time.time(), 'cpu': read_cpu_times(), 'softirqs': read_net_softirqs(),
+                'softnet': read_softnet(), 'dp': dp,
+                'ns_drops': sum(read_ns_drops(pid) for pid in self.pids)}
+
+    def _sample(self, prev, cur):
+        dt = cur['time'] - prev['time'] or self.interval
+        shares = {}
+        for name, (busy, total, softirq) in cur['cpu'].items():
+            p_busy, p_total, p_softirq = prev['cpu'].get(name, (busy, total, softirq))
+            span = (total - p_total) or 1
+            shares[name] = ((busy - p_busy) / span, (softirq - p_softirq) / span)
+        per_cpu = [v for k, v in shares.items() if k in self.cpus] or [shares['cpu']]
+        busy = statistics.mean(b for b, _ in per_cpu) if self.pinned else shares['cpu'][0]
+        dp_missed = dp_lost = 0
+        if cur['dp'] and prev['dp']:
+            dp_missed = (cur['dp'][1] - prev['dp'][1]) / dt
+            dp_lost = cur['dp'][2] - prev['dp'][2]
+        return {
+            'time': round(cur['time'], 6),
+            'cpu_busy': round(busy, 4),
+            'cpu_max': round(max(b for b, _ in per_cpu), 4),
+            'softirq_max': round(max(s for _, s in per_cpu), 4),
+            'net_rx_per_s': round((cur['softirqs'][0] - prev['softirqs'][0]) / dt, 1),
+            'net_tx_per_s': round((cur['softirqs'][1] - prev['softirqs'][1]) / dt, 1),
+            'backlog_drops': cur['softnet'][0] - prev['softnet'][0],
+            'time_squeeze': cur['softnet'][1] - prev['softnet'][1],
+            'dp_missed_per_s': round(dp_missed, 1),
+            'dp_lost': dp_lost,
+            'ns_drops': cur['ns_drops'] - prev['ns_drops'],
+        }
+
+    def run(self):
+        prev = self._snapshot()
+        while not self._cancel.wait(self.interval):
+            cur = self._snapshot()
+            self.samples.append(self._sample(prev, cur))
+            prev = cur
+
+    def stop(self, client_log=None):
+        """Stop sampling, judge the run and write fidelity.csv / fidelity.json."""
+        self._cancel.set()
+        self.join(timeout=5)
+        with open(os.path.join(self.result_dir, "fidelity.csv"), 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(self.samples)
+        verdict = judge(self.samples, scheduling_lags(client_log), **self.limits)
+        write_verdict(self.result_dir, verdict)
+        return verdict
+
+
+def write_verdict(result_dir, verdict):
+    with open(os.path.join(result_dir, "fidelity.json"), 'w') as f:
+        json.dump(verdict, f, indent=2)
+    if verdict['valid']:
+        print("*** Fidelity check passed")
+    else:
+        print(f"WARNING: run marked invalid: {'; '.join(verdict['reasons'])}")
+
+def load_samples(path):
+    samples = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            samples.append({k: float(v) for k, v in row.items()})
+    return samples
+
+def main():
+    p = argparse.ArgumentParser(description="Re-judge the fidelity of an existing run")
+    p.add_argument('--check',              type=str,   required=True, help='Result directory of a run')
+    p.add_argument('--client-log',         type=str,   default='h1_client.log')
+    p.add_argument('--cpu-limit',          type=float, default=DEFAULT_LIMITS['cpu_limit'])
+    p.add_argument('--saturated-fraction', type=float, default=DEFAULT_LIMITS['saturated_fraction'])
+    p.add_argument('--softirq-limit',      type=float, default=DEFAULT_LIMITS['softirq_limit'])
+    p.add_argument('--lag-limit-ms',       type=float, default=DEFAULT_LIMITS['lag_limit_ms'])
+    args = p.parse_args()
+
+    samples_csv = os.path.join(args.check, "fidelity.csv")
+    samples = load_samples(samples_csv) if os.path.exists(samples_csv) else []
+    lags = scheduling_lags(os.path.join(args.check, args.client_log))
+    verdict = judge(samples, lags, args.cpu_limit, args.saturated_fraction,
+                    args.softirq_limit, args.lag_limit_ms)
+    write_verdict(args.check, verdict)
+    print(json.dumps(verdict['summary'], indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+hedera.py
+
+Routing and scheduling logic for hedera_controller.py, kept free of RYU so
+it can be reused and checked offline. It follows Hedera (Al-Fares et al.,
+NSDI 2010):
+
+  all_shortest_paths  equal-cost paths between two switches
+  ecmp_path           static hash of a flow onto one of those paths
+  estimate_demands    natural (max-min fair, NIC-limited) demand of each
+                      large flow, as a fraction of the host NIC rate
+  global_first_fit    place flows, largest demand first, on the first path
+                      whose links can still carry their demand
+
+A path is a list of DPIDs. `adjacency` maps dpid -> {neighbour dpid: out port},
+and a directed link is identified by (dpid, out_port).
+"""
+
+import zlib
+from collections import deque
+
+
+def all_shortest_paths(adjacency, src, dst):
+    """Every shortest switch path from src to dst (BFS over the switch graph)."""
+    if src == dst:
+        return [[src]]
+    dist = {src: 0}
+    parents = {src: []}
+    queue = deque([src])
+    while queue:
+        node = queue.popleft()
+        if dst in dist and dist[node] >= dist[dst]:
+            break
+        for nbr in adjacency.get(node, {}):
+            if nbr not in dist:
+                dist[nbr] = dist[node] + 1
+                parents[nbr] = [node]
+                queue.append(nbr)
+            elif dist[nbr] == dist[node] + 1:
+                parents[nbr].append(node)
+    if dst not in dist:
+        return []
+
+    paths = []
+    def walk(node, suffix):
+        if node == src:
+            paths.append([src] + suffix)
+            return
+        for parent in sorted(parents[node]):
+            walk(parent, [node] + suffix)
+    walk(dst, [])
+    return paths
+
+def path_links(adjacency, path):
+    """Directed (dpid, out_port) links traversed by `path`."""
+    return [(a, adjacency[a][b]) for a, b in zip(path, path[1:])]
+
+def ecmp_path(paths, flow_key):
+    """Deterministic hash of the flow 5-tuple onto one equal-cost path."""
+    h = zlib.crc32(repr(flow_key).encode())
+    return paths[h % len(paths)]
+
+
+def estimate_demands(flows):
+    """
+    Hedera demand estimation.
+
+    flows: list of (src_host, dst_host) pairs, one per large flow.
+    Returns a list of demands (fraction of NIC rate, 0..1) in the same order.
+
+    Senders split their spare capacity equally among unconverged flows;
+    receivers that are oversubscribed cap their flows at a max-min fair
+    share. The two steps alternate until no demand changes.
+    """
+    n = len(flows)
+    demand = [0.0] * n
+    converged = [False] * n
+    by_src, by_dst = {}, {}
+    for i, (s, d) in enumerate(flows):
+        by_src.setdefault(s, []).append(i)
+        by_dst.setdefault(d, []).append(i)
+
+    changed = True
+    while changed:
+        changed = False
+        for idx in by_src.values():
+            fixed = sum(demand[i] for i in idx if converged[i])
+            open_ = [i for i in idx if not converged[i]]
+            if not open_:
+                continue
+            share = max(0.0, 1.0 - fixed) / len(open_)
+            for i in open_:
+                if abs(demand[i] - share) > 1e-9:
+                    demand[i] = share
+                    changed = True
+
+        for idx in by_dst.values():
+            if sum(demand[i] for i in idx) <= 1.0 + 1e-9:
+                continue
+            limited = set(idx)
+            share = 1.0 / len(idx)
+            settled = 0.0
+            while True:
+                small = {i for i in limited if demand[i] < share}
+                if not small:
+                    break
+                settled += sum(demand[i] for i in small)
+                limited -= small
+                if not limited:
+                    break
+                share = (1.0 - settled) / len(limited)
+            for i in limited:
+                if abs(demand[i] - share) > 1e-9:
+                    demand[i] = share
+                    changed = True
+                converged[i] = True
+    return demand
+
+
+def global_first_fit(flows, candidates, adjacency, capacity, load=None):
+    """
+    Place flows on paths without exceeding link capacity.
+
+    flows:      list of (flow_key, demand, current_path), demand in the same
+                unit as capacity
+    candidates: flow_key -> list of equal-cost paths
+    capacity:   capacity of every link, or a function of the (dpid, port)
+                link when links differ (e.g. rate-limited core uplinks)
+    load:       optional (dpid, port) -> measured load, used only to pick the
+                least-loaded path for flows that fit nowhere
+
+    Flows are handled largest demand first and keep their current path if it
+    still fits, so a stable placement is not churned. Returns
+    flow_key -> chosen path.
+    """
+    reserved = {}
+    placement = {}
+    load = load or {}
+    cap = capacity if callable(capacity) else (lambda link: capacity)
+    for key, demand, current in sorted(flows, key=lambda f: -f[1]):
+        paths = candidates.get(key) or [current]
+        ordered = ([current] if current in paths else []) + [p for p in paths if p != current]
+        chosen = None
+        for path in ordered:
+            links = path_links(adjacency, path)
+            if all(reserved.get(l, 0.0) + demand <= cap(l) + 1e-9 for l in links):
+                chosen = path
+                break
+        if chosen is None:
+            chosen = min(ordered, key=lambda p: max(
+                [reserved.get(l, 0.0) + load.get(l, 0.0) for l in path_links(adjacency, p)] or [0.0]))
+        for l in path_links(adjacency, chosen):
+            reserved[l] = reserved.get(l, 0.0) + demand
+        placement[key] = chosen
+    return placement
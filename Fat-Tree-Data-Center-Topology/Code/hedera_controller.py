@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+hedera_controller.py
+
+RYU application that routes IPv4 flows over the fat-tree's equal-cost paths
+and, in Hedera mode, moves large flows off congested core paths at runtime.
+
+  ecmp    every new flow is hashed (5-tuple) onto one shortest path and
+          stays there, like static ECMP
+  hedera  same initial placement, plus a scheduler that polls flow and port
+          statistics every `poll_interval` seconds, treats flows above
+          `elephant_fraction` of the link rate as large, estimates their
+          natural demand and re-places them with Global First Fit, pushing
+          the new paths as OpenFlow flow-mods
+
+Per-flow entries are installed on every switch of the path, so the byte
+counters of the ingress edge switch give each flow's rate. The switch graph
+comes from RYU's LLDP link discovery (--observe-links); hosts are learned
+from their first packet, and packets to unknown hosts are delivered to every
+host-facing port.
+
+Settings live in the [hedera] section of a config file:
+
+  [hedera]
+  mode = hedera
+  poll_interval = 0.3
+  link_mbps = 10
+  core_mbps = 5
+  event_log = /tmp/hedera_events.csv
+
+Run:
+  ryu-manager --observe-links --config-file hedera.conf hedera_controller.py
+"""
+
+import os
+import sys
+import time
+
+from ryu import cfg
+from ryu.base import app_manager
+from ryu.controller import ofp_event
+from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, set_ev_cls
+from ryu.lib import hub
+from ryu.lib.packet import ether_types, ethernet, ipv4, packet, tcp, udp
+from ryu.ofproto import ofproto_v1_3
+from ryu.topology import event as topo_event
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import hedera  # noqa: E402
+from topologies import core_uplink, role  # noqa: E402
+
+CONF = cfg.CONF
+CONF.register_opts([
+    cfg.StrOpt('mode', default='hedera', help='ecmp or hedera'),
+    cfg.FloatOpt('poll_interval', default=0.3, help='Seconds between stats polls'),
+    cfg.FloatOpt('schedule_interval', default=1.0, help='Seconds between scheduling rounds'),
+    cfg.FloatOpt('link_mbps', default=10.0, help='Capacity of every link (and host NIC)'),
+    cfg.FloatOpt('core_mbps', default=0.0,
+                 help='Capacity of the rate-limited core uplinks (0: link_mbps)'),
+    cfg.FloatOpt('elephant_fraction', default=0.1,
+                 help='Flows faster than this fraction of link_mbps are large'),
+    cfg.IntOpt('idle_timeout', default=10, help='Idle timeout of per-flow entries'),
+    cfg.StrOpt('event_log', default='', help='CSV file for reroute events'),
+], group='hedera')
+
+FLOW_PRIORITY = 10
+FLOW_COOKIE = 0x4845
+
+
+class HederaController(app_manager.RyuApp):
+    OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
+
+    def __init__(self, *args, **kwargs):
+        super(HederaController, self).__init__(*args, **kwargs)
+        self.conf = CONF.hedera
+        self.datapaths = {}
+        self.adjacency = {}      # dpid -> {neighbour dpid: out port}
+        self.switch_ports = {}   # dpid -> set of port numbers
+        self.switch_names = {}   # dpid -> switch name, from its port names (c1-eth1)
+        self.hosts = {}          # ip -> (dpid, port)
+        self.flows = {}          # flow key -> state dict
+        self.port_load = {}      # (dpid, port) -> Mbps
+        self._port_last = {}
+        self.reroutes = 0
+        self.capacity = self.conf.link_mbps
+        self.core_capacity = self.conf.core_mbps or self.capacity
+        self.threshold = self.conf.elephant_fraction * self.capacity
+        self.event_log = None
+        if self.conf.event_log:
+            self.event_log = open(self.conf.event_log, 'w')
+            self.event_log.write("time,flow,demand_mbps,rate_mbps,old_path,new_path\n")
+            self.event_log.flush()
+        self.logger.info("Hedera controller in %s mode, link %.1f Mbps, core uplinks %.1f Mbps",
+                         self.conf.mode, self.capacity, self.core_capacity)
+        self.poller = hub.spawn(self._poll_loop)
+
+    # ------------------------------------------------------------ topology
+
+    @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
+    def switch_features_handler(self, ev):
+        dp = ev.msg.datapath
+        ofp, parser = dp.ofproto, dp.ofproto_parser
+        self.datapaths[dp.id] = dp
+        # Table-miss: send to the controller
+        self._add_flow(dp, 0, parser.OFPMatch(),
+                       [parser.OFPActionOutput(ofp.OFPP_CONTROLLER, ofp.OFPCML_NO_BUFFER)])
+        # IPv6 neighbour discovery is not needed (static ARP, IPv4 only)
+        self._add_flow(dp, 1, parser.OFPMatch(eth_type=ether_types.ETH_TYPE_IPV6), [])
+
+    @set_ev_cls(topo_event.EventSwitchEnter)
+    def switch_enter_handler(self, ev):
+        sw = ev.switch
+        self.switch_ports[sw.dp.id] = {p.port_no for p in sw.ports}
+        for p in sw.ports:
+            name = p.name.decode() if isinstance(p.name, bytes) else p.name
+            if '-eth' in name:
+                self.switch_names[sw.dp.id] = name.split('-eth')[0]
+                break
+        self.adjacency.setdefault(sw.dp.id, {})
+
+    @set_ev_cls(topo_event.EventSwitchLeave)
+    def switch_leave_handler(self, ev):
+        dpid = ev.switch.dp.id
+        self.switch_ports.pop(dpid, None)
+        self.switch_names.pop(dpid, None)
+        self.adjacency.pop(dpid, None)
+        for nbrs in self.adjacency.values():
+            nbrs.pop(dpid, None)
+
+    @set_ev_cls(topo_event.EventLinkAdd)
+    def link_add_handler(self, ev):
+        src, dst = ev.link.src, ev.link.dst
+        self.adjacency.setdefault(src.dpid, {})[dst.dpid] = src.port_no
+
+    @set_ev_cls(topo_event.EventLinkDelete)
+    def link_delete_handler(self, ev):
+        src, dst = ev.link.src, ev.link.dst
+        self.adjacency.get(src.dpid, {}).pop(dst.dpid, None)
+
+    def _link_capacity(self, link):
+        """Capacity of the directed (dpid, port) link: core_mbps on core uplinks."""
+        dpid, port = link
+        src = self.switch_names.get(dpid)
+        dst = next((self.switch_names.get(n) for n, p in self.adjacency.get(dpid, {}).items()
+                    if p == port), None)
+        if src is None or dst is None:
+            return self.capacity
+        has_core = any(role(n) == 'c' for n in self.switch_names.values())
+        return self.core_capacity if core_uplink(src, dst, has_core) else self.capacity
+
+    def _link_ports(self, dpid):
+        return set(self.adjacency.get(dpid, {}).values())
+
+    # ------------------------------------------------------------ forwarding
+
+    def _add_flow(self, dp, priority, match, actions, idle_timeout=0, cookie=0):
+        ofp, parser = dp.ofproto, dp.ofproto_parser
+        inst = [parser.OFPInstructionActions(ofp.OFPIT_APPLY_ACTIONS, actions)] if actions else []
+        dp.send_msg(parser.OFPFlowMod(datapath=dp, priority=priority, match=match,
+                                      instructions=inst, idle_timeout=idle_timeout,
+                                      cookie=cookie,
+                                      flags=ofp.OFPFF_SEND_FLOW_REM if idle_timeout else 0))
+
+    def _flow_match(self, parser, key):
+        src, dst, proto, sport, dport = key
+        fields = dict(eth_type=ether_types.ETH_TYPE_IP, ipv4_src=src, ipv4_dst=dst,
+                      ip_proto=proto)
+        if proto == 6:
+            fields.update(tcp_src=sport, tcp_dst=dport)
+        elif proto == 17:
+            fields.update(udp_src=sport, udp_dst=dport)
+        return parser.OFPMatch(**fields)
+
+    def _install_path(self, key, path, out_port):
+        """Install `key` along `path`, egress switch first so no packet outruns its entry."""
+        hops = list(zip(path, [self.adjacency[a][b] for a, b in zip(path, path[1:])] + [out_port]))
+        for dpid, port in reversed(hops):
+            dp = self.datapaths.get(dpid)
+            if dp is None:
+                continue
+            parser = dp.ofproto_parser
+            self._add_flow(dp, FLOW_PRIORITY, self._flow_match(parser, key),
+                           [parser.OFPActionOutput(port)],
+                           idle_timeout=self.conf.idle_timeout, cookie=FLOW_COOKIE)
+
+    def _remove_from(self, key, dpids):
+        for dpid in dpids:
+            dp = self.datapaths.get(dpid)
+            if dp is None:
+                continue
+            ofp, parser = dp.ofproto, dp.ofproto_parser
+            dp.send_msg(parser.OFPFlowMod(datapath=dp, command=ofp.OFPFC_DELETE_STRICT,
+                                          priority=FLOW_PRIORITY, out_port=ofp.OFPP_ANY,
+                                          out_group=ofp.OFPG_ANY,
+                                          match=self._flow_match(parser, key)))
+
+    def _flood_to_hosts(self, data, skip):
+        """Deliver a packet for an unknown host to every host-facing port."""
+        for dpid, ports in self.switch_ports.items():
+            dp = self.datapaths.get(dpid)
+            if dp is None:
+                continue
+            for port in sorted(ports - self._link_ports(dpid)):
+                if (dpid, port) == skip or port > dp.ofproto.OFPP_MAX:
+                    continue
+                self._packet_out(dp, port, data)
+
+    def _packet_out(self, dp, port, data):
+        ofp, parser = dp.ofproto, dp.ofproto_parser
+        dp.send_msg(parser.OFPPacketOut(datapath=dp, buffer_id=ofp.OFP_NO_BUFFER,
+                                        in_port=ofp.OFPP_CONTROLLER,
+                                        actions=[parser.OFPActionOutput(port)], data=data))
+
+    @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
+    def packet_in_handler(self, ev):
+        msg = ev.msg
+        dp = msg.datapath
+        in_port = msg.match['in_port']
+        pkt = packet.Packet(msg.data)
+        eth = pkt.get_protocol(ethernet.ethernet)
+        if eth is None or eth.ethertype == ether_types.ETH_TYPE_LLDP:
+            return
+        ip = pkt.get_protocol(ipv4.ipv4)
+        if ip is None:
+            return
+
+        # Learn hosts only once this switch's links are known, so an
+        # inter-switch port is never mistaken for a host port
+        if self.adjacency.get(dp.id) and in_port not in self._link_ports(dp.id):
+            self.hosts[ip.src] = (dp.id, in_port)
+        if ip.dst not in self.hosts:
+            self._flood_to_hosts(msg.data, skip=(dp.id, in_port))
+            return
+
+        l4 = pkt.get_protocol(tcp.tcp) or pkt.get_protocol(udp.udp)
+        key = (ip.src, ip.dst, ip.proto,
+               l4.src_port if l4 else 0, l4.dst_port if l4 else 0)
+        dst_dpid, dst_port = self.hosts[ip.dst]
+        paths = hedera.all_shortest_paths(self.adjacency, dp.id, dst_dpid)
+        if not paths:
+            self.logger.warning("No path from %016x to %016x yet", dp.id, dst_dpid)
+            return
+        path = hedera.ecmp_path(paths, key)
+        self._install_path(key, path, dst_port)
+        self.flows[key] = {'path': path, 'out_port': dst_port, 'bytes': 0,
+                           'time': time.time(), 'rate': 0.0,
+                           'src_host': ip.src, 'dst_host': ip.dst}
+        self._packet_out(self.datapaths[dst_dpid], dst_port, msg.data)
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def flow_removed_handler(self, ev):
+        key = self._key_from_match(ev.msg.match)
+        state = self.flows.get(key)
+        # Only forget the flow when its ingress entry expires
+        if state is not None and ev.msg.datapath.id == state['path'][0]:
+            del self.flows[key]
+
+    # ------------------------------------------------------------ statistics
+
+    @staticmethod
+    def _key_from_match(match):
+        proto = match.get('ip_proto', 0)
+        sport = match.get('tcp_src', match.get('udp_src', 0))
+        dport = match.get('tcp_dst', match.get('udp_dst', 0))
+        return (match.get('ipv4_src'), match.get('ipv4_dst'), proto, sport, dport)
+
+    def _poll_loop(self):
+        next_schedule = time.time() + self.conf.schedule_interval
+        while True:
+            for dp in list(self.datapaths.values()):
+                ofp, parser = dp.ofproto, dp.ofproto_parser
+                dp.send_msg(parser.OFPPortStatsRequest(dp, 0, ofp.OFPP_ANY))
+                dp.send_msg(parser.OFPFlowStatsRequest(dp, cookie=FLOW_COOKIE,
+                                                       cookie_mask=0xffffffffffffffff,
+                                                       table_id=ofp.OFPTT_ALL))
+            hub.sleep(self.conf.poll_interval)
+            if self.conf.mode == 'hedera' and time.time() >= next_schedule:
+                self.schedule()
+                next_schedule = time.time() + self.conf.schedule_interval
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    def flow_stats_reply_handler(self, ev):
+        now = time.time()
+        dpid = ev.msg.datapath.id
+        for stat in ev.msg.body:
+            state = self.flows.get(self._key_from_match(stat.match))
+            if state is None or state['path'][0] != dpid:
+                continue
+            elapsed = now - state['time']
+            # Counters restart when an entry is replaced during a reroute
+            delta = stat.byte_count - state['bytes'] if stat.byte_count >= state['bytes'] \
+                else stat.byte_count
+            if elapsed > 0:
+                state['rate'] = delta * 8 / elapsed / 1e6
+            state['bytes'], state['time'] = stat.byte_count, now
+
+    @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
+    def port_stats_reply_handler(self, ev):
+        now = time.time()
+        dpid = ev.msg.datapath.id
+        for stat in ev.msg.body:
+            link = (dpid, stat.port_no)
+            last = self._port_last.get(link)
+            if last is not None and now > last[1] and stat.tx_bytes >= last[0]:
+                self.port_load[link] = (stat.tx_bytes - last[0]) * 8 / (now - last[1]) / 1e6
+            self._port_last[link] = (stat.tx_bytes, now)
+
+    # ------------------------------------------------------------ scheduling
+
+    def schedule(self):
+        """One Hedera round: detect large flows, estimate demand, Global First Fit."""
+        large = [(k, s) for k, s in self.flows.items() if s['rate'] >= self.threshold]
+        if not large:
+            return
+        demands = hedera.estimate_demands([(s['src_host'], s['dst_host']) for _, s in large])
+        candidates = {k: hedera.all_shortest_paths(self.adjacency, s['path'][0], s['path'][-1])
+                      for k, s in large}
+        placement = hedera.global_first_fit(
+            [(k, d * self.capacity, s['path']) for (k, s), d in zip(large, demands)],
+            candidates, self.adjacency, self._link_capacity, self.port_load)
+
+        for (key, state), demand in zip(large, demands):
+            new = placement[key]
+            if new == state['path']:
+                continue
+            old = state['path']
+            self._install_path(key, new, state['out_port'])
+            self._remove_from(key, set(old) - set(new))
+            state['path'] = new
+            self.reroutes += 1
+            self.logger.info("Rerouted %s (%.2f Mbps, demand %.2f Mbps): %s -> %s", key,
+                             state['rate'], demand * self.capacity, old, new)
+            if self.event_log:
+                self.event_log.write(
+                    f"{time.time():.6f},{'-'.join(map(str, key))},{demand * self.capacity:.4f},"
+                    f"{state['rate']:.4f},{'-'.join(map(str, old))},{'-'.join(map(str, new))}\n")
+                self.event_log.flush()
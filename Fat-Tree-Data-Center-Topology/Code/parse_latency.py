@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import argparse
 import re
 import csv
 import sys
@@ -30,39 +31,46 @@ def extract_timestamps(logfile, pattern):
     
     return ts
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pair client send and server receive timestamps")
+    parser.add_argument('--client-log', default=CLIENT_LOG)
+    parser.add_argument('--server-log', default=SERVER_LOG)
+    parser.add_argument('--output',     default=OUTPUT_CSV)
+    args = parser.parse_args(argv)
+    client_log, server_log, output_csv = args.client_log, args.server_log, args.output
+
     # 1) Extract send times from the client log
     sends = extract_timestamps(
-        CLIENT_LOG,
+        client_log,
         r"Sent .* at ([0-9]+\.[0-9]+)"
     )
 
     # 2) Extract receive‑complete times from the server log
     recvs = extract_timestamps(
-        SERVER_LOG,
+        server_log,
         r"Completed receiving .* at ([0-9]+\.[0-9]+)"
     )
 
     if len(sends) == 0 and len(recvs) == 0:
         print(f"Error: No timestamps found in logs. Traffic may not be flowing correctly.", file=sys.stderr)
         # Create an empty but valid CSV to avoid downstream errors
-        with open(OUTPUT_CSV, 'w', newline='') as out:
+        with open(output_csv, 'w', newline='') as out:
             writer = csv.writer(out)
             writer.writerow(["batch", "latency_s"])
-        print(f"Created empty {OUTPUT_CSV} file")
+        print(f"Created empty {output_csv} file")
         return
         
     if len(sends) != len(recvs):
         print(f"Warning: {len(sends)} sends vs {len(recvs)} receives", file=sys.stderr)
 
     # 3) Pair them up and write CSV
-    with open(OUTPUT_CSV, 'w', newline='') as out:
+    with open(output_csv, 'w', newline='') as out:
         writer = csv.writer(out)
         writer.writerow(["batch", "latency_s"])
         for i, (s, r) in enumerate(zip(sends, recvs)):
             writer.writerow([i, r - s])
 
-    print(f"Wrote {min(len(sends), len(recvs))} latency records to {OUTPUT_CSV}")
+    print(f"Wrote {min(len(sends), len(recvs))} latency records to {output_csv}")
 
 if __name__ == "__main__":
     main()
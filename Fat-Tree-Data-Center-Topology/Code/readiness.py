@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+readiness.py: Readiness probes and completion waits for the orchestrators
+
+The orchestrators advance on events rather than fixed sleeps. Each probe
+returns as soon as its event is seen, and the timeout only bounds the
+wait:
+
+  wait_for_controller(port)       the controller accepts OpenFlow connections
+  wait_for_fabric(net)            every switch is connected to the controller
+                                  and pings cross the fabric end to end
+  wait_for_line(path, needle)     a log line, e.g. the replay server's
+                                  "Listening" (port bound) or "Shut down"
+  wait_for_job(agent, job)        a replay-agent job exits; the wait runs
+                                  past its timeout while the job's log
+                                  keeps growing, so slow replays finish
+"""
+
+import os
+import socket
+import time
+
+def wait_for_line(path, needle, timeout, interval=0.05):
+    """Follow a log file until `needle` appears or `timeout` seconds elapse."""
+    deadline = time.time() + timeout
+    offset, tail = 0, ''
+    while True:
+        if os.path.exists(path):
+            with open(path) as f:
+                f.seek(offset)
+                chunk = f.read()
+                offset = f.tell()
+            if needle in tail + chunk:
+                return True
+            # keep enough of the end to match a needle split across reads
+            tail = (tail + chunk)[-len(needle):]
+        if time.time() >= deadline:
+            return False
+        time.sleep(interval)
+
+def wait_for_controller(port=6653, host='127.0.0.1', timeout=30, interval=0.2):
+    """True once a TCP connection to the controller's OpenFlow port succeeds."""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return True
+        except OSError:
+            if time.time() >= deadline:
+                return False
+            time.sleep(interval)
+
+def ping_ok(src, dst):
+    return ' 0% packet loss' in src.cmd(f"ping -c 1 -W 1 {dst.IP()}")
+
+def wait_for_fabric(net, pairs=None, timeout=60, interval=0.5):
+    """
+    Wait until every switch reports a controller connection and a ping
+    succeeds for each (src, dst) host pair (default: the first host to every
+    other host), i.e. the controller has installed working paths. Returns
+    the seconds it took, or None on timeout.
+    """
+    start = time.time()
+    deadline = start + timeout
+    if pairs is None:
+        pairs = [(net.hosts[0], h) for h in net.hosts[1:]]
+    while not all(sw.connected() for sw in net.switches):
+        if time.time() >= deadline:
+            print("WARNING: not every switch connected to the controller")
+            return None
+        time.sleep(interval)
+    pending = list(pairs)
+    while pending:
+        pending = [(src, dst) for src, dst in pending if not ping_ok(src, dst)]
+        if not pending:
+            break
+        if time.time() >= deadline:
+            names = ', '.join(f"{src.name}->{dst.name}" for src, dst in pending[:5])
+            print(f"WARNING: {len(pending)} host pairs still unreachable after {timeout}s ({names})")
+            return None
+        time.sleep(interval)
+    elapsed = time.time() - start
+    print(f"*** Fabric ready after {elapsed:.1f}s")
+    return elapsed
+
+def wait_for_job(agent, job, timeout, stall=30.0, step=1.0):
+    """
+    Wait for a replay-agent job to exit. After `timeout` seconds keep
+    waiting for as long as the job's log grew within the last `stall`
+    seconds. Returns the job description ('running' is True if it was
+    given up on).
+    """
+    deadline = time.time() + timeout
+    size, changed = -1, time.time()
+    while True:
+        state = agent.wait(job, timeout=step)
+        if not state['running']:
+            return state
+        now = time.time()
+        current = os.path.getsize(state['log']) if os.path.exists(state['log']) else 0
+        if current != size:
+            size, changed = current, now
+        if now >= deadline and now - changed >= stall:
+            return state
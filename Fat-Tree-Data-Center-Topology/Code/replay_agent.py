@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+replay_agent.py: Long-lived traffic_replay daemon, one per host
+
+Started once per host (inside its network namespace) after the fabric comes
+up. Commands arrive as JSON lines on a local Unix control socket; each
+reply is one JSON line. Jobs run traffic_replay.py's functions in a forked
+child with stdout/stderr sent to the job's log, so there is no interpreter
+start-up per trial and the log format is unchanged.
+
+  {"cmd": "serve",  "port": 5000, "log": "h16_server.log", "connections": 0}
+  {"cmd": "client", "host": "10.0.0.16", "port": 5000, "csv": "profile.csv", "log": ...}
+  {"cmd": "burst",  "host": ..., "port": ..., "bytes": 248024, "start_at": ..., "log": ...}
+  {"cmd": "tm",     "shard": "h3.tmx", "hosts_map": {...}, "port": ..., "start_at": ..., "log": ...}
+  {"cmd": "wait",   "job": 2, "timeout": 60}   replies once the job exits (or on timeout)
+  {"cmd": "stop",   "job": 1}
+  {"cmd": "reset"}                            zero the TCP and interface counters
+  {"cmd": "stats"}                            counters since reset, plus every job
+  {"cmd": "shutdown"}
+
+`serve` binds and listens before it replies, so a reply with "ok" means the
+port is ready. connections=0 (the default) keeps the server accepting
+workers until it is stopped. Every job command also takes "transport"
+(a traffic_replay.transport_options dict).
+
+The orchestrator side is Agent (connect over the socket) and launch(node),
+which starts the daemon on a Mininet host and returns a connected Agent:
+
+  agent = launch(net.get('h16'), log_dir='results/x')
+  agent.serve(5000, 'results/x/h16_server.log')
+"""
+
+import argparse
+import json
+import os
+import selectors
+import signal
+import socket
+import sys
+import time
+
+import traffic_replay
+
+STATE_DIR = '/tmp'
+
+
+def control_path(name):
+    """Per orchestrator process, so concurrent runs with the same host names never share a socket."""
+    return os.path.join(STATE_DIR, f"replay_agent_{os.getpid()}_{name}.sock")
+
+def read_counters():
+    """TCP segment counters from /proc/net/snmp and summed interface bytes from /proc/net/dev."""
+    counters = {}
+    with open('/proc/net/snmp') as f:
+        tcp = [line.split() for line in f if line.startswith('Tcp:')]
+    if len(tcp) >= 2:
+        fields = dict(zip(tcp[0][1:], tcp[1][1:]))
+        for name in ('OutSegs', 'InSegs', 'RetransSegs', 'ActiveOpens', 'PassiveOpens'):
+            counters[name] = int(fields.get(name, 0))
+    rx = tx = 0
+    with open('/proc/net/dev') as f:
+        for line in f.readlines()[2:]:
+            intf, data = line.split(':', 1)
+            if intf.strip() == 'lo':
+                continue
+            cols = data.split()
+            rx += int(cols[0])
+            tx += int(cols[8])
+    counters['rx_bytes'] = rx
+    counters['tx_bytes'] = tx
+    return counters
+
+
+class Job:
+    def __init__(self, job_id, kind, pid, log):
+        self.id = job_id
+        self.kind = kind
+        self.pid = pid
+        self.log = log
+        self.started = time.time()
+        self.ended = None
+        self.status = None
+
+    def describe(self):
+        return {'job': self.id, 'kind': self.kind, 'pid': self.pid, 'log': self.log,
+                'running': self.ended is None, 'exit': self.status,
+                'elapsed_s': round((self.ended or time.time()) - self.started, 6)}
+
+
+class Daemon:
+    """Control loop: single-threaded, so forking a job never copies a lock held by another thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self.jobs = {}
+        self.next_id = 1
+        self.waiters = []
+        self.baseline = read_counters()
+        self.reset_at = time.time()
+        self.running = True
+        self.sel = selectors.DefaultSelector()
+        self.buffers = {}
+
+    def spawn(self, kind, log, target, *args):
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                fd = os.open(log, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                os.dup2(fd, 1)
+                os.dup2(fd, 2)
+                sys.stdout = open(1, 'w', buffering=1, closefd=False)
+                sys.stderr = open(2, 'w', buffering=1, closefd=False)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                target(*args)
+            except BaseException as e:
+                print(f"[Agent] Job failed: {e}", file=sys.stderr)
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        job = Job(self.next_id, kind, pid, log)
+        self.jobs[job.id] = job
+        self.next_id += 1
+        return job
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            for job in self.jobs.values():
+                if job.pid == pid:
+                    job.ended = time.time()
+                    job.status = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+
+    def handle(self, msg):
+        cmd = msg.get('cmd')
+        transport = msg.get('transport')
+        if cmd == 'serve':
+            port = int(msg.get('port', 5000))
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            traffic_replay.configure_socket(sock, transport, "Server")
+            sock.bind(('0.0.0.0', port))
+            sock.listen(128)
+            job = self.spawn('serve', msg['log'], traffic_replay.run_server,
+                             port, int(msg.get('connections', 0)), transport, sock,
+                             msg.get('policy'), int(msg.get('staleness', 1)), msg.get('pull_bytes'))
+            sock.close()
+        elif cmd == 'client':
+            job = self.spawn('client', msg['log'], traffic_replay.run_client,
+                             msg['host'], int(msg['port']), msg['csv'], transport,
+                             msg.get('tcp_info_interval'), msg.get('tcp_info_log'),
+                             int(msg.get('stripes', 1)), int(msg.get('stripe_chunk', 65536)),
+                             msg.get('compute'), bool(msg.get('sync')), int(msg.get('sync_every', 1)))
+        elif cmd == 'burst':
+            job = self.spawn('burst', msg['log'], traffic_replay.run_burst,
+                             msg['host'], int(msg['port']), int(msg['bytes']),
+                             float(msg['start_at']), transport)
+        elif cmd == 'tm':
+            job = self.spawn('tm', msg['log'], traffic_replay.run_agent,
+                             msg['shard'], msg['hosts_map'], int(msg.get('port', 5000)),
+                             float(msg['start_at']), transport)
+        elif cmd == 'stop':
+            job = self.jobs[int(msg['job'])]
+            if job.ended is None:
+                os.kill(job.pid, signal.SIGTERM)
+            return {'ok': True, **job.describe()}
+        elif cmd == 'reset':
+            self.baseline = read_counters()
+            self.reset_at = time.time()
+            self.jobs = {i: j for i, j in self.jobs.items() if j.ended is None}
+            return {'ok': True}
+        elif cmd == 'stats':
+            now = read_counters()
+            return {'ok': True, 'since_s': round(time.time() - self.reset_at, 6),
+                    'counters': {k: v - self.baseline.get(k, 0) for k, v in now.items()},
+                    'jobs': [j.describe() for j in self.jobs.values()]}
+        elif cmd == 'ping':
+            return {'ok': True, 'pid': os.getpid()}
+        elif cmd == 'shutdown':
+            self.running = False
+            return {'ok': True}
+        else:
+            return {'ok': False, 'error': f"unknown command {cmd!r}"}
+        print(f"[Agent] Job {job.id}: {cmd} (pid {job.pid}) -> {job.log}")
+        return {'ok': True, **job.describe()}
+
+    def reply(self, conn, obj):
+        try:
+            conn.sendall((json.dumps(obj) + "\n").encode())
+        except OSError:
+            pass
+
+    def dispatch(self, conn, line):
+        try:
+            msg = json.loads(line)
+        except ValueError as e:
+            self.reply(conn, {'ok': False, 'error': f"bad request: {e}"})
+            return
+        if msg.get('cmd') == 'wait':
+            job = self.jobs.get(int(msg.get('job', 0)))
+            if job is None:
+                self.reply(conn, {'ok': False, 'error': f"no job {msg.get('job')}"})
+            else:
+                self.waiters.append((conn, job, time.time() + float(msg.get('timeout', 3600))))
+            return
+        try:
+            self.reply(conn, self.handle(msg))
+        except (KeyError, ValueError, TypeError, OSError) as e:
+            self.reply(conn, {'ok': False, 'error': f"{type(e).__name__}: {e}"})
+
+    def answer_waiters(self):
+        pending = []
+        for conn, job, deadline in self.waiters:
+            if job.ended is not None or time.time() >= deadline:
+                self.reply(conn, {'ok': job.ended is not None, **job.describe()})
+            else:
+                pending.append((conn, job, deadline))
+        self.waiters = pending
+
+    def serve_forever(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen(16)
+        self.sel.register(listener, selectors.EVENT_READ)
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, 'running', False))
+        print(f"[Agent] Control socket {self.path} ready (pid {os.getpid()})")
+        try:
+            while self.running:
+                for key, _ in self.sel.select(timeout=0.02):
+                    if key.fileobj is listener:
+                        conn, _ = listener.accept()
+                        self.buffers[conn] = b''
+                        self.sel.register(conn, selectors.EVENT_READ)
+                        continue
+                    conn = key.fileobj
+                    data = conn.recv(65536)
+                    if not data:
+                        self.sel.unregister(conn)
+                        self.buffers.pop(conn, None)
+                        self.waiters = [w for w in self.waiters if w[0] is not conn]
+                        conn.close()
+                        continue
+                    self.buffers[conn] += data
+                    while b'\n' in self.buffers[conn]:
+                        line, self.buffers[conn] = self.buffers[conn].split(b'\n', 1)
+                        self.dispatch(conn, line)
+                self.reap()
+                self.answer_waiters()
+        finally:
+            for job in self.jobs.values():
+                if job.ended is None:
+                    os.kill(job.pid, signal.SIGTERM)
+            time.sleep(0.1)
+            self.reap()
+            listener.close()
+            os.unlink(self.path)
+            print("[Agent] Shut down")
+
+
+class Agent:
+    """Orchestrator-side handle on one host's daemon."""
+
+    def __init__(self, path, name=None, timeout=10.0):
+        self.path = path
+        self.name = name or path
+        deadline = time.time() + timeout
+        while True:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                self.sock.connect(path)
+                break
+            except OSError:
+                self.sock.close()
+                if time.time() >= deadline:
+                    raise RuntimeError(f"replay agent {self.name} not reachable at {path}")
+                time.sleep(0.02)
+        self.reader = self.sock.makefile('r')
+
+    def call(self, cmd, **fields):
+        self.sock.sendall((json.dumps({'cmd': cmd, **fields}) + "\n").encode())
+        reply = self.reader.readline()
+        if not reply:
+            raise RuntimeError(f"replay agent {self.name} closed the control socket")
+        reply = json.loads(reply)
+        if not reply.get('ok') and 'error' in reply:
+            raise RuntimeError(f"replay agent {self.name}: {reply['error']}")
+        return reply
+
+    def serve(self, port, log, connections=0, transport=None, **opts):
+        return self.call('serve', port=port, log=os.path.abspath(log),
+                         connections=connections, transport=transport, **opts)['job']
+
+    def client(self, host, port, csv, log, transport=None, stripes=1, **opts):
+        return self.call('client', host=host, port=port, csv=os.path.abspath(csv),
+                         log=os.path.abspath(log), transport=transport, stripes=stripes,
+                         **opts)['job']
+
+    def burst(self, host, port, size, start_at, log, transport=None):
+        return self.call('burst', host=host, port=port, bytes=size, start_at=start_at,
+                         log=os.path.abspath(log), transport=transport)['job']
+
+    def tm(self, shard, hosts_map, port, start_at, log, transport=None):
+        return self.call('tm', shard=os.path.abspath(shard), hosts_map=hosts_map, port=port,
+                         start_at=start_at, log=os.path.abspath(log), transport=transport)['job']
+
+    def wait(self, job, timeout):
+        """Job description once it exits; 'running' is still True on timeout."""
+        return self.call('wait', job=job, timeout=timeout)
+
+    def stop(self, job):
+        return self.call('stop', job=job)
+
+    def reset(self):
+        return self.call('reset')
+
+    def stats(self):
+        return self.call('stats')
+
+    def shutdown(self):
+        try:
+            self.call('shutdown')
+        except (RuntimeError, OSError):
+            pass
+        self.sock.close()
+
+
+def launch(node, log_dir='.', python='python3'):
+    """Start the daemon on a Mininet host and return a connected Agent."""
+    path = control_path(node.name)
+    here = os.path.dirname(os.path.abspath(__file__))
+    log = os.path.join(os.path.abspath(log_dir), f"{node.name}_agent.log")
+    node.cmd(f"{python} -u {os.path.join(here, 'replay_agent.py')} --control {path} > {log} 2>&1 &")
+    return Agent(path, node.name)
+
+def launch_all(nodes, log_dir='.'):
+    return {n.name: launch(n, log_dir) for n in nodes}
+
+
+def main():
+    p = argparse.ArgumentParser(description="Persistent traffic_replay agent with a Unix control socket")
+    p.add_argument('--control', type=str, required=True, help='Path of the Unix control socket')
+    args = p.parse_args()
+    Daemon(args.control).serve_forever()
+
+if __name__ == '__main__':
+    main()
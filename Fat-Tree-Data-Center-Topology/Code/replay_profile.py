@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+replay_profile.py: Binary traffic profiles for traffic_replay.py
+
+A .rprof file is a 64-byte header followed by fixed-size little-endian
+records, readable as a NumPy structured array:
+
+  header : b'RPRF', uint16 version, uint64 rows, float64 total interval_s,
+           uint64 total grad_bytes, uint64 max grad_bytes, uint32 epochs
+  record : uint32 epoch, uint32 batch, float64 interval_s, uint64 grad_bytes
+
+The header holds the totals, so the runtime of a profile of any length is
+known without reading it (run_sim_fat_tree.compute_total_runtime). The
+client memory-maps the records (np.memmap, or mmap + struct without NumPy)
+and converts them a block at a time, so start-up is constant and nothing
+is parsed inside the paced loop. CSV profiles still work everywhere; they
+are parsed in full before the first send.
+
+  python3 replay_profile.py convert cifar_traffic_profile.csv cifar.rprof
+  python3 replay_profile.py convert cifar_profile.json cifar.rprof   # forward_s + backward_s
+  python3 replay_profile.py convert cifar.rprof roundtrip.csv
+  python3 replay_profile.py info cifar.rprof
+"""
+
+import argparse
+import csv
+import json
+import mmap
+import struct
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b'RPRF'
+VERSION = 1
+HEADER = struct.Struct('<4sHxxQdQQI')
+HEADER_SIZE = 64
+RECORD = struct.Struct('<IIdQ')
+FIELDS = ('epoch', 'batch', 'interval_s', 'grad_bytes')
+DTYPE = np.dtype([('epoch', '<u4'), ('batch', '<u4'),
+                  ('interval_s', '<f8'), ('grad_bytes', '<u8')]) if np else None
+BLOCK = 65536
+
+
+def is_binary(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        raw = f.read(HEADER_SIZE)
+    magic, version, rows, total_s, total_bytes, max_bytes, epochs = HEADER.unpack(raw[:HEADER.size])
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a binary replay profile")
+    if version != VERSION:
+        raise ValueError(f"{path}: unsupported profile version {version}")
+    return {'rows': rows, 'total_interval_s': total_s, 'total_bytes': total_bytes,
+            'max_grad_bytes': max_bytes, 'epochs': epochs}
+
+
+def write_profile(path, rows):
+    """
+    Stream (epoch, batch, interval_s, grad_bytes) tuples into a .rprof file
+    and fill in the header totals at the end; memory use does not grow with
+    the number of rows.
+    """
+    count = total_bytes = max_bytes = 0
+    total_s = 0.0
+    epochs = set()
+    buf = []
+    with open(path, 'wb') as f:
+        f.write(b'\x00' * HEADER_SIZE)
+        for epoch, batch, interval, size in rows:
+            buf.append(RECORD.pack(epoch, batch, interval, size))
+            count += 1
+            total_s += interval
+            total_bytes += size
+            max_bytes = max(max_bytes, size)
+            epochs.add(epoch)
+            if len(buf) >= BLOCK:
+                f.write(b''.join(buf))
+                buf = []
+        f.write(b''.join(buf))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, count, total_s, total_bytes, max_bytes, len(epochs)))
+    return path
+
+def iter_rows(path):
+    """(epoch, batch, interval_s, grad_bytes) of every row of a .rprof, CSV or JSON profile."""
+    if is_binary(path):
+        with Profile(path) as p:
+            for i in range(0, len(p), BLOCK):
+                yield from p.block(i, i + BLOCK)
+    elif path.endswith('.json'):
+        with open(path) as f:
+            for row in json.load(f):
+                yield (int(row['epoch']), int(row['batch']),
+                       float(row['forward_s']) + float(row['backward_s']), int(row['grad_bytes']))
+    else:
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                yield (int(row['epoch']), int(row['batch']),
+                       float(row['interval_s']), int(row['grad_bytes']))
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for epoch, batch, interval, size in rows:
+            writer.writerow([epoch, batch, repr(interval), size])
+    return path
+
+def convert(src, dst):
+    """CSV/JSON -> .rprof, or .rprof -> CSV, chosen by the destination's extension."""
+    rows = iter_rows(src)
+    return write_csv(dst, rows) if dst.endswith('.csv') else write_profile(dst, rows)
+
+
+class Profile:
+    """Memory-mapped .rprof records; block(i, j) returns rows i..j-1 as Python tuples."""
+
+    def __init__(self, path):
+        self.header = read_header(path)
+        self.rows = self.header['rows']
+        self._file = open(path, 'rb')
+        self._mm = None
+        self.records = None
+        if self.rows == 0:
+            return
+        if np is not None:
+            self.records = np.memmap(path, dtype=DTYPE, mode='r', offset=HEADER_SIZE, shape=(self.rows,))
+        else:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.rows
+
+    def block(self, i, j):
+        j = min(j, self.rows)
+        if i >= j:
+            return []
+        if self.records is not None:
+            return self.records[i:j].tolist()
+        view = memoryview(self._mm)[HEADER_SIZE + i * RECORD.size:HEADER_SIZE + j * RECORD.size]
+        try:
+            return list(RECORD.iter_unpack(view))
+        finally:
+            view.release()
+
+    def close(self):
+        self.records = None
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def schedule(path, log=None):
+    """
+    (row index, interval_s, grad_bytes) for the replay client. A binary
+    profile is read lazily from the memory map a block at a time; a CSV is
+    parsed completely up front (rows that fail to parse are reported and
+    skipped), so no parsing happens between sends.
+    """
+    if is_binary(path):
+        return _binary_schedule(path)
+    rows = []
+    with open(path, newline='') as f:
+        for idx, row in enumerate(csv.DictReader(f)):
+            try:
+                rows.append((idx, float(row['interval_s']), int(row['grad_bytes'])))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"{log or ''}Error parsing row {idx}: {e}", file=sys.stderr)
+    return rows
+
+def _binary_schedule(path):
+    with Profile(path) as p:
+        for i in range(0, len(p), BLOCK):
+            for k, (_, _, interval, size) in enumerate(p.block(i, i + BLOCK)):
+                yield i + k, interval, size
+
+def total_interval(path):
+    """Sum of interval_s: read from the header of a binary profile, summed for CSV/JSON."""
+    if is_binary(path):
+        return read_header(path)['total_interval_s']
+    return sum(interval for _, _, interval, _ in iter_rows(path))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Convert and inspect binary replay profiles")
+    sub = p.add_subparsers(dest='cmd', required=True)
+    c = sub.add_parser('convert', help='CSV/JSON -> .rprof, or .rprof -> CSV')
+    c.add_argument('src')
+    c.add_argument('dst')
+    i = sub.add_parser('info', help='Print the header of a .rprof file')
+    i.add_argument('profile')
+    args = p.parse_args()
+    if args.cmd == 'convert':
+        convert(args.src, args.dst)
+        print(f"Wrote {args.dst}")
+    else:
+        h = read_header(args.profile)
+        print(f"{h['rows']} rows over {h['epochs']} epochs, {h['total_interval_s']:.3f}s, "
+              f"{h['total_bytes']} bytes (max message {h['max_grad_bytes']} bytes)")
+
+if __name__ == '__main__':
+    main()
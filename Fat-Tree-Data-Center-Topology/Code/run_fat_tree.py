@@ -1,24 +1,134 @@
 #!/usr/bin/env python3
 """
 run_fat_tree.py: Launch a k‑ary fat‑tree and run train.py on every host.
+
+Ranks are placed pod by pod and edge by edge, so that neighbours in gloo's
+ring (consecutive ranks) share an edge switch or at least a pod. All ranks
+start concurrently; the launcher follows their exit codes and per-rank
+progress lines, and tears the network down once they finish (pass --cli to
+drop into the Mininet CLI afterwards instead).
 """
 import argparse
+import os
+import re
+import time
 from mininet.net import Mininet
 from mininet.node import OVSKernelSwitch, RemoteController
 from mininet.link import TCLink
 from mininet.cli  import CLI
-from fat_tree    import MyTopo
+from fat_tree    import make_topo
+from run_sim_fat_tree import apply_core_rate
+from autotune_ddp import profile_key
+
+TRAIN_PY = "/home/mininet/train.py"
+PYTHON   = "/home/mininet/torch-env/bin/python"
+LOG_DIR  = "/home/mininet"
+PROGRESS_RE = re.compile(r"PROGRESS rank=([0-9]+) epoch=([0-9]+) step=([0-9]+)")
+
+def host_locations(net):
+    """Map host name -> (pod, edge switch name) from the live link graph."""
+    neighbours = {}
+    for link in net.links:
+        a, b = link.intf1.node.name, link.intf2.node.name
+        neighbours.setdefault(a, set()).add(b)
+        neighbours.setdefault(b, set()).add(a)
+    aggs = sorted({n for n in neighbours if n.startswith('a')},
+                  key=lambda n: int(n[1:]))
+    # Aggregation switches that share edge switches belong to the same pod
+    pod_of_agg = {}
+    for agg in aggs:
+        if agg in pod_of_agg:
+            continue
+        pod = len(set(pod_of_agg.values()))
+        edges = {n for n in neighbours[agg] if n.startswith('e')}
+        for other in aggs:
+            if edges & neighbours[other]:
+                pod_of_agg[other] = pod
+    locations = {}
+    for host in net.hosts:
+        edge = next(iter(neighbours[host.name]))
+        pods = [pod_of_agg[n] for n in neighbours.get(edge, ()) if n in pod_of_agg]
+        locations[host.name] = (min(pods) if pods else 0, edge)
+    return locations
+
+def place_ranks(net, world_size, placement='pod'):
+    """Choose the hosts for ranks 0..world_size-1."""
+    hosts = sorted(net.hosts, key=lambda h: int(h.name[1:]))
+    if placement == 'pod':
+        loc = host_locations(net)
+        hosts.sort(key=lambda h: (loc[h.name][0], int(loc[h.name][1][1:]), int(h.name[1:])))
+    return hosts[:world_size]
+
+def rank_progress(log_path):
+    """Last (epoch, step) a rank reported, or None."""
+    if not os.path.exists(log_path):
+        return None
+    last = None
+    with open(log_path, errors='replace') as f:
+        for line in f:
+            m = PROGRESS_RE.search(line)
+            if m:
+                last = (int(m.group(2)), int(m.group(3)))
+    return last
+
+def monitor(procs, timeout, interval=5.0):
+    """
+    Wait for every rank; stop all of them as soon as one fails.
+
+    procs maps rank -> (host, Popen, log path). Returns rank -> exit code
+    (None for ranks killed on timeout or after another rank failed).
+    """
+    codes = {}
+    deadline = time.time() + timeout if timeout else None
+    next_report = 0.0
+    while len(codes) < len(procs):
+        for rank, (host, proc, log) in procs.items():
+            if rank not in codes and proc.poll() is not None:
+                codes[rank] = proc.returncode
+                print(f"Rank {rank} on {host.name} exited with code {proc.returncode}")
+        failed = [r for r, c in codes.items() if c != 0]
+        timed_out = deadline is not None and time.time() > deadline
+        if failed or timed_out:
+            reason = f"rank {failed[0]} failed" if failed else f"timeout after {timeout}s"
+            print(f"Stopping remaining ranks: {reason}")
+            for rank, (host, proc, log) in procs.items():
+                if rank not in codes:
+                    proc.kill()
+                    proc.wait()
+                    codes[rank] = None
+            break
+        if time.time() >= next_report:
+            progress = {r: rank_progress(log) for r, (_, _, log) in procs.items()}
+            done = [p for p in progress.values() if p]
+            if done:
+                slowest = min(done)
+                print(f"Progress: {len(codes)}/{len(procs)} ranks exited, "
+                      f"slowest at epoch {slowest[0]} step {slowest[1]}")
+            next_report = time.time() + interval
+        time.sleep(0.5)
+    return codes
 
 def main():
     p = argparse.ArgumentParser()
-    p.add_argument('--k',          type=int, default=2,     help='pods in fat-tree (2→2 hosts)')
+    p.add_argument('--k',          type=int, default=2,     help='pods in fat-tree (k=2→4 hosts)')
+    p.add_argument('--topo',       type=str, default=None,  help='fabric from fat_tree.topos, e.g. leafspine,leaves=4 (default: fat-tree)')
+    p.add_argument('--world_size', type=int, default=None,  help='ranks to launch (default: every host)')
+    p.add_argument('--placement',  choices=['pod', 'numeric'], default='pod',
+                   help='pod: ranks grouped by pod/edge; numeric: h1..hN order')
+    p.add_argument('--timeout',    type=float, default=None, help='kill all ranks after this many seconds')
+    p.add_argument('--cli',        action='store_true',     help='open the Mininet CLI after training')
     p.add_argument('--master_port',type=int, default=12345, help='port for rank 0')
     p.add_argument('--epochs',     type=int, default=2,     help='epochs (smoke‑test)')
     p.add_argument('--batch_size', type=int, default=32,    help='batch size')
+    p.add_argument('--core_bw',    type=str, default=None,  help='rate limit on agg→core links, e.g. 10mbit')
+    p.add_argument('--compression',type=str, default='none',
+                   choices=['none', 'fp16', 'powersgd', 'topk'], help='gradient compression hook')
+    p.add_argument('--target_acc', type=float, default=None, help='report time-to-accuracy')
+    p.add_argument('--tuned_config',type=str, default=None,
+                   help='DDP tuning file from autotune_ddp.py (looked up by k/core_bw/topo)')
     args = p.parse_args()
 
-    world_size = args.k**3 // 4   # for k=2 → 2 hosts
-    topo       = MyTopo(k=args.k)
+    topo       = make_topo(args.topo, k=args.k)
     net        = Mininet(topo=topo,
                          controller=RemoteController,
                          switch=OVSKernelSwitch,
@@ -26,24 +136,49 @@ def main():
                          autoSetMacs=True,
                          autoStaticArp=True)
     net.start()
+    fabric     = args.topo or f"k={args.k} fat-tree"
+    world_size = args.world_size or len(net.hosts)
+    if world_size > len(net.hosts):
+        print(f"ERROR: world_size={world_size} but the {fabric} fabric has only "
+              f"{len(net.hosts)} hosts")
+        net.stop()
+        return
+    if args.core_bw:
+        print(f"Applying TBF rate={args.core_bw} on core links")
+        apply_core_rate(net, args.core_bw)
 
-    print(f"Iperf h1<->h2 on k={args.k} fat-tree")
+    print(f"Iperf h1<->h2 on the {fabric} fabric")
     net.iperf((net.hosts[0], net.hosts[1]))
 
-    master_ip = net.get('h1').IP()
-    for rank in range(world_size):
-        host = f'h{rank+1}'
+    hosts     = place_ranks(net, world_size, args.placement)
+    master_ip = hosts[0].IP()
+    tag     = f"{args.compression}_{args.core_bw or 'unlimited'}"
+    extra   = f"--compression {args.compression} --metrics_csv /home/mininet/metrics_{tag}.csv "
+    if args.target_acc is not None:
+        extra += f"--target_acc {args.target_acc} "
+    if args.tuned_config:
+        extra += (f"--tuned_config {args.tuned_config} "
+                  f"--net_profile '{profile_key(args.k, args.core_bw, topo=args.topo)}' ")
+    procs = {}
+    for rank, host in enumerate(hosts):
         cmd  = (
-            f"/home/mininet/torch-env/bin/python /home/mininet/train.py "
+            f"{PYTHON} {TRAIN_PY} "
             f"--rank {rank} --world_size {world_size} "
             f"--master_addr {master_ip} --master_port {args.master_port} "
-            f"--epochs {args.epochs} --batch_size {args.batch_size} "
-            f"> /home/mininet/{host}.log 2>&1 &"
+            f"--ifname {host.defaultIntf().name} --progress_every 20 "
+            f"--epochs {args.epochs} --batch_size {args.batch_size} {extra}"
         )
-        print(f"Launching rank={rank} on {host}")
-        net.get(host).cmd(cmd)
+        log = os.path.join(LOG_DIR, f"{host.name}.log")
+        print(f"Launching rank={rank} on {host.name}")
+        with open(log, "w") as out:
+            procs[rank] = (host, host.popen(cmd, shell=True, stdout=out, stderr=out), log)
+
+    codes = monitor(procs, args.timeout)
+    ok = all(c == 0 for c in codes.values())
+    print("All ranks finished successfully" if ok else f"Training failed: exit codes {codes}")
 
-    CLI(net)
+    if args.cli:
+        CLI(net)
     net.stop()
 
 if __name__ == '__main__':
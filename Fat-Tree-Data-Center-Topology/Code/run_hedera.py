@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+run_hedera.py
+
+Compare static ECMP with Hedera-style dynamic flow scheduling on a k-pod
+fat-tree. For each controller mode, ryu-manager is started with
+hedera_controller.py, the fat-tree is brought up, and each workload is run
+with bulk flows released at one barrier instant:
+
+  all-to-all  every host sends --flow-bytes to every other host
+  ps          every worker pushes --flow-bytes to the PS host while the PS
+              sends --flow-bytes back to every worker (push + pull)
+
+Aggregate throughput is the bytes received by all servers divided by the time
+from the barrier to the last completed flow. Results go to hedera.csv, with
+the gain of Hedera over ECMP printed per workload.
+
+Example:
+  sudo python3 run_hedera.py --k 4 --core-bw 10mbit --flow-bytes 2000000
+"""
+
+import argparse
+import csv
+import os
+import statistics
+import subprocess
+import time
+from mininet.net      import Mininet
+from mininet.node     import OVSKernelSwitch, RemoteController
+from mininet.link     import TCLink
+from fat_tree         import make_topo
+from run_incast       import completion_times
+from readiness        import wait_for_controller, wait_for_fabric, wait_for_line
+from run_sim_fat_tree import apply_core_rate
+from shaping_proxy    import parse_rate
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CONTROLLER = os.path.join(HERE, "hedera_controller.py")
+REPLAY = os.path.join(HERE, "traffic_replay.py")
+
+def start_controller(mode, args, log_dir):
+    # Global First Fit sees hosts and edge/agg links at the 10 Mbps of
+    # make_topo and only the shaped core uplinks at --core-bw
+    link_mbps = 10.0
+    core_mbps = parse_rate(args.core_bw) * 8 / 1e6 if args.core_bw else link_mbps
+    conf = os.path.join(log_dir, f"hedera_{mode}.conf")
+    events = os.path.join(log_dir, f"hedera_{mode}_events.csv")
+    with open(conf, "w") as f:
+        f.write("[hedera]\n")
+        f.write(f"mode = {mode}\n")
+        f.write(f"poll_interval = {args.poll_interval}\n")
+        f.write(f"schedule_interval = {args.schedule_interval}\n")
+        f.write(f"link_mbps = {link_mbps}\n")
+        f.write(f"core_mbps = {core_mbps}\n")
+        f.write(f"event_log = {events}\n")
+    proc = subprocess.Popen([args.ryu_manager, '--observe-links', '--config-file', conf, CONTROLLER],
+                            stdout=open(os.path.join(log_dir, f"ryu_{mode}.log"), "w"),
+                            stderr=subprocess.STDOUT)
+    if not wait_for_controller(6653, timeout=30):
+        print("WARNING: controller is not accepting OpenFlow connections")
+    return proc, events
+
+WORKLOADS = ('all-to-all', 'ps')
+MODES = ('ecmp', 'hedera')
+
+def workload_flows(workload, hosts, ps_name):
+    """(sender, receiver) pairs for one workload."""
+    if workload == 'all-to-all':
+        return [(s, r) for s in hosts for r in hosts if s is not r]
+    ps = next(h for h in hosts if h.name == ps_name)
+    workers = [h for h in hosts if h is not ps]
+    return [(w, ps) for w in workers] + [(ps, w) for w in workers]
+
+def run_workload(net, workload, args, port, log_dir, tag):
+    """Release every flow at one barrier; return (flows, bytes, makespan_s, start_at)."""
+    flows = workload_flows(workload, net.hosts, args.ps_host)
+    fan_in = {}
+    for _, r in flows:
+        fan_in[r] = fan_in.get(r, 0) + 1
+
+    server_logs = []
+    for r, n in fan_in.items():
+        log = os.path.join(log_dir, f"{tag}_{r.name}_server.log")
+        r.cmd(f"python3 -u {REPLAY} --mode server --port {port} --connections {n} > {log} 2>&1 &")
+        server_logs.append(log)
+    for log in server_logs:
+        if not wait_for_line(log, "Listening", timeout=10):
+            print(f"WARNING: {log} never reported listening")
+
+    start_at = time.time() + args.lead
+    for s, r in flows:
+        s.cmd(f"python3 -u {REPLAY} --mode burst --host {r.IP()} --port {port} "
+              f"--burst-bytes {args.flow_bytes} --start-at {start_at:.6f} "
+              f">> {os.path.join(log_dir, f'{tag}_{s.name}_client.log')} 2>&1 &")
+
+    received, last = 0, None
+    for log in server_logs:
+        if not wait_for_line(log, "Shut down", timeout=args.lead + args.timeout):
+            print(f"WARNING: {log} did not finish within {args.timeout}s")
+        for size, t in completion_times(log):
+            received += size
+            last = t if last is None else max(last, t)
+    for h in net.hosts:
+        h.cmd("pkill -f 'traffic_replay.py' 2>/dev/null")
+    makespan = (last - start_at) if last is not None else None
+    return len(flows), received, makespan, start_at
+
+def count_reroutes(events, start, end):
+    if not os.path.exists(events):
+        return 0
+    with open(events) as f:
+        return sum(1 for row in csv.DictReader(f) if start <= float(row['time']) <= end)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--k',                 type=int,   default=4)
+    p.add_argument('--topo',              type=str,   default=None,
+                   help='Fabric from fat_tree.topos, e.g. leafspine,leaves=8,oversub=3 (default: fat-tree)')
+    p.add_argument('--workloads',         type=str,   default='all-to-all,ps')
+    p.add_argument('--modes',             type=str,   default='ecmp,hedera')
+    p.add_argument('--ps-host',           type=str,   default='h16')
+    p.add_argument('--flow-bytes',        type=int,   default=2000000)
+    p.add_argument('--core-bw',           type=str,   default=None)
+    p.add_argument('--repeats',           type=int,   default=3)
+    p.add_argument('--poll-interval',     type=float, default=0.3)
+    p.add_argument('--schedule-interval', type=float, default=1.0)
+    p.add_argument('--port',              type=int,   default=5000)
+    p.add_argument('--lead',              type=float, default=3.0,
+                   help='Seconds between launching flows and the barrier')
+    p.add_argument('--settle',            type=float, default=15.0,
+                   help='Longest wait for LLDP link discovery and working paths')
+    p.add_argument('--timeout',           type=float, default=300.0)
+    p.add_argument('--ryu-manager',       type=str,   default='ryu-manager')
+    p.add_argument('--result-dir',        type=str,   default='results/hedera')
+    args = p.parse_args()
+
+    workloads = [w for w in args.workloads.split(',') if w]
+    modes = [m for m in args.modes.split(',') if m]
+    unknown = [w for w in workloads if w not in WORKLOADS] + [m for m in modes if m not in MODES]
+    if unknown:
+        p.error(f"unknown workload or mode: {', '.join(unknown)} "
+                f"(workloads: {', '.join(WORKLOADS)}; modes: {', '.join(MODES)})")
+    if 'ps' in workloads:
+        host_names = make_topo(args.topo, k=args.k).hosts()
+        if args.ps_host not in host_names:
+            p.error(f"--ps-host {args.ps_host} is not on the fabric "
+                    f"({args.topo or f'k={args.k} fat-tree'}: h1..h{len(host_names)})")
+    log_dir = os.path.abspath(os.path.join(args.result_dir, "logs"))
+    os.makedirs(log_dir, exist_ok=True)
+
+    rows = []
+    port = args.port
+    for mode in modes:
+        print(f"*** Starting controller in {mode} mode")
+        ryu, events = start_controller(mode, args, log_dir)
+        topo = make_topo(args.topo, k=args.k)
+        net  = Mininet(topo=topo,
+                       controller=RemoteController,
+                       switch=OVSKernelSwitch,
+                       link=TCLink,
+                       autoSetMacs=True,
+                       autoStaticArp=True)
+        net.start()
+        if args.core_bw:
+            print(f"*** Applying TBF rate={args.core_bw} on core links")
+            apply_core_rate(net, args.core_bw)
+        print(f"*** Waiting up to {args.settle}s for link discovery")
+        wait_for_fabric(net, timeout=args.settle)
+        net.pingAll()
+
+        for workload in workloads:
+            for rep in range(args.repeats):
+                port += 1
+                tag = f"{mode}_{workload}_r{rep}"
+                n, received, makespan, start_at = run_workload(net, workload, args, port,
+                                                               log_dir, tag)
+                reroutes = count_reroutes(events, start_at, start_at + (makespan or 0))
+                mbps = received * 8 / makespan / 1e6 if makespan else 0.0
+                print(f"*** {tag}: {n} flows, {received} bytes in {makespan}s "
+                      f"= {mbps:.2f} Mbps aggregate, {reroutes} reroutes")
+                rows.append({'workload': workload, 'mode': mode, 'repeat': rep, 'flows': n,
+                             'bytes': received,
+                             'makespan_s': '' if makespan is None else f"{makespan:.6f}",
+                             'aggregate_mbps': round(mbps, 4), 'reroutes': reroutes})
+        net.stop()
+        ryu.terminate()
+        ryu.wait()
+
+    out_csv = os.path.join(args.result_dir, "hedera.csv")
+    with open(out_csv, "w", newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ['workload'])
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"*** Wrote {len(rows)} trials to {out_csv}")
+
+    for workload in workloads:
+        means = {}
+        for mode in modes:
+            vals = [r['aggregate_mbps'] for r in rows if r['workload'] == workload and r['mode'] == mode]
+            if vals:
+                means[mode] = statistics.mean(vals)
+        summary = ", ".join(f"{m}={v:.2f} Mbps" for m, v in means.items())
+        if means.get('ecmp') and 'hedera' in means:
+            summary += f", gain={means['hedera'] / means['ecmp'] - 1:+.1%}"
+        print(f"*** {workload}: {summary}")
+
+if __name__ == '__main__':
+    main()
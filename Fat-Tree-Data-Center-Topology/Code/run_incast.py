@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+run_incast.py
+
+Synchronized incast on a k-pod fat-tree: N workers push one gradient burst
+each to a single receiver (the PS) at the same barrier-synchronized instant.
+
+Sweeps fan-in, burst size and the TBF buffer knobs (`limit`/`burst`) of
+apply_core_rate, and records per trial:
+  - completion time (barrier release -> last byte received at the PS)
+  - TCP retransmissions, summed from /proc/net/snmp in every host namespace
+  - goodput, giving one goodput-collapse curve per buffer setting
+
+Every host runs one replay_agent.py daemon for the whole sweep; each trial
+is a server job plus one burst job per sender, and completion is the
+server job exiting rather than a log poll.
+
+Example:
+  sudo python3 run_incast.py --core-bw 10mbit --fan-in 1,2,4,8,15 \
+      --burst-bytes 248024 --tbf-limit 20kb,200kb --tbf-burst 100kb
+"""
+
+import argparse
+import csv
+import os
+import re
+import time
+from mininet.net      import Mininet
+from mininet.node     import OVSKernelSwitch, RemoteController
+from mininet.link     import TCLink
+from fat_tree         import make_topo
+from run_sim_fat_tree import apply_core_rate
+from replay_agent     import launch_all
+from readiness        import wait_for_fabric
+
+def parse_list(value, cast=str):
+    return [cast(v) for v in value.split(',') if v]
+
+def completion_times(server_log):
+    """Timestamps of every 'Completed receiving' line in the server log."""
+    prog = re.compile(r"Completed receiving ([0-9]+) bytes .* at ([0-9]+\.[0-9]+)")
+    done = []
+    with open(server_log) as f:
+        for line in f:
+            m = prog.search(line)
+            if m:
+                done.append((int(m.group(1)), float(m.group(2))))
+    return done
+
+def run_trial(agents, receiver, senders, port, burst_bytes, lead, timeout, log_dir, tag):
+    rx_ip = receiver.IP()
+    server_log = os.path.join(log_dir, f"{tag}_server.log")
+    nodes = [receiver] + senders
+    for n in nodes:
+        agents[n.name].reset()
+
+    rx = agents[receiver.name]
+    server_job = rx.serve(port, server_log, connections=len(senders))
+
+    start_at = time.time() + lead
+    for w in senders:
+        agents[w.name].burst(rx_ip, port, burst_bytes, start_at,
+                             os.path.join(log_dir, f"{tag}_{w.name}.log"))
+
+    if rx.wait(server_job, timeout=lead + timeout)['running']:
+        print(f"WARNING: {tag} did not finish within {timeout}s")
+        rx.stop(server_job)
+    retrans = sum(agents[n.name].stats()['counters'].get('RetransSegs', 0) for n in nodes)
+
+    done = completion_times(server_log)
+    received = sum(size for size, _ in done)
+    complete = len(done) == len(senders) and received == burst_bytes * len(senders)
+    if not done:
+        return None, 0.0, retrans, complete
+    elapsed = max(t for _, t in done) - start_at
+    goodput = received * 8 / elapsed / 1e6 if elapsed > 0 else 0.0
+    return elapsed, goodput, retrans, complete
+
+def plot_collapse(rows, path):
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib not available; skipping goodput plot")
+        return
+    curves = {}
+    for r in rows:
+        if r['goodput_mbps'] == '':
+            continue
+        key = (r['tbf_limit'], r['tbf_burst'], r['burst_bytes'])
+        curves.setdefault(key, {}).setdefault(r['fan_in'], []).append(r['goodput_mbps'])
+    plt.figure(figsize=(10, 6))
+    for (limit, burst, size), points in sorted(curves.items()):
+        xs = sorted(points)
+        ys = [sum(points[x]) / len(points[x]) for x in xs]
+        plt.plot(xs, ys, marker='o',
+                 label=f"limit={limit} burst={burst} msg={size // 1024}KB")
+    plt.xlabel("Fan-in (synchronized senders)")
+    plt.ylabel("Goodput (Mbps)")
+    plt.title("Incast Goodput Collapse")
+    plt.grid(True, linestyle='--', alpha=0.7)
+    plt.legend()
+    plt.savefig(path)
+    print(f"Saved goodput collapse curves to {path}")
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--k',           type=int,   default=4)
+    p.add_argument('--topo',        type=str,   default=None,
+                   help='Fabric from fat_tree.topos, e.g. leafspine,leaves=8,oversub=3 (default: fat-tree)')
+    p.add_argument('--receiver',    type=str,   default='h16')
+    p.add_argument('--fan-in',      type=str,   default='1,2,4,8,15',
+                   help='Comma-separated numbers of synchronized senders')
+    p.add_argument('--burst-bytes', type=str,   default='248024',
+                   help='Comma-separated gradient burst sizes')
+    p.add_argument('--core-bw',     type=str,   default='10mbit')
+    p.add_argument('--tbf-limit',   type=str,   default='200kb',
+                   help='Comma-separated TBF queue limits for core links')
+    p.add_argument('--tbf-burst',   type=str,   default='100kb',
+                   help='Comma-separated TBF bucket sizes for core links')
+    p.add_argument('--repeats',     type=int,   default=3)
+    p.add_argument('--port',        type=int,   default=5000)
+    p.add_argument('--lead',        type=float, default=2.0,
+                   help='Seconds between launching senders and the barrier')
+    p.add_argument('--timeout',     type=float, default=120.0)
+    p.add_argument('--result-dir',  type=str,   default='results/incast')
+    args = p.parse_args()
+
+    fan_ins = parse_list(args.fan_in, int)
+    bursts  = parse_list(args.burst_bytes, int)
+    limits  = parse_list(args.tbf_limit)
+    buckets = parse_list(args.tbf_burst)
+    log_dir = os.path.abspath(os.path.join(args.result_dir, "logs"))
+    os.makedirs(log_dir, exist_ok=True)
+
+    topo = make_topo(args.topo, k=args.k)
+    net  = Mininet(topo=topo,
+                   controller=RemoteController,
+                   switch=OVSKernelSwitch,
+                   link=TCLink,
+                   autoSetMacs=True,
+                   autoStaticArp=True)
+    net.start()
+    print(f"*** Fat-tree (k={args.k}) up with {len(net.hosts)} hosts")
+    print("*** Waiting for controller to establish paths...")
+    wait_for_fabric(net)
+
+    receiver = net.get(args.receiver)
+    candidates = [h for h in net.hosts if h is not receiver]
+    if max(fan_ins) > len(candidates):
+        print(f"ERROR: fan-in {max(fan_ins)} exceeds the {len(candidates)} available senders")
+        net.stop()
+        return
+    agents = launch_all([receiver] + candidates, log_dir)
+
+    rows = []
+    port = args.port
+    for limit in limits:
+        for bucket in buckets:
+            print(f"*** Applying TBF rate={args.core_bw} burst={bucket} limit={limit}")
+            apply_core_rate(net, args.core_bw, tbf_limit=limit, burst=bucket)
+            for size in bursts:
+                for n in fan_ins:
+                    for rep in range(args.repeats):
+                        tag = f"l{limit}_b{bucket}_s{size}_n{n}_r{rep}"
+                        # Fresh port per trial so lingering TIME_WAIT sockets never interfere
+                        port += 1
+                        elapsed, goodput, retrans, complete = run_trial(
+                            agents, receiver, candidates[:n], port, size,
+                            args.lead, args.timeout, log_dir, tag)
+                        print(f"*** {tag}: completion={elapsed}s goodput={goodput:.2f}Mbps "
+                              f"retrans={retrans} complete={complete}")
+                        rows.append({
+                            'tbf_limit': limit, 'tbf_burst': bucket,
+                            'burst_bytes': size, 'fan_in': n, 'repeat': rep,
+                            'completion_s': '' if elapsed is None else f"{elapsed:.6f}",
+                            'goodput_mbps': '' if elapsed is None else round(goodput, 4),
+                            'retrans_segs': retrans, 'complete': int(complete),
+                        })
+
+    for agent in agents.values():
+        agent.shutdown()
+    net.stop()
+
+    out_csv = os.path.join(args.result_dir, "incast.csv")
+    with open(out_csv, "w", newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ['fan_in'])
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"*** Wrote {len(rows)} incast trials to {out_csv}")
+    plot_collapse(rows, os.path.join(args.result_dir, "incast_goodput.png"))
+
+if __name__ == '__main__':
+    main()
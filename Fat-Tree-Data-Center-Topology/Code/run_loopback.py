@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+run_loopback.py
+
+Run the run_sim_fat_tree.py replay workload without Mininet or root: the
+traffic_replay.py server and client talk over localhost through
+shaping_proxy.py, which applies the same --core-bw / tbf / netem knobs in
+userspace. Produces the same result files (h1_client.log, h16_server.log,
+latencies.csv, throughput.csv, sim.log, fidelity.csv/json) so parsers and
+reports run unchanged.
+
+Example:
+  python3 run_loopback.py --csv ../../cifar_traffic_profile.csv \
+      --core-bw 10mbit --qdisc tbf --result-dir results/loopback_10mbit
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import parse_latency
+from dilation import (dilate_netem, dilate_profile, dilate_rate, rescale_csv,
+                      rescale_throughput)
+from fidelity import FidelityWatchdog
+from readiness import wait_for_line
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPLAY = os.path.join(HERE, "traffic_replay.py")
+PROXY = os.path.join(HERE, "shaping_proxy.py")
+
+def proxy_args(args):
+    """Translate run_sim_fat_tree.py network knobs into shaping_proxy.py flags."""
+    flags = []
+    if args.qdisc == 'netem':
+        if args.netem_args:
+            flags += ['--netem-args', args.netem_args]
+    elif args.core_bw:
+        flags += ['--rate', args.core_bw, '--burst', args.tbf_burst, '--limit', args.tbf_limit]
+    return flags
+
+def start_shaped_server(args, port, proxy_port, server_log, proxy_log, connections=1,
+                        server_flags=()):
+    server = subprocess.Popen([sys.executable, '-u', REPLAY, '--mode', 'server',
+                               '--port', str(port), '--connections', str(connections)]
+                              + list(server_flags),
+                              stdout=open(server_log, 'w'), stderr=subprocess.STDOUT)
+    proxy = subprocess.Popen([sys.executable, '-u', PROXY, '--listen', str(proxy_port),
+                              '--upstream', f'127.0.0.1:{port}'] + proxy_args(args),
+                             stdout=open(proxy_log, 'w'), stderr=subprocess.STDOUT)
+    if not (wait_for_line(server_log, "Listening", 10) and wait_for_line(proxy_log, "Listening", 10)):
+        print("WARNING: server or proxy did not report listening in time")
+    return server, proxy
+
+def stop(*procs):
+    for p in procs:
+        if p.poll() is None:
+            p.terminate()
+            try:
+                p.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+def measure_bulk(args, out_dir):
+    """iperf stand-in: one bulk transfer through a fresh shaped path."""
+    server_log = os.path.join(out_dir, "bulk_server.log")
+    server, proxy = start_shaped_server(args, args.port + 1, args.proxy_port + 1, server_log,
+                                        os.path.join(out_dir, "bulk_proxy.log"))
+    start_at = time.time() + 0.5
+    subprocess.run([sys.executable, '-u', REPLAY, '--mode', 'burst', '--host', '127.0.0.1',
+                    '--port', str(args.proxy_port + 1), '--burst-bytes', str(args.bulk_bytes),
+                    '--start-at', f"{start_at:.6f}"],
+                   stdout=open(os.path.join(out_dir, "bulk_client.log"), 'w'),
+                   stderr=subprocess.STDOUT)
+    wait_for_line(server_log, "Shut down", args.timeout)
+    stop(server, proxy)
+    done = parse_latency.extract_timestamps(server_log, r"Completed receiving .* at ([0-9]+\.[0-9]+)")
+    if not done or done[-1] <= start_at:
+        return None
+    return args.bulk_bytes * 8 / (done[-1] - start_at) / 1e6
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--csv',        type=str,   required=True)
+    p.add_argument('--port',       type=int,   default=5000)
+    p.add_argument('--proxy-port', type=int,   default=6000)
+    p.add_argument('--core-bw',    type=str,   default=None)
+    p.add_argument('--qdisc',      choices=['fifo','tbf','netem','dctcp'], default='fifo')
+    p.add_argument('--netem-args', type=str,   default=None)
+    p.add_argument('--tbf-limit',  type=str,   default='200kb')
+    p.add_argument('--tbf-burst',  type=str,   default='100kb')
+    p.add_argument('--bulk-bytes', type=int,   default=4 * 1024 * 1024,
+                   help='Size of the bulk transfer used for throughput.csv')
+    p.add_argument('--stripes',    type=int,   default=1,
+                   help='Split each gradient over this many parallel connections')
+    p.add_argument('--dilation',   type=float, default=1.0,
+                   help='Time-dilation factor (see dilation.py)')
+    p.add_argument('--fidelity-interval', type=float, default=0.5,
+                   help='Seconds between emulation-fidelity samples')
+    p.add_argument('--timeout',    type=float, default=600.0)
+    p.add_argument('--result-dir', type=str,   default='results/loopback')
+    args = p.parse_args()
+
+    if args.qdisc == 'dctcp':
+        print("NOTE: DCTCP/ECN needs a kernel datapath; running as fifo over loopback")
+    out = args.result_dir
+    os.makedirs(out, exist_ok=True)
+    with open(os.path.join(out, "sim.log"), "w") as f:
+        f.write("Simulation parameters:\n")
+        f.write("  backend: loopback\n")
+        f.write(f"  csv: {args.csv}\n")
+        f.write(f"  core-bw: {args.core_bw}\n")
+        f.write(f"  qdisc: {args.qdisc}\n")
+        f.write(f"  tbf-limit: {args.tbf_limit}\n")
+        f.write(f"  tbf-burst: {args.tbf_burst}\n")
+        f.write(f"  netem-args: {args.netem_args}\n")
+        f.write(f"  stripes: {args.stripes}\n")
+        f.write(f"  dilation: {args.dilation}\n")
+
+    D = args.dilation
+    csv_path = args.csv
+    if D != 1:
+        args.core_bw = dilate_rate(args.core_bw, D)
+        args.netem_args = dilate_netem(args.netem_args, D)
+        csv_path = dilate_profile(args.csv, os.path.join(
+            out, "profile_dilated" + os.path.splitext(args.csv)[1]), D)
+        print(f"*** Time dilation x{D}: core rate {args.core_bw}, netem '{args.netem_args}'")
+
+    client_log = os.path.join(out, "h1_client.log")
+    server_log = os.path.join(out, "h16_server.log")
+    server, proxy = start_shaped_server(args, args.port, args.proxy_port, server_log,
+                                        os.path.join(out, "proxy.log"))
+    watchdog = FidelityWatchdog(out, interval=args.fidelity_interval)
+    watchdog.start()
+    print(f"*** Replaying {args.csv} through the shaping proxy")
+    try:
+        subprocess.run([sys.executable, '-u', REPLAY, '--mode', 'client', '--host', '127.0.0.1',
+                        '--port', str(args.proxy_port), '--csv', csv_path,
+                        '--stripes', str(args.stripes)],
+                       stdout=open(client_log, 'w'), stderr=subprocess.STDOUT,
+                       timeout=args.timeout)
+    except subprocess.TimeoutExpired:
+        print(f"WARNING: replay did not finish within {args.timeout}s")
+    if not wait_for_line(server_log, "Shut down", 30):
+        print("WARNING: server did not shut down after the replay")
+    stop(server, proxy)
+    watchdog.stop(client_log)
+
+    print("*** Parsing latency data")
+    parse_latency.main(['--client-log', client_log, '--server-log', server_log,
+                        '--output', os.path.join(out, "latencies.csv")])
+
+    print("*** Measuring bulk throughput")
+    mbps = measure_bulk(args, out)
+    with open(os.path.join(out, "throughput.csv"), "w") as f:
+        f.write("metric,value\n")
+        f.write(f"throughput_mbps,{mbps:.2f}\n" if mbps is not None else "throughput_mbps,missing\n")
+    rescale_csv(os.path.join(out, "latencies.csv"), ['latency_s'], 1 / D)
+    rescale_throughput(os.path.join(out, "throughput.csv"), D)
+    print(f"*** Done; logs saved to {out}.")
+
+if __name__ == '__main__':
+    main()
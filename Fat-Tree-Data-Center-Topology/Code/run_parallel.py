@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+run_parallel.py
+
+Run several isolated run_sim_fat_tree.py experiments at once on one machine.
+
+Each concurrent run gets a slot: a run id N (switch and interface prefix
+r<N>, its own DPID range and OpenFlow port 6653+N, see
+run_sim_fat_tree.py --run-id), a private ryu-manager on that port, and a
+disjoint set of --cpus-per-run CPUs from this process's affinity set.
+At most --jobs runs are active; a finished run hands its slot to the next
+one. `mn -c` runs once before the first run, never between runs, since it
+would tear down the fabrics of the runs still in progress.
+
+Usage:
+  sudo python3 run_parallel.py configs.json --repeats 3 --jobs 4 --cpus-per-run 2 \
+      --result-dir results/parallel
+
+configs.json uses the campaign.py format, {name: "run_sim_fat_tree.py flags"};
+results land in <result-dir>/<name>/runNN.
+"""
+
+import argparse
+import json
+import os
+import queue
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_APP = 'ryu.app.simple_switch_stp_13'
+BASE_PORT = 6653
+
+def cpu_slots(jobs, cpus_per_run=None):
+    """
+    Split the CPUs this process may use into `jobs` disjoint sets, as
+    run_sim_fat_tree.py --cpus strings. Fewer slots come back when there are
+    not enough CPUs for `jobs` runs of `cpus_per_run` each.
+    """
+    cpus = sorted(os.sched_getaffinity(0))
+    per_run = cpus_per_run or max(1, len(cpus) // jobs)
+    slots = [cpus[i:i + per_run] for i in range(0, len(cpus) - per_run + 1, per_run)][:jobs]
+    return [','.join(str(c) for c in slot) for slot in slots]
+
+def run_jobs(jobs, max_jobs=2, cpus_per_run=None, ryu_app=DEFAULT_APP, log_name="run.log"):
+    """
+    Run (label, run_sim_fat_tree.py flags, result_dir) jobs, at most
+    `max_jobs` at a time, each isolated in its own slot. Returns the exit
+    status of every job in order.
+    """
+    slots = cpu_slots(max_jobs, cpus_per_run)
+    if not slots:
+        raise ValueError(f"not enough CPUs for runs of {cpus_per_run} CPUs each")
+    if len(slots) < max_jobs:
+        print(f"*** Only {len(slots)} CPU slots available; running {len(slots)} at a time")
+    free = queue.Queue()
+    for run_id, cpus in enumerate(slots, start=1):
+        free.put((run_id, cpus))
+    subprocess.run(["mn", "-c"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    status = [None] * len(jobs)
+    def worker(i, label, flags, result_dir, slot):
+        run_id, cpus = slot
+        os.makedirs(result_dir, exist_ok=True)
+        cmd = [sys.executable, os.path.join(HERE, "run_sim_fat_tree.py"), *flags,
+               '--run-id', str(run_id), '--controller-port', str(BASE_PORT + run_id),
+               '--ryu-app', ryu_app, '--cpus', cpus,
+               '--auto-exit', '--result-dir', result_dir]
+        print(f"*** [{label}] run id {run_id} on CPUs {cpus}")
+        start = time.time()
+        try:
+            with open(os.path.join(result_dir, log_name), "w") as log:
+                status[i] = subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT,
+                                           cwd=HERE).returncode
+        finally:
+            free.put(slot)
+        print(f"*** [{label}] finished with status {status[i]} after {time.time() - start:.1f}s")
+
+    threads = []
+    for i, (label, flags, result_dir) in enumerate(jobs):
+        t = threading.Thread(target=worker, args=(i, label, flags, result_dir, free.get()))
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+    return status
+
+def main():
+    p = argparse.ArgumentParser(description="Run isolated fat-tree experiments concurrently")
+    p.add_argument('configs', help='JSON file: {name: "run_sim_fat_tree.py flags"}')
+    p.add_argument('--repeats',      type=int, default=1)
+    p.add_argument('--jobs',         type=int, default=2, help='Runs active at the same time')
+    p.add_argument('--cpus-per-run', type=int, default=None,
+                   help='CPUs pinned to each run (default: an equal share)')
+    p.add_argument('--ryu-app',      type=str, default=DEFAULT_APP)
+    p.add_argument('--csv',          type=str, default='cifar_traffic_profile.csv')
+    p.add_argument('--result-dir',   type=str, default='results/parallel')
+    args = p.parse_args()
+
+    with open(args.configs) as f:
+        configs = json.load(f)
+    result_dir = os.path.abspath(args.result_dir)
+    jobs = [(f"{name} run {i}",
+             ['--csv', os.path.abspath(args.csv), *shlex.split(flags)],
+             os.path.join(result_dir, name, f"run{i:02d}"))
+            for name, flags in configs.items() for i in range(args.repeats)]
+    status = run_jobs(jobs, args.jobs, args.cpus_per_run, args.ryu_app)
+    failed = [label for (label, _, _), s in zip(jobs, status) if s != 0]
+    print(f"*** {len(jobs) - len(failed)}/{len(jobs)} runs succeeded")
+    for label in failed:
+        print(f"    failed: {label}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
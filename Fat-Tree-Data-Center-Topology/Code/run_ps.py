@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+run_ps.py
+
+Parameter-server replay with compute stragglers on the fabric, under one
+or more synchronization policies. N workers push each batch's gradient to
+one PS, which answers every push with a pull (the updated parameters,
+--pull-bytes or the pushed size) once the policy lets that worker go on
+(traffic_replay.py --sync-policy, --sync):
+
+  bsp     bulk-synchronous: nobody starts round r+1 before every worker
+          has pushed round r
+  ssp     stale-synchronous: a worker may run up to --staleness rounds
+          ahead of the slowest
+  asp     fully asynchronous: every push is answered at once
+  local   local SGD: bsp, but workers push only every --sync-every batches
+
+Each worker draws its per-batch compute time from the forward/backward
+profile (straggler.ComputeModel), optionally with a heavy tail and with
+some workers persistently slow. --policies runs the policies one after
+another on the same fabric.
+
+Results (per policy in <result-dir>/<policy>/, plus a comparison):
+  - rounds.csv    per round: round time, barrier wait, and how much of the
+                  wait came from release skew, compute and the network
+  - summary.json  rounds/s, mean barrier wait, share of the wait caused by
+                  compute vs network, which worker was slowest how often,
+                  iteration throughput and PS link utilization
+  - policies.csv  one row per policy: steps/s, pushes, PS rx/tx Mbps and
+                  access-link utilization, retransmitted segments
+
+Example:
+  sudo python3 run_ps.py --csv cifar_traffic_profile.csv --compute-model cifar_profile.json \
+      --workers h1,h5,h9,h13 --slow-workers h13 --slow-factor 1.5 --tail-prob 0.02 \
+      --policies bsp,ssp,asp,local --staleness 2 --sync-every 4
+"""
+
+import argparse
+import csv
+import json
+import os
+from mininet.net      import Mininet
+from mininet.node     import OVSKernelSwitch, RemoteController
+from mininet.link     import TCLink
+from fat_tree         import make_topo
+from run_sim_fat_tree import apply_core_rate
+from replay_agent     import launch_all
+from readiness        import wait_for_fabric, wait_for_job
+from replay_profile   import total_interval
+import straggler
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--k',             type=int,   default=4)
+    p.add_argument('--topo',          type=str,   default=None,
+                   help='Fabric from fat_tree.topos, e.g. leafspine,leaves=8,oversub=3 (default: fat-tree)')
+    p.add_argument('--csv',           type=str,   required=True,
+                   help='Traffic profile: one gradient (grad_bytes) per round')
+    p.add_argument('--compute-model', type=str,   default=None,
+                   help='Forward/backward profile to draw compute times from, e.g. cifar_profile.json '
+                        '(default: replay interval_s unchanged)')
+    p.add_argument('--ps-host',       type=str,   default='h16')
+    p.add_argument('--workers',       type=str,   default='h1,h5,h9,h13')
+    p.add_argument('--slow-workers',  type=str,   default='',
+                   help='Workers that are persistently slow by --slow-factor')
+    p.add_argument('--slow-factor',   type=float, default=1.5)
+    p.add_argument('--tail-prob',     type=float, default=0.0,
+                   help='Per-batch probability of a heavy-tail compute stall on every worker')
+    p.add_argument('--tail-alpha',    type=float, default=1.5)
+    p.add_argument('--seed',          type=int,   default=1,
+                   help='Worker i draws with seed + i')
+    p.add_argument('--policies',      type=str,   default='bsp',
+                   help='Comma-separated sync policies to run: bsp, ssp, asp, local')
+    p.add_argument('--staleness',     type=int,   default=2,
+                   help='ssp: rounds a worker may run ahead of the slowest')
+    p.add_argument('--sync-every',    type=int,   default=4,
+                   help='local: batches between pushes')
+    p.add_argument('--pull-bytes',    type=int,   default=None,
+                   help='Size of the PS reply to each push (default: the pushed size)')
+    p.add_argument('--link-mbps',     type=float, default=10.0,
+                   help='PS access link rate for the utilization figure (make_topo links: 10)')
+    p.add_argument('--core-bw',       type=str,   default=None)
+    p.add_argument('--port',          type=int,   default=5000)
+    p.add_argument('--timeout',       type=float, default=None,
+                   help='Fallback wait for the replay (default: the profile length plus 60s)')
+    p.add_argument('--result-dir',    type=str,   default='results/ps')
+    args = p.parse_args()
+
+    result_dir = os.path.abspath(args.result_dir)
+    log_dir = os.path.join(result_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    csv_path = os.path.abspath(args.csv)
+    worker_names = [w for w in args.workers.split(',') if w]
+    slow = set(w for w in args.slow_workers.split(',') if w)
+
+    topo = make_topo(args.topo, k=args.k)
+    net  = Mininet(topo=topo,
+                   controller=RemoteController,
+                   switch=OVSKernelSwitch,
+                   link=TCLink,
+                   autoSetMacs=True,
+                   autoStaticArp=True)
+    net.start()
+    print(f"*** Fabric up with {len(net.hosts)} hosts")
+    ps = net.get(args.ps_host)
+    workers = [net.get(w) for w in worker_names]
+    print("*** Waiting for controller to establish paths...")
+    wait_for_fabric(net, [(w, ps) for w in workers])
+    if args.core_bw:
+        apply_core_rate(net, args.core_bw)
+
+    agents = launch_all([ps] + workers, log_dir)
+    timeout = args.timeout or total_interval(csv_path) + 60
+    results = {}
+    policies = [name for name in args.policies.split(',') if name]
+    for n, policy in enumerate(policies):
+        results[policy] = run_policy(args, policy, args.port + n, agents, ps, workers, slow,
+                                     csv_path, os.path.join(result_dir, policy), timeout)
+    for agent in agents.values():
+        agent.shutdown()
+    net.stop()
+
+    with open(os.path.join(result_dir, "policies.csv"), "w", newline='') as f:
+        writer = csv.writer(f)
+        fields = ['steps', 'pushes', 'duration_s', 'steps_per_s', 'rounds', 'mean_barrier_wait_s',
+                  'ps_rx_mbps', 'ps_tx_mbps', 'ps_link_util', 'retrans']
+        writer.writerow(['policy'] + fields)
+        for policy, summary in results.items():
+            writer.writerow([policy] + [f"{summary[k]:.4f}" if isinstance(summary.get(k), float)
+                                        else summary.get(k, '') for k in fields])
+    print(f"*** Wrote {os.path.join(result_dir, 'policies.csv')}")
+
+def run_policy(args, policy, port, agents, ps, workers, slow, csv_path, out_dir, timeout):
+    """One replay under `policy`; writes out_dir/rounds.csv and summary.json and returns the summary."""
+    log_dir = os.path.join(out_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    for agent in agents.values():
+        agent.reset()
+    server_log = os.path.join(log_dir, f"{ps.name}_server.log")
+    server_job = agents[ps.name].serve(port, server_log, connections=len(workers),
+                                       policy='bsp' if policy == 'local' else policy,
+                                       staleness=args.staleness, pull_bytes=args.pull_bytes)
+    sync_every = args.sync_every if policy == 'local' else 1
+    print(f"*** [{policy}] PS on {ps.name}, {len(workers)} workers "
+          f"({', '.join(sorted(slow)) or 'none'} slow x{args.slow_factor})")
+
+    client_logs, jobs = {}, {}
+    for i, w in enumerate(workers):
+        compute = None
+        if args.compute_model:
+            compute = {'profile': os.path.abspath(args.compute_model),
+                       'slow_factor': args.slow_factor if w.name in slow else 1.0,
+                       'tail_prob': args.tail_prob, 'tail_alpha': args.tail_alpha,
+                       'seed': args.seed + i}
+        client_logs[w.name] = os.path.join(log_dir, f"{w.name}_client.log")
+        jobs[w.name] = agents[w.name].client(ps.IP(), port, csv_path, client_logs[w.name],
+                                             compute=compute, sync=True, sync_every=sync_every)
+
+    for name, job in jobs.items():
+        state = wait_for_job(agents[name], job, timeout=timeout)
+        if state['running']:
+            print(f"WARNING: worker {name} stalled, stopping it")
+            agents[name].stop(job)
+    agents[ps.name].wait(server_job, timeout=10)
+    ps_counters = agents[ps.name].stats()['counters']
+    retrans = sum(agents[w.name].stats()['counters'].get('RetransSegs', 0) for w in workers)
+    retrans += ps_counters.get('RetransSegs', 0)
+
+    rows = straggler.rounds(server_log, client_logs)
+    straggler.write_rounds(rows, os.path.join(out_dir, "rounds.csv"))
+    summary = straggler.summarize(rows)
+    summary.update(straggler.throughput(client_logs))
+    duration = summary['duration_s'] or 1.0
+    summary['ps_rx_mbps'] = ps_counters.get('rx_bytes', 0) * 8 / duration / 1e6
+    summary['ps_tx_mbps'] = ps_counters.get('tx_bytes', 0) * 8 / duration / 1e6
+    summary['ps_link_util'] = max(summary['ps_rx_mbps'], summary['ps_tx_mbps']) / args.link_mbps
+    summary['retrans'] = retrans
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"*** [{policy}] {summary['steps']} steps, {summary['steps_per_s']:.2f} steps/s, "
+          f"PS link {summary['ps_link_util']:.0%} utilized, {retrans} retransmits")
+    if rows:
+        print(f"*** [{policy}] {summary['rounds']} rounds, {summary['rounds_per_s']:.2f} rounds/s, "
+              f"mean barrier wait {summary['mean_barrier_wait_s'] * 1000:.2f}ms "
+              f"(compute {summary['compute_share']:.0%}, network {summary['network_share']:.0%}, "
+              f"skew {summary['skew_share']:.0%})")
+    return summary
+
+if __name__ == '__main__':
+    main()
@@ -11,52 +11,108 @@ and collect:
 
 New flag:
   --auto-exit    : skip the CLI and auto‑tear down once replay is done
+  --failure-schedule : bring links/switches down and up at scripted times
+                       during the replay (see failure_injection.py)
+  --dilation D : run the whole emulation D times slower and report times
+                 and throughputs rescaled back (see dilation.py)
+  --capture c,a : header-only, ring-buffered tcpdump on the core and
+                  aggregation interfaces during the replay (see capture.py)
+
+The PS server and worker client run as jobs of a replay_agent.py daemon
+started once on each host, so readiness and completion come back over its
+control socket instead of sleeps and process-table greps. The fabric is
+ready once every switch is connected and the worker can ping the PS
+(readiness.wait_for_fabric), and --auto-exit tears down when the client
+exits, not after a fixed time; the profile's length is only a fallback,
+extended for as long as the client log keeps growing.
+
+Several runs can share one machine: every run works inside its own result
+directory, and --run-id gives its fabric its own switch/interface name
+prefix and DPID range (fat_tree.isolate) and its own controller port.
+--ryu-app starts a private ryu-manager on that port and --cpus pins the
+run (and everything it starts) to a CPU set; run_parallel.py schedules
+runs that way across the cores of the box.
+
+Every run is watched by fidelity.py: host CPU, softirq, OVS datapath and
+replay scheduling-lag samples go to fidelity.csv, and fidelity.json marks
+the run invalid when the emulator itself was the bottleneck.
 """
 
 import argparse
-import csv
 import os
-import time
 import subprocess
-import shutil
 from mininet.net      import Mininet
 from mininet.node     import OVSKernelSwitch, RemoteController
 from mininet.link     import TCLink
 from mininet.cli      import CLI
-from fat_tree         import MyTopo
+from fat_tree         import isolate, make_topo, run_name
+from topologies       import core_uplink, role
+from failure_injection import FailureInjector, load_schedule, write_recovery
+from dilation         import (dilate_bw, dilate_netem, dilate_profile, dilate_rate,
+                              rescale_csv, rescale_throughput)
+from fidelity         import FidelityWatchdog
+from capture          import start_capture, stop_capture
+from replay_agent     import launch
+from replay_profile   import total_interval
+from readiness        import wait_for_controller, wait_for_fabric, wait_for_job
 
-def apply_core_rate(net, rate, tbf_limit="200kb", burst="100kb"):
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def core_uplinks(net):
+    """
+    (node, intf) for the sending side of every link into the core tier: the
+    agg→core links of a fat-tree or VL2, leaf→spine in a leaf-spine, and
+    server→level switch in BCube. Fabrics without a 'c' tier (Jellyfish)
+    shape every switch-to-switch link in both directions.
+    """
+    has_core = any(role(sw.name) == 'c' for sw in net.switches)
     for link in net.links:
         n1, n2 = link.intf1.node, link.intf2.node
-        if n1.name.startswith('a') and n2.name.startswith('c'):
-            n1.cmd(f"tc qdisc replace dev {link.intf1.name} "
-                   f"root tbf rate {rate} burst {burst} limit {tbf_limit}")
-        elif n2.name.startswith('a') and n1.name.startswith('c'):
-            n2.cmd(f"tc qdisc replace dev {link.intf2.name} "
-                   f"root tbf rate {rate} burst {burst} limit {tbf_limit}")
+        if core_uplink(n1.name, n2.name, has_core):
+            yield n1, link.intf1
+        if core_uplink(n2.name, n1.name, has_core):
+            yield n2, link.intf2
+
+def apply_core_rate(net, rate, tbf_limit="200kb", burst="100kb"):
+    for node, intf in core_uplinks(net):
+        node.cmd(f"tc qdisc replace dev {intf.name} "
+                 f"root tbf rate {rate} burst {burst} limit {tbf_limit}")
 
 def apply_netem(net, netem_args):
-    for link in net.links:
-        n1, n2 = link.intf1.node, link.intf2.node
-        if n1.name.startswith('a') and n2.name.startswith('c'):
-            n1.cmd(f"tc qdisc replace dev {link.intf1.name} "
-                   f"root netem {netem_args}")
-        elif n2.name.startswith('a') and n1.name.startswith('c'):
-            n2.cmd(f"tc qdisc replace dev {link.intf2.name} "
-                   f"root netem {netem_args}")
+    for node, intf in core_uplinks(net):
+        node.cmd(f"tc qdisc replace dev {intf.name} "
+                 f"root netem {netem_args}")
+
+def parse_cpus(spec):
+    """'0-3,8' -> {0, 1, 2, 3, 8}"""
+    cpus = set()
+    for part in spec.split(','):
+        lo, _, hi = part.partition('-')
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+def start_controller(app, port, log, ryu_manager='ryu-manager', timeout=30):
+    """Start a private ryu-manager on `port` and wait until it accepts OpenFlow connections."""
+    proc = subprocess.Popen([ryu_manager, '--ofp-tcp-listen-port', str(port),
+                             '--wsapi-port', str(port + 2000), app],
+                            stdout=open(log, "w"), stderr=subprocess.STDOUT)
+    if not wait_for_controller(port, timeout=timeout):
+        print(f"WARNING: controller on port {port} is not accepting OpenFlow connections")
+    return proc
 
 def compute_total_runtime(csv_path, margin=5.0):
-    """Sum up all interval_s in the CSV, plus a safety margin (seconds)."""
-    total = 0.0
-    with open(csv_path) as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            total += float(row['interval_s'])
-    return total + margin
+    """
+    Sum of all interval_s in the profile, plus a safety margin (seconds);
+    a binary .rprof profile carries the sum in its header.
+    """
+    return total_interval(csv_path) + margin
 
 def main():
     p = argparse.ArgumentParser()
     p.add_argument('--k',             type=int,   default=4)
+    p.add_argument('--topo',          type=str,   default=None,
+                   help='Fabric from fat_tree.topos, e.g. leafspine,leaves=8,oversub=3 '
+                        '(default: k-pod fat-tree)')
     p.add_argument('--csv',           type=str,   required=True)
     p.add_argument('--ps-host',       type=str,   default='h16')
     p.add_argument('--worker-host',   type=str,   default='h1')
@@ -74,6 +130,35 @@ def main():
                    help='Directory to store results')
     p.add_argument('--debug',         action='store_true',
                    help='Enable verbose debugging output')
+    p.add_argument('--failure-schedule', type=str, default=None,
+                   help='Failure schedule to inject during the replay')
+    p.add_argument('--failure-method', choices=['config','ifdown'], default='config',
+                   help='configLinkStatus on both ends, or ip link down on one end')
+    p.add_argument('--stripes',       type=int,   default=1,
+                   help='Split each gradient over this many parallel connections')
+    p.add_argument('--dilation',      type=float, default=1.0,
+                   help='Time-dilation factor: links D times slower, delays and the '
+                        'replay schedule D times longer')
+    p.add_argument('--fidelity-interval', type=float, default=0.5,
+                   help='Seconds between emulation-fidelity samples')
+    p.add_argument('--run-id',        type=int,   default=None,
+                   help='Isolate this run: switch/interface prefix r<N>, its own DPID range '
+                        'and controller port 6653+N')
+    p.add_argument('--controller-port', type=int, default=None,
+                   help='OpenFlow port of the controller (default 6653, or 6653+run-id)')
+    p.add_argument('--ryu-app',       type=str,   default=None,
+                   help='Start a private ryu-manager with this app on the controller port, '
+                        'e.g. ryu.app.simple_switch_stp_13')
+    p.add_argument('--cpus',          type=str,   default=None,
+                   help='Pin the run and everything it starts to these CPUs, e.g. 0-3')
+    p.add_argument('--capture',       type=str,   default=None,
+                   help='Header-only tcpdump on these switch tiers during the replay, e.g. c or c,a '
+                        '(analyse with capture.py)')
+    p.add_argument('--capture-snaplen', type=int, default=96)
+    p.add_argument('--capture-ring',  type=int,   default=20,
+                   help='MB per capture file; 5 files per interface are kept')
+    p.add_argument('--ready-timeout', type=float, default=60.0,
+                   help='Longest wait for the controller to set up working paths')
     args = p.parse_args()
 
     # Create result directory based on bandwidth if not specified
@@ -83,13 +168,27 @@ def main():
         else:
             args.result_dir = "results/default"
     
-    # Create the result directory if it doesn't exist
+    # Create the result directory if it doesn't exist; it is also the run's
+    # working directory, so concurrent runs never share a log file
     os.makedirs(args.result_dir, exist_ok=True)
+    args.result_dir = os.path.abspath(args.result_dir)
+    args.csv = os.path.abspath(args.csv)
+    if args.failure_schedule:
+        args.failure_schedule = os.path.abspath(args.failure_schedule)
+    os.chdir(args.result_dir)
+
+    if args.cpus:
+        os.sched_setaffinity(0, parse_cpus(args.cpus))
+    if args.run_id is not None:
+        isolate(args.run_id)
+    if args.controller_port is None:
+        args.controller_port = 6653 + (args.run_id or 0)
     
     # Save command parameters to a log file
     with open(os.path.join(args.result_dir, "sim.log"), "w") as f:
         f.write(f"Simulation parameters:\n")
         f.write(f"  k: {args.k}\n")
+        f.write(f"  topo: {args.topo or 'fattree'}\n")
         f.write(f"  csv: {args.csv}\n")
         f.write(f"  ps-host: {args.ps_host}\n")
         f.write(f"  worker-host: {args.worker_host}\n")
@@ -99,20 +198,46 @@ def main():
         f.write(f"  netem-args: {args.netem_args}\n")
         f.write(f"  auto-exit: {args.auto_exit}\n")
         f.write(f"  debug: {args.debug}\n")
+        f.write(f"  failure-schedule: {args.failure_schedule}\n")
+        f.write(f"  stripes: {args.stripes}\n")
+        f.write(f"  dilation: {args.dilation}\n")
+        f.write(f"  run-id: {args.run_id}\n")
+        f.write(f"  controller-port: {args.controller_port}\n")
+        f.write(f"  cpus: {args.cpus}\n")
+        f.write(f"  capture: {args.capture}\n")
+
+    # Time dilation: slow every link, stretch every delay and the schedule
+    D = args.dilation
+    core_bw = dilate_rate(args.core_bw, D)
+    netem_args = dilate_netem(args.netem_args, D)
+    iperf_duration = max(1, int(round(args.iperf_duration * D)))
+    csv_path = args.csv
+    if D != 1:
+        csv_path = dilate_profile(args.csv, os.path.abspath(
+            os.path.join(args.result_dir, "profile_dilated" + os.path.splitext(args.csv)[1])), D)
+        print(f"*** Time dilation x{D}: core rate {core_bw}, netem '{netem_args}'")
+
+    ryu = None
+    if args.ryu_app:
+        print(f"*** Starting {args.ryu_app} on port {args.controller_port}")
+        ryu = start_controller(args.ryu_app, args.controller_port,
+                               os.path.join(args.result_dir, "ryu.log"))
 
-    topo = MyTopo(k=args.k)
+    topo = make_topo(args.topo, k=args.k, bw=dilate_bw(10, D))
     net  = Mininet(topo=topo,
-                   controller=RemoteController,
+                   controller=lambda name: RemoteController(name, ip='127.0.0.1',
+                                                            port=args.controller_port),
                    switch=OVSKernelSwitch,
                    link=TCLink,
                    autoSetMacs=True,
                    autoStaticArp=True)
     net.start()
-    print(f"*** Fat-tree (k={args.k}) up with {len(net.hosts)} hosts")
+    print(f"*** {args.topo or f'Fat-tree (k={args.k})'} up with {len(net.hosts)} hosts")
 
     # Wait for the controller to set up paths (important!)
-    print("*** Waiting for controller to establish paths (10s)...")
-    time.sleep(10)
+    print("*** Waiting for controller to establish paths...")
+    wait_for_fabric(net, [(net.get(args.worker_host), net.get(args.ps_host))],
+                    timeout=args.ready_timeout)
     
     # Debug: Run pingall to verify connectivity
     if args.debug:
@@ -128,14 +253,14 @@ def main():
             node.cmd("sysctl -w net.ipv4.tcp_congestion_control=dctcp")
 
     # Core rate‑limit
-    if args.qdisc in ('tbf','fifo') and args.core_bw:
-        print(f"*** Applying TBF rate={args.core_bw}")
-        apply_core_rate(net, args.core_bw)
+    if args.qdisc in ('tbf','fifo') and core_bw:
+        print(f"*** Applying TBF rate={core_bw}")
+        apply_core_rate(net, core_bw)
 
     # Netem
-    if args.qdisc == 'netem' and args.netem_args:
-        print(f"*** Applying netem ({args.netem_args})")
-        apply_netem(net, args.netem_args)
+    if args.qdisc == 'netem' and netem_args:
+        print(f"*** Applying netem ({netem_args})")
+        apply_netem(net, netem_args)
 
     # Get host references
     ps = net.get(args.ps_host)
@@ -165,71 +290,104 @@ def main():
         else:
             print("*** Connectivity fixed!")
 
-    # Start PS server - adding extra debugging
+    # Start PS server; the agent replies once the port is listening
+    print(f"*** Starting replay agents on {args.ps_host} and {args.worker_host}")
+    ps_agent = launch(ps, args.result_dir)
+    w_agent = launch(w, args.result_dir)
     print(f"*** Starting PS on {args.ps_host} at {ps_ip}:{args.port}")
-    ps.cmd(f"python3 traffic_replay.py --mode server --port {args.port} "
-           f"> {args.ps_host}_server.log 2>&1 &")
-    
-    # Debug: Give the server a moment to start
-    time.sleep(2)
-    
-    # Verify server is running
-    ps_listening = ps.cmd(f"netstat -tuln | grep {args.port}")
-    if str(args.port) not in ps_listening:
-        print(f"WARNING: Server not listening on port {args.port}")
-        print("*** Server process status:")
-        print(ps.cmd("ps aux | grep traffic_replay"))
-    else:
+    try:
+        server_job = ps_agent.serve(args.port, f"{args.ps_host}_server.log", connections=1)
         print(f"*** Server confirmed listening on port {args.port}")
+    except RuntimeError as e:
+        print(f"WARNING: Server not listening on port {args.port}: {e}")
+        server_job = None
+
+    watchdog = FidelityWatchdog(args.result_dir, net, interval=args.fidelity_interval)
+    watchdog.start()
+
+    captures = []
+    if args.capture:
+        captures = start_capture(net, "captures", roles=args.capture.split(','),
+                                 snaplen=args.capture_snaplen, ring_mb=args.capture_ring)
+        print(f"*** Capturing headers on {len(captures)} interfaces ({args.capture})")
 
     # Start worker client with debug logging
     print(f"*** Launching worker {args.worker_host} -> PS {ps_ip}:{args.port}")
-    w.cmd(f"python3 traffic_replay.py --mode client "
-          f"--host {ps_ip} --port {args.port} --csv {args.csv} "
-          f"> {args.worker_host}_client.log 2>&1 &")
+    client_job = w_agent.client(ps_ip, args.port, csv_path, f"{args.worker_host}_client.log",
+                                stripes=args.stripes)
+
+    injector = None
+    if args.failure_schedule:
+        events = load_schedule(args.failure_schedule)
+        for event in events:
+            event['offset_s'] *= D
+            event['targets'] = [run_name(t) for t in event['targets']]
+        injector = FailureInjector(net, events, method=args.failure_method)
+        print(f"*** Injecting {len(injector.events)} failure events from {args.failure_schedule}")
+        injector.start()
 
     # Iperf
     print(f"*** Starting iperf on {args.ps_host}:{args.iperf_port}")
     ps.cmd(f"iperf -s -p {args.iperf_port} > iperf_server.log 2>&1 &")
     print(f"*** Running iperf client on {args.worker_host}")
     w.cmd(f"iperf -c {ps_ip} -p {args.iperf_port} "
-          f"-t {args.iperf_duration} > iperf_client.log 2>&1 &")
+          f"-t {iperf_duration} > iperf_client.log 2>&1 &")
 
     # Core stats before
     print("*** Dumping core stats (before)")
     for sw in net.switches:
-        if sw.name.startswith('c'):
+        if role(sw.name) == 'c':
             data = sw.cmd(f"ovs-ofctl dump-ports {sw.name}")
             with open(f"{sw.name}_stats_before.log","w") as f:
                 f.write(data)
 
     if args.auto_exit:
-        # compute how long to wait for the traffic replay to finish
-        wait = compute_total_runtime(args.csv)
-        print(f"*** Auto‑exit mode: sleeping {wait:.1f}s…")
-        time.sleep(wait)
+        # tear down when the replay finishes; its scheduled length is only a
+        # fallback, extended while the client is still making progress
+        wait = compute_total_runtime(csv_path)
+        print(f"*** Auto‑exit mode: waiting for the replay (scheduled {wait:.1f}s)…")
+        state = wait_for_job(w_agent, client_job, timeout=wait)
+        if state['running']:
+            print(f"WARNING: replay stalled after {state['elapsed_s']:.1f}s, tearing down")
+        else:
+            print(f"*** Replay finished after {state['elapsed_s']:.1f}s")
     else:
         print("*** Network is ready. Enter 'exit' when done.")
         CLI(net)
 
+    if injector:
+        injector.stop()
+        injector.write_log("failures.csv")
+
+    if captures:
+        stop_capture(captures)
+        print(f"*** Captures in {os.path.join(args.result_dir, 'captures')}; analyse with "
+              f"capture.py captures --client-log {args.worker_host}_client.log "
+              f"--server-log {args.ps_host}_server.log --port {args.port}")
+
+    print("*** Checking emulation fidelity")
+    watchdog.stop(f"{args.worker_host}_client.log")
+
     # Check if client process completed successfully
     print("*** Checking client/server status")
-    client_status = w.cmd("ps aux | grep traffic_replay | grep -v grep")
-    if client_status:
+    client_status = w_agent.wait(client_job, timeout=0)
+    if client_status['running']:
         print("*** Client is still running, checking logs")
     else:
-        print("*** Client process has finished")
+        print(f"*** Client process has finished (exit {client_status['exit']})")
     
-    server_status = ps.cmd("ps aux | grep traffic_replay | grep -v grep")
-    if server_status:
+    server_status = ps_agent.wait(server_job, timeout=5) if server_job else None
+    if server_status and server_status['running']:
         print("*** Server is still running")
     else:
         print("*** Server process has finished")
+    ps_agent.shutdown()
+    w_agent.shutdown()
     
     # Core stats after
     print("*** Dumping core stats (after)")
     for sw in net.switches:
-        if sw.name.startswith('c'):
+        if role(sw.name) == 'c':
             data = sw.cmd(f"ovs-ofctl dump-ports {sw.name}")
             with open(f"{sw.name}_stats_after.log","w") as f:
                 f.write(data)
@@ -244,7 +402,9 @@ def main():
     print("*** Parsing latency data")
     if os.path.exists(f"{args.worker_host}_client.log") and os.path.getsize(f"{args.worker_host}_client.log") > 0:
         try:
-            subprocess.run(["python3", "parse_latency.py"], check=True)
+            subprocess.run(["python3", os.path.join(HERE, "parse_latency.py"),
+                            "--client-log", f"{args.worker_host}_client.log",
+                            "--server-log", f"{args.ps_host}_server.log"], check=True)
             print("*** Latency data processed successfully")
         except subprocess.CalledProcessError:
             print("*** Error processing latency data")
@@ -275,8 +435,13 @@ def main():
             print("*** Iperf client log is empty or missing")
             out.write(f"throughput_mbps,missing\n")
 
-    # Move all log files to the result directory
-    print(f"*** Moving logs to {args.result_dir}")
+    # Report times and throughputs in emulated (undilated) units
+    if D != 1:
+        rescale_csv("latencies.csv", ['latency_s'], 1 / D)
+        rescale_throughput("throughput.csv", D)
+
+    # Every log was written straight into the result directory
+    print(f"*** Checking logs in {args.result_dir}")
     log_files = [
         f"{args.worker_host}_client.log", 
         f"{args.ps_host}_server.log",
@@ -287,21 +452,34 @@ def main():
         "throughput.csv",
         "pre_ping.log"
     ]
+    if injector:
+        log_files.append("failures.csv")
+    if D != 1:
+        log_files.append("latencies_raw.csv")
     
     # Add core switch stats logs
     for sw in net.switches:
-        if sw.name.startswith('c'):
+        if role(sw.name) == 'c':
             log_files.append(f"{sw.name}_stats_before.log")
             log_files.append(f"{sw.name}_stats_after.log")
     
-    # Move files that exist
     for file in log_files:
-        if os.path.exists(file):
-            shutil.copy2(file, os.path.join(args.result_dir, file))
-        else:
+        if not os.path.exists(file):
             print(f"Warning: {file} not found")
 
+    if injector:
+        print("*** Measuring stall and recovery after injected failures")
+        write_recovery(args.result_dir,
+                       f"{args.worker_host}_client.log",
+                       f"{args.ps_host}_server.log",
+                       "failures.csv")
+        rescale_csv(os.path.join(args.result_dir, "recovery.csv"),
+                    ['baseline_s', 'stall_s', 'recovery_s', 'max_latency_after_s'], 1 / D)
+
     net.stop()
+    if ryu:
+        ryu.terminate()
+        ryu.wait()
     print(f"*** Done; logs saved to {args.result_dir}.")
 
 if __name__ == '__main__':
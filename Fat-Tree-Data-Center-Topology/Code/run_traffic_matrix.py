@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+run_traffic_matrix.py
+
+Replay a whole-cluster traffic matrix (see traffic_matrix.py) on the fabric.
+
+The trace is sharded by source host; every receiver runs one
+traffic_replay.py server that accepts a connection from each of its
+sources, and every source runs one replay agent that follows its shard
+against a shared start time. Results:
+  - flows.csv   one row per released flow: bucket, src, dst, bytes,
+                release time and flow completion time
+  - fct.json    flow count, completed flows, mean and p99 FCT
+
+Example:
+  python3 traffic_matrix.py from-profile cifar_traffic_profile.csv --hosts 16 --ps 16 \
+      --out ps16.tmx
+  sudo python3 run_traffic_matrix.py --trace ps16.tmx --core-bw 10mbit
+"""
+
+import argparse
+import json
+import os
+import time
+from mininet.net      import Mininet
+from mininet.node     import OVSKernelSwitch, RemoteController
+from mininet.link     import TCLink
+from fat_tree         import make_topo
+from readiness        import wait_for_fabric, wait_for_line
+from run_sim_fat_tree import apply_core_rate
+import traffic_matrix
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--trace',      type=str,   required=True, help='Traffic matrix trace (.tmx or .tmx.gz)')
+    p.add_argument('--k',          type=int,   default=4)
+    p.add_argument('--topo',       type=str,   default=None,
+                   help='Fabric from fat_tree.topos, e.g. leafspine,leaves=8,oversub=3 (default: fat-tree)')
+    p.add_argument('--core-bw',    type=str,   default=None, help='Shape core uplinks, e.g. 10mbit')
+    p.add_argument('--port',       type=int,   default=5000)
+    p.add_argument('--lead',       type=float, default=3.0,
+                   help='Seconds between launching agents and bucket 0')
+    p.add_argument('--timeout',    type=float, default=300.0,
+                   help='Seconds to wait after the last bucket for every receiver to finish')
+    p.add_argument('--result-dir', type=str,   default='results/traffic_matrix')
+    args = p.parse_args()
+
+    result_dir = os.path.abspath(args.result_dir)
+    log_dir = os.path.join(result_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    info = traffic_matrix.summary(args.trace)
+    print(f"*** {args.trace}: {info['flows']} flows, {info['bytes']} bytes over "
+          f"{info['duration_s']:.3f}s across {info['hosts']} hosts")
+    shards = traffic_matrix.shard(args.trace, os.path.join(result_dir, "shards"))
+
+    topo = make_topo(args.topo, k=args.k)
+    net  = Mininet(topo=topo,
+                   controller=RemoteController,
+                   switch=OVSKernelSwitch,
+                   link=TCLink,
+                   autoSetMacs=True,
+                   autoStaticArp=True)
+    net.start()
+    if info['hosts'] > len(net.hosts):
+        print(f"ERROR: trace needs {info['hosts']} hosts but the fabric has {len(net.hosts)}")
+        net.stop()
+        return
+    print(f"*** Fabric up with {len(net.hosts)} hosts")
+    print("*** Waiting for controller to establish paths...")
+    wait_for_fabric(net)
+    if args.core_bw:
+        apply_core_rate(net, args.core_bw)
+
+    host_ips = {h.name: h.IP() for h in net.hosts}
+    hosts_map = os.path.join(result_dir, "hosts.json")
+    with open(hosts_map, "w") as f:
+        json.dump(host_ips, f, indent=2)
+
+    server_logs = {}
+    for dst, srcs in sorted(info['peers'].items()):
+        server_logs[dst] = os.path.join(log_dir, f"{dst}_server.log")
+        net.get(dst).cmd(f"python3 -u traffic_replay.py --mode server --port {args.port} "
+                         f"--connections {len(srcs)} > {server_logs[dst]} 2>&1 &")
+    for dst, log in server_logs.items():
+        if not wait_for_line(log, "Listening", timeout=10):
+            print(f"WARNING: server on {dst} never started listening")
+
+    start_at = time.time() + args.lead
+    agent_logs = {}
+    for src, shard in sorted(shards.items()):
+        agent_logs[src] = os.path.join(log_dir, f"{src}_agent.log")
+        net.get(src).cmd(f"python3 -u traffic_replay.py --mode agent --tm {shard} "
+                         f"--hosts-map {hosts_map} --port {args.port} --start-at {start_at:.6f} "
+                         f"> {agent_logs[src]} 2>&1 &")
+    print(f"*** {len(agent_logs)} agents -> {len(server_logs)} receivers, bucket 0 at {start_at:.6f}")
+
+    deadline = args.lead + info['duration_s'] + args.timeout
+    for dst, log in server_logs.items():
+        remaining = max(1.0, start_at - args.lead + deadline - time.time())
+        if not wait_for_line(log, "Shut down", timeout=remaining):
+            print(f"WARNING: receiver {dst} did not finish within {args.timeout}s of the last bucket")
+    for h in net.hosts:
+        h.cmd("pkill -f 'traffic_replay.py --mode'")
+    net.stop()
+
+    out_csv = os.path.join(result_dir, "flows.csv")
+    fct = traffic_matrix.flows_csv(agent_logs, server_logs, host_ips, start_at, out_csv)
+    with open(os.path.join(result_dir, "fct.json"), "w") as f:
+        json.dump(fct, f, indent=2)
+    print(f"*** {fct['completed']}/{fct['flows']} flows completed; "
+          f"mean FCT={fct['mean_fct_s']} p99 FCT={fct['p99_fct_s']}")
+    print(f"*** Wrote {out_csv}")
+
+if __name__ == '__main__':
+    main()
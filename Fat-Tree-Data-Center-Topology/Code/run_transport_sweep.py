@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+run_transport_sweep.py
+
+Find the lowest-latency per-connection transport profile for one core rate.
+Every combination of congestion control, socket buffer sizes, Nagle, cork
+and TCP_NOTSENT_LOWAT is replayed (traffic_replay.py client -> server) over
+the first --rows gradient exchanges of the profile, and ranked by the
+chosen latency statistic.
+
+Backends:
+  mininet   worker -> PS across the fat-tree with tbf on the core links (root)
+  loopback  through shaping_proxy.py on localhost (no root; the proxy splits
+            the TCP connection, so only the endpoint legs see the options)
+
+Outputs transport_sweep.csv (one row per profile) and best_transport.json
+(the winning profile as traffic_replay.py flags).
+
+Example:
+  sudo python3 run_transport_sweep.py --csv ../../cifar_traffic_profile.csv \
+      --core-bw 10mbit --cc cubic,dctcp,bbr --nodelay 0,1 --cork 0,1
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+import parse_latency
+from run_loopback import start_shaped_server, stop
+from readiness import wait_for_fabric, wait_for_line
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPLAY = os.path.join(HERE, "traffic_replay.py")
+TCP_INFO_RE = re.compile(r"TCP_INFO .*rtt_ms=([0-9.]+) .*retrans=([0-9]+)")
+
+def parse_list(value, cast=str):
+    return [cast(v) for v in value.split(',') if v != '']
+
+def sweep_space(args):
+    keys = ['cc', 'sndbuf', 'rcvbuf', 'nodelay', 'cork', 'notsent_lowat']
+    values = [parse_list(args.cc), parse_list(args.sndbuf, int), parse_list(args.rcvbuf, int),
+              parse_list(args.nodelay, int), parse_list(args.cork, int),
+              parse_list(args.notsent_lowat, int)]
+    return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+def transport_flags(cfg, role='client'):
+    """traffic_replay.py flags for one profile (0 means kernel default / off)."""
+    flags = []
+    if cfg['cc']:
+        flags += ['--cc', cfg['cc']]
+    if cfg['rcvbuf']:
+        flags += ['--rcvbuf', str(cfg['rcvbuf'])]
+    if role == 'client':
+        if cfg['sndbuf']:
+            flags += ['--sndbuf', str(cfg['sndbuf'])]
+        if cfg['nodelay']:
+            flags += ['--nodelay']
+        if cfg['cork']:
+            flags += ['--cork']
+        if cfg['notsent_lowat']:
+            flags += ['--notsent-lowat', str(cfg['notsent_lowat'])]
+    return flags
+
+def truncate_profile(csv_path, rows, out_path):
+    with open(csv_path, newline='') as src, open(out_path, 'w', newline='') as dst:
+        reader = csv.DictReader(src)
+        writer = csv.DictWriter(dst, fieldnames=reader.fieldnames)
+        writer.writeheader()
+        for i, row in enumerate(reader):
+            if i >= rows:
+                break
+            writer.writerow(row)
+
+def summarize(client_log, server_log, latency_csv):
+    parse_latency.main(['--client-log', client_log, '--server-log', server_log,
+                        '--output', latency_csv])
+    with open(latency_csv) as f:
+        lat = sorted(float(r['latency_s']) for r in csv.DictReader(f))
+    rtts, retrans = [], 0
+    with open(client_log) as f:
+        for line in f:
+            m = TCP_INFO_RE.search(line)
+            if m:
+                rtts.append(float(m.group(1)))
+                retrans += int(m.group(2))
+    if not lat:
+        return None
+    return {'messages': len(lat),
+            'mean_ms': statistics.mean(lat) * 1000,
+            'median_ms': statistics.median(lat) * 1000,
+            'p99_ms': lat[min(len(lat) - 1, int(0.99 * len(lat)))] * 1000,
+            'rtt_ms': statistics.mean(rtts) if rtts else '',
+            'retrans': retrans}
+
+class MininetBackend:
+    def __init__(self, args):
+        from mininet.net      import Mininet
+        from mininet.node     import OVSKernelSwitch, RemoteController
+        from mininet.link     import TCLink
+        from fat_tree         import make_topo
+        from run_sim_fat_tree import apply_core_rate
+        self.net = Mininet(topo=make_topo(args.topo, k=args.k),
+                           controller=RemoteController,
+                           switch=OVSKernelSwitch,
+                           link=TCLink,
+                           autoSetMacs=True,
+                           autoStaticArp=True)
+        self.net.start()
+        print("*** Waiting for controller to establish paths...")
+        wait_for_fabric(self.net, [(self.net.get(args.worker_host), self.net.get(args.ps_host))])
+        if args.core_bw:
+            print(f"*** Applying TBF rate={args.core_bw}")
+            apply_core_rate(self.net, args.core_bw)
+        self.ps = self.net.get(args.ps_host)
+        self.worker = self.net.get(args.worker_host)
+        self.args = args
+
+    def run(self, cfg, port, profile, client_log, server_log):
+        self.ps.cmd(f"python3 -u {REPLAY} --mode server --port {port} "
+                    f"{' '.join(transport_flags(cfg, 'server'))} > {server_log} 2>&1 &")
+        wait_for_line(server_log, "Listening", 10)
+        self.worker.cmd(f"python3 -u {REPLAY} --mode client --host {self.ps.IP()} --port {port} "
+                        f"--csv {profile} --tcp-info-interval {self.args.tcp_info_interval} "
+                        f"{' '.join(transport_flags(cfg))} > {client_log} 2>&1")
+        if not wait_for_line(server_log, "Shut down", 30):
+            self.ps.cmd("pkill -f 'traffic_replay.py --mode server'")
+
+    def close(self):
+        self.net.stop()
+
+class LoopbackBackend:
+    def __init__(self, args):
+        self.args = args
+        self.shape = argparse.Namespace(qdisc='tbf' if args.core_bw else 'fifo',
+                                        core_bw=args.core_bw, tbf_burst=args.tbf_burst,
+                                        tbf_limit=args.tbf_limit, netem_args=None)
+
+    def run(self, cfg, port, profile, client_log, server_log):
+        proxy_port = port + 1000
+        server, proxy = start_shaped_server(self.shape, port, proxy_port, server_log,
+                                            server_log.replace("_server.log", "_proxy.log"),
+                                            server_flags=transport_flags(cfg, 'server'))
+        subprocess.run([sys.executable, '-u', REPLAY, '--mode', 'client', '--host', '127.0.0.1',
+                        '--port', str(proxy_port), '--csv', profile,
+                        '--tcp-info-interval', str(self.args.tcp_info_interval)]
+                       + transport_flags(cfg),
+                       stdout=open(client_log, 'w'), stderr=subprocess.STDOUT)
+        wait_for_line(server_log, "Shut down", 30)
+        stop(server, proxy)
+
+    def close(self):
+        pass
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--csv',               type=str,   required=True)
+    p.add_argument('--rows',              type=int,   default=200,
+                   help='Gradient exchanges replayed per profile')
+    p.add_argument('--backend',           choices=['mininet', 'loopback'], default='mininet')
+    p.add_argument('--k',                 type=int,   default=4)
+    p.add_argument('--topo',              type=str,   default=None,
+                   help='Fabric from fat_tree.topos, e.g. leafspine,leaves=8,oversub=3 (default: fat-tree)')
+    p.add_argument('--ps-host',           type=str,   default='h16')
+    p.add_argument('--worker-host',       type=str,   default='h1')
+    p.add_argument('--core-bw',           type=str,   default='10mbit')
+    p.add_argument('--tbf-limit',         type=str,   default='200kb')
+    p.add_argument('--tbf-burst',         type=str,   default='100kb')
+    p.add_argument('--cc',                type=str,   default='cubic,reno',
+                   help='Comma-separated congestion control algorithms')
+    p.add_argument('--sndbuf',            type=str,   default='0,262144',
+                   help='Comma-separated SO_SNDBUF sizes (0 = kernel autotuning)')
+    p.add_argument('--rcvbuf',            type=str,   default='0',
+                   help='Comma-separated SO_RCVBUF sizes (0 = kernel autotuning)')
+    p.add_argument('--nodelay',           type=str,   default='0,1')
+    p.add_argument('--cork',              type=str,   default='0,1')
+    p.add_argument('--notsent-lowat',     type=str,   default='0,16384')
+    p.add_argument('--objective',         choices=['mean_ms', 'median_ms', 'p99_ms'],
+                   default='p99_ms')
+    p.add_argument('--tcp-info-interval', type=float, default=0.01)
+    p.add_argument('--port',              type=int,   default=5000)
+    p.add_argument('--result-dir',        type=str,   default='results/transport_sweep')
+    args = p.parse_args()
+
+    log_dir = os.path.abspath(os.path.join(args.result_dir, "logs"))
+    os.makedirs(log_dir, exist_ok=True)
+    profile = os.path.join(log_dir, "profile.csv")
+    truncate_profile(args.csv, args.rows, profile)
+    space = sweep_space(args)
+    print(f"*** Sweeping {len(space)} transport profiles at core rate {args.core_bw} "
+          f"({args.backend} backend)")
+
+    backend = MininetBackend(args) if args.backend == 'mininet' else LoopbackBackend(args)
+    rows = []
+    try:
+        for i, cfg in enumerate(space):
+            port = args.port + i
+            tag = f"cfg{i}"
+            client_log = os.path.join(log_dir, f"{tag}_client.log")
+            server_log = os.path.join(log_dir, f"{tag}_server.log")
+            backend.run(cfg, port, profile, client_log, server_log)
+            stats = summarize(client_log, server_log, os.path.join(log_dir, f"{tag}_latencies.csv"))
+            if stats is None:
+                print(f"WARNING: {cfg} produced no latency records")
+                continue
+            print(f"*** {cfg}: mean={stats['mean_ms']:.2f}ms median={stats['median_ms']:.2f}ms "
+                  f"p99={stats['p99_ms']:.2f}ms retrans={stats['retrans']}")
+            rows.append(dict(cfg, **stats))
+    finally:
+        backend.close()
+
+    if not rows:
+        print("ERROR: no profile completed")
+        return
+    rows.sort(key=lambda r: r[args.objective])
+    out_csv = os.path.join(args.result_dir, "transport_sweep.csv")
+    with open(out_csv, "w", newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    best = rows[0]
+    cfg = {k: best[k] for k in ('cc', 'sndbuf', 'rcvbuf', 'nodelay', 'cork', 'notsent_lowat')}
+    with open(os.path.join(args.result_dir, "best_transport.json"), "w") as f:
+        json.dump({'core_bw': args.core_bw, 'backend': args.backend,
+                   'objective': args.objective, 'value_ms': best[args.objective],
+                   'config': cfg,
+                   'client_flags': ' '.join(transport_flags(cfg)),
+                   'server_flags': ' '.join(transport_flags(cfg, 'server'))}, f, indent=2)
+    print(f"*** Best for {args.core_bw} by {args.objective}: {cfg} "
+          f"({best[args.objective]:.2f} ms); results in {out_csv}")
+
+if __name__ == '__main__':
+    main()
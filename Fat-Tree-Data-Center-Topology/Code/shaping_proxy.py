@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+shaping_proxy.py
+
+Userspace stand-in for the tc knobs of run_sim_fat_tree.py: an asyncio TCP
+proxy that forwards localhost connections through a token-bucket shaper and
+a delay line, so traffic_replay.py endpoints can run without Mininet, OVS,
+RYU or root.
+
+Each direction of each connection is shaped independently:
+  rate/burst  token bucket (tc tbf `rate` and `burst`)
+  limit       data admitted to the shaper but not yet delivered, counted in
+              16 KB chunks; when exceeded, the proxy stops reading and TCP
+              flow control pushes back on the sender (stands in for the tbf
+              queue `limit`)
+  delay/jitter per-chunk fixed delay plus uniform jitter, never reordering
+              (netem `delay <d> <j>`)
+  loss        a byte stream cannot drop data, so a "lost" chunk is delivered
+              one retransmission timeout late, which is what the receiving
+              application would see (netem `loss <p>%`)
+
+Usage:
+  python3 shaping_proxy.py --listen 6000 --upstream 127.0.0.1:5000 \
+      --rate 10mbit --burst 100kb --limit 200kb --netem-args "delay 5ms 1ms loss 0.1%"
+"""
+
+import argparse
+import asyncio
+import random
+import re
+import sys
+import time
+
+CHUNK = 16384
+
+_RATE_UNITS = {'bit': 1 / 8, 'kbit': 1e3 / 8, 'mbit': 1e6 / 8, 'gbit': 1e9 / 8,
+               'bps': 1, 'kbps': 1e3, 'mbps': 1e6, 'gbps': 1e9}
+_SIZE_UNITS = {'': 1, 'b': 1, 'k': 1024, 'kb': 1024, 'm': 1024 ** 2, 'mb': 1024 ** 2,
+               'g': 1024 ** 3, 'gb': 1024 ** 3, 'kbit': 128, 'mbit': 128 * 1024}
+_TIME_UNITS = {'s': 1.0, 'sec': 1.0, 'ms': 1e-3, 'msec': 1e-3, 'us': 1e-6, 'usec': 1e-6}
+
+
+def _split(value):
+    m = re.fullmatch(r"\s*([0-9.]+)\s*([a-zA-Z]*)\s*", value)
+    if not m:
+        raise ValueError(f"Cannot parse {value!r}")
+    return float(m.group(1)), m.group(2).lower()
+
+def parse_rate(value):
+    """tc rate string ('10mbit', '500kbit', '1gbit') -> bytes per second."""
+    num, unit = _split(value)
+    if unit not in _RATE_UNITS:
+        raise ValueError(f"Unknown rate unit in {value!r}")
+    return num * _RATE_UNITS[unit]
+
+def parse_size(value):
+    """tc size string ('100kb', '200kb', '1mb') -> bytes."""
+    num, unit = _split(value)
+    if unit not in _SIZE_UNITS:
+        raise ValueError(f"Unknown size unit in {value!r}")
+    return int(num * _SIZE_UNITS[unit])
+
+def parse_time(value):
+    """tc time string ('10ms', '1s', '500us'; bare numbers are usec) -> seconds."""
+    num, unit = _split(value)
+    if not unit:
+        return num * 1e-6
+    if unit not in _TIME_UNITS:
+        raise ValueError(f"Unknown time unit in {value!r}")
+    return num * _TIME_UNITS[unit]
+
+def parse_netem(args):
+    """Extract delay, jitter and loss from a netem argument string."""
+    out = {'delay': 0.0, 'jitter': 0.0, 'loss': 0.0}
+    tokens = (args or '').split()
+    i = 0
+    while i < len(tokens):
+        tok = tokens[i]
+        if tok == 'delay' and i + 1 < len(tokens):
+            out['delay'] = parse_time(tokens[i + 1])
+            i += 2
+            if i < len(tokens) and re.match(r"^[0-9.]+[a-z]*$", tokens[i]):
+                out['jitter'] = parse_time(tokens[i])
+                i += 1
+            # a trailing correlation percentage is accepted and ignored
+            if i < len(tokens) and tokens[i].endswith('%'):
+                i += 1
+        elif tok == 'loss' and i + 1 < len(tokens):
+            out['loss'] = float(tokens[i + 1].rstrip('%')) / 100
+            i += 2
+        else:
+            i += 1
+    return out
+
+
+class Shaper:
+    """Token bucket plus delay line for one direction of one connection."""
+
+    def __init__(self, rate=None, burst=None, limit=None, delay=0.0, jitter=0.0,
+                 loss=0.0, rto=0.2):
+        self.rate = rate
+        self.burst = burst if burst is not None else CHUNK
+        self.limit = limit
+        self.delay = delay
+        self.jitter = jitter
+        self.loss = loss
+        self.rto = rto
+        self.tokens = float(self.burst)
+        self.last = time.monotonic()
+        self.last_release = 0.0
+        self.bytes = 0
+        self.lost = 0
+
+    async def admit(self, size):
+        """Wait until the bucket holds `size` tokens; return the departure time."""
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens < size:
+                await asyncio.sleep((size - self.tokens) / self.rate)
+                # Credit the whole sleep, including timer overshoot, so the
+                # long-run rate stays exact at high speeds
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+            self.tokens -= size
+        return now
+
+    def release_time(self, departed):
+        t = departed + self.delay
+        if self.jitter:
+            t += random.uniform(-self.jitter, self.jitter)
+        if self.loss and random.random() < self.loss:
+            t += self.rto
+            self.lost += 1
+        # A TCP byte stream cannot reorder: never release before the previous chunk
+        t = max(t, self.last_release)
+        self.last_release = t
+        return t
+
+
+async def _pump(reader, writer, shaper):
+    line = asyncio.Queue()
+    in_flight = asyncio.Semaphore(max(1, (shaper.limit or 1 << 30) // CHUNK))
+
+    async def deliver():
+        while True:
+            item = await line.get()
+            if item is None:
+                break
+            release, data = item
+            delay = release - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            writer.write(data)
+            await writer.drain()
+            in_flight.release()
+        if writer.can_write_eof():
+            writer.write_eof()
+
+    sender = asyncio.ensure_future(deliver())
+    try:
+        while True:
+            await in_flight.acquire()
+            data = await reader.read(CHUNK)
+            if not data:
+                in_flight.release()
+                break
+            departed = await shaper.admit(len(data))
+            shaper.bytes += len(data)
+            line.put_nowait((shaper.release_time(departed), data))
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        line.put_nowait(None)
+        try:
+            await sender
+        except ConnectionError:
+            pass
+
+
+class ShapingProxy:
+    def __init__(self, upstream_host, upstream_port, make_shaper, verbose=True):
+        self.upstream = (upstream_host, upstream_port)
+        self.make_shaper = make_shaper
+        self.verbose = verbose
+        self.connections = 0
+
+    async def handle(self, client_reader, client_writer):
+        peer = client_writer.get_extra_info('peername')
+        try:
+            up_reader, up_writer = await asyncio.open_connection(*self.upstream)
+        except OSError as e:
+            print(f"[Proxy] Cannot reach upstream {self.upstream}: {e}", file=sys.stderr)
+            client_writer.close()
+            return
+        self.connections += 1
+        fwd, rev = self.make_shaper(), self.make_shaper()
+        t0 = time.monotonic()
+        if self.verbose:
+            print(f"[Proxy] Connection from {peer} -> {self.upstream[0]}:{self.upstream[1]}",
+                  flush=True)
+        await asyncio.gather(_pump(client_reader, up_writer, fwd),
+                             _pump(up_reader, client_writer, rev))
+        for w in (up_writer, client_writer):
+            w.close()
+        elapsed = time.monotonic() - t0
+        if self.verbose:
+            print(f"[Proxy] Closed {peer}: forwarded {fwd.bytes} bytes "
+                  f"({fwd.bytes * 8 / max(elapsed, 1e-9) / 1e6:.2f} Mbps avg), "
+                  f"{fwd.lost} chunks delayed as lost", flush=True)
+
+
+def shaper_factory(rate=None, burst=None, limit=None, netem_args=None, rto=0.2):
+    rate_bps = parse_rate(rate) if rate else None
+    burst_b = parse_size(burst) if burst else None
+    limit_b = parse_size(limit) if limit else None
+    netem = parse_netem(netem_args)
+    return lambda: Shaper(rate_bps, burst_b, limit_b, netem['delay'], netem['jitter'],
+                          netem['loss'], rto)
+
+
+async def serve(listen_port, upstream, make_shaper, ready=None):
+    host, port = upstream.rsplit(':', 1)
+    proxy = ShapingProxy(host, int(port), make_shaper)
+    server = await asyncio.start_server(proxy.handle, '127.0.0.1', listen_port)
+    print(f"[Proxy] Listening on 127.0.0.1:{listen_port} -> {upstream}", flush=True)
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    p = argparse.ArgumentParser(description="Userspace token-bucket/netem shaping proxy")
+    p.add_argument('--listen',     type=int, required=True, help='Local port to accept on')
+    p.add_argument('--upstream',   type=str, required=True, help='host:port to forward to')
+    p.add_argument('--rate',       type=str, default=None, help="tbf rate, e.g. 10mbit")
+    p.add_argument('--burst',      type=str, default='100kb', help='tbf burst')
+    p.add_argument('--limit',      type=str, default='200kb', help='tbf queue limit')
+    p.add_argument('--netem-args', type=str, default=None, help='e.g. "delay 10ms 2ms loss 1%%"')
+    p.add_argument('--rto',        type=float, default=0.2,
+                   help='Extra delay applied to a chunk that netem loss hits (seconds)')
+    args = p.parse_args()
+
+    make = shaper_factory(args.rate, args.burst, args.limit, args.netem_args, args.rto)
+    try:
+        asyncio.run(serve(args.listen, args.upstream, make))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
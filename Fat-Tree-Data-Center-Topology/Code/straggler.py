@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+straggler.py: Per-worker compute-time model and barrier-wait analysis
+
+Synchronous training runs at the pace of its slowest worker, so replaying
+one fixed interval_s on every worker hides compute stragglers.
+ComputeModel instead draws every batch's compute time (forward_s +
+backward_s) from the empirical per-batch distribution in
+cifar_profile.json, independently per worker (its own seed):
+
+  slow_factor   a persistently slow node: every draw is multiplied by F
+  tail_prob     with this probability a draw is stretched by a Pareto
+  tail_alpha    (alpha) factor >= 1, a heavy tail of stalls
+
+rounds() joins the worker logs of a --sync run with the PS log (round r
+is every worker's r-th push) and splits each round's barrier wait (first
+to last arrival at the PS) into the part caused by compute and the part
+caused by the network. With the first (F) and last (L) arriving workers:
+
+  barrier wait = (start_L - start_F)        skew: released at different times
+               + (compute_L - compute_F)    compute
+               + (network_L - network_F)    network: compute end to arrival
+
+throughput() gives the iteration rate (local steps included) over the
+workers' logs, for comparing sync policies (run_ps.py --policies).
+
+  python3 straggler.py --server-log logs/h16_server.log \\
+      --client-log h1=logs/h1_client.log --client-log h2=logs/h2_client.log --out rounds.csv
+"""
+
+import argparse
+import csv
+import json
+import random
+import re
+import statistics
+
+import replay_profile
+
+PORT_RE = re.compile(r"\[Client\] Connected from port ([0-9]+)")
+COMPUTE_RE = re.compile(r"\[Client\] \[([0-9]+)\] Compute ([0-9.]+)s from ([0-9.]+)( \(tail\))?")
+RELEASE_RE = re.compile(r"\[Client\] \[([0-9]+)\] Released at ([0-9.]+)")
+SENT_RE = re.compile(r"\[Client\] \[([0-9]+)\] Sent ([0-9]+) bytes at ([0-9.]+)")
+ARRIVAL_RE = re.compile(r"\[Server\] (?:\[[0-9.]+:([0-9]+)\] )?Completed receiving .* at ([0-9.]+)")
+ROUND_RE = re.compile(r"\[Server\] Round ([0-9]+): ([0-9]+) workers, barrier wait ([0-9.]+)s")
+
+
+class ComputeModel:
+    """Per-batch compute times drawn from a forward/backward (or interval_s) profile."""
+
+    def __init__(self, profile, slow_factor=1.0, tail_prob=0.0, tail_alpha=1.5, seed=None):
+        self.samples = [interval for _, _, interval, _ in replay_profile.iter_rows(profile)]
+        if not self.samples:
+            raise ValueError(f"{profile}: no compute samples")
+        self.slow_factor = slow_factor
+        self.tail_prob = tail_prob
+        self.tail_alpha = tail_alpha
+        self.rng = random.Random(seed)
+
+    def sample(self):
+        """(compute_s, whether a heavy-tail stall was drawn)"""
+        t = self.rng.choice(self.samples) * self.slow_factor
+        tail = self.tail_prob > 0 and self.rng.random() < self.tail_prob
+        if tail:
+            t *= self.rng.paretovariate(self.tail_alpha)
+        return t, tail
+
+
+def read_worker(path):
+    """Local port and per-step start, compute, tail flag, push and release of one client log."""
+    port, rounds = None, {}
+    with open(path) as f:
+        for line in f:
+            m = COMPUTE_RE.search(line)
+            if m:
+                rounds[int(m.group(1))] = {'start': float(m.group(3)), 'compute': float(m.group(2)),
+                                           'tail': bool(m.group(4))}
+                continue
+            m = RELEASE_RE.search(line)
+            if m and int(m.group(1)) in rounds:
+                rounds[int(m.group(1))]['release'] = float(m.group(2))
+                continue
+            m = SENT_RE.search(line)
+            if m and int(m.group(1)) in rounds:
+                rounds[int(m.group(1))]['sent'] = float(m.group(3))
+                continue
+            m = PORT_RE.search(line)
+            if m:
+                port = int(m.group(1))
+    return port, rounds
+
+def read_arrivals(server_log):
+    """{worker port (None for a single untagged worker): [arrival time of round 0, 1, ...]}"""
+    arrivals = {}
+    with open(server_log) as f:
+        for line in f:
+            m = ARRIVAL_RE.search(line)
+            if m:
+                port = int(m.group(1)) if m.group(1) else None
+                arrivals.setdefault(port, []).append(float(m.group(2)))
+    return arrivals
+
+def rounds(server_log, client_logs):
+    """
+    One row per round of a synchronous run: barrier wait and its
+    skew/compute/network split, round time, slowest worker and tail draws.
+    client_logs maps worker names to their client logs.
+    """
+    arrivals = read_arrivals(server_log)
+    workers = {}
+    for name, path in client_logs.items():
+        port, steps = read_worker(path)
+        pushes = [steps[i] for i in sorted(steps) if 'sent' in steps[i]]
+        workers[name] = (arrivals.get(port if port in arrivals else None, []), pushes)
+    n_rounds = min((len(a) for a, _ in workers.values()), default=0)
+    rows, prev_release = [], None
+    for r in range(n_rounds):
+        seen = {}
+        for name, (arr, pushes) in workers.items():
+            if r < len(pushes):
+                rec = pushes[r]
+                seen[name] = {**rec, 'arrival': arr[r],
+                              'network': arr[r] - rec['start'] - rec['compute']}
+        if len(seen) < len(workers):
+            break
+        first = min(seen, key=lambda w: seen[w]['arrival'])
+        last = max(seen, key=lambda w: seen[w]['arrival'])
+        F, L = seen[first], seen[last]
+        release = max(w.get('release', w['arrival']) for w in seen.values())
+        begin = prev_release if prev_release is not None else min(w['start'] for w in seen.values())
+        rows.append({
+            'round': r,
+            'workers': len(seen),
+            'round_s': release - begin,
+            'barrier_wait_s': L['arrival'] - F['arrival'],
+            'skew_s': L['start'] - F['start'],
+            'compute_s': L['compute'] - F['compute'],
+            'network_s': L['network'] - F['network'],
+            'slowest': last,
+            'compute_max_s': max(w['compute'] for w in seen.values()),
+            'network_max_s': max(w['network'] for w in seen.values()),
+            'tail_draws': sum(w['tail'] for w in seen.values()),
+        })
+        prev_release = release
+    return rows
+
+def throughput(client_logs):
+    """
+    Steps and pushes over all workers, the wall time from the first compute
+    to the last step end, and steps/s as the sum of each worker's own rate
+    (under ssp/asp fast workers finish early rather than wait).
+    """
+    steps = pushes = 0
+    rate, begin, end = 0.0, None, None
+    for path in client_logs.values():
+        _, per_step = read_worker(path)
+        if not per_step:
+            continue
+        first = min(rec['start'] for rec in per_step.values())
+        last = max(rec.get('release', rec.get('sent', rec['start'] + rec['compute']))
+                   for rec in per_step.values())
+        if last > first:
+            rate += len(per_step) / (last - first)
+        begin = first if begin is None else min(begin, first)
+        end = last if end is None else max(end, last)
+        steps += len(per_step)
+        pushes += sum('sent' in rec for rec in per_step.values())
+    return {'steps': steps, 'pushes': pushes, 'duration_s': (end - begin) if steps else 0.0,
+            'steps_per_s': rate}
+
+def summarize(rows):
+    """Means over the rounds, and each cause's share of the total barrier wait."""
+    if not rows:
+        return {'rounds': 0}
+    total = sum(r['barrier_wait_s'] for r in rows) or 1.0
+    slowest = {}
+    for r in rows:
+        slowest[r['slowest']] = slowest.get(r['slowest'], 0) + 1
+    return {
+        'rounds': len(rows),
+        'mean_round_s': statistics.mean(r['round_s'] for r in rows),
+        'rounds_per_s': len(rows) / sum(r['round_s'] for r in rows),
+        'mean_barrier_wait_s': statistics.mean(r['barrier_wait_s'] for r in rows),
+        'compute_share': sum(r['compute_s'] for r in rows) / total,
+        'network_share': sum(r['network_s'] for r in rows) / total,
+        'skew_share': sum(r['skew_s'] for r in rows) / total,
+        'slowest_counts': slowest,
+        'tail_draws': sum(r['tail_draws'] for r in rows),
+    }
+
+def write_rounds(rows, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        fields = ['round', 'workers', 'round_s', 'barrier_wait_s', 'skew_s', 'compute_s',
+                  'network_s', 'slowest', 'compute_max_s', 'network_max_s', 'tail_draws']
+        writer.writerow(fields)
+        for r in rows:
+            writer.writerow([f"{r[k]:.6f}" if isinstance(r[k], float) else r[k] for k in fields])
+    return path
+
+
+def main():
+    p = argparse.ArgumentParser(description="Split barrier wait per round into compute and network")
+    p.add_argument('--server-log', type=str, required=True)
+    p.add_argument('--client-log', type=str, action='append', required=True,
+                   help='name=path of one worker client log (repeat per worker)')
+    p.add_argument('--out',        type=str, default='rounds.csv')
+    args = p.parse_args()
+    logs = dict(entry.split('=', 1) if '=' in entry else (entry, entry) for entry in args.client_log)
+    rows = rounds(args.server_log, logs)
+    write_rounds(rows, args.out)
+    print(json.dumps(summarize(rows), indent=2))
+    print(f"Wrote {len(rows)} rounds to {args.out}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+topologies.py
+
+Data-center fabric generators shared by the Mininet topologies in
+fat_tree.py and by offline tools that must not need Mininet. Each build_*
+function takes a builder with the Topo API (addSwitch/addHost/addLink), so
+the same code fills a Mininet Topo or a plain Fabric.
+
+Naming follows the fat-tree everywhere: hosts are h1..hN, switches carry a
+role prefix and one global counter (c = core/spine/intermediate,
+a = aggregation, e = edge/ToR/leaf). run_sim_fat_tree.apply_core_rate
+shapes the links into the 'c' tier (core_uplink), so the same knobs work on
+every fabric.
+
+  fattree    k-ary fat-tree (k pods, 2 hosts per edge switch)
+  leafspine  leaves x spines, uplinks sized for the oversubscription ratio
+  vl2        Clos of DA-port aggregation and DI-port intermediate switches
+  jellyfish  random regular graph of ToRs (all switches are 'e')
+  bcube      BCube(n, levels); each server's relay is its own 'e' switch
+             and every level switch is 'c'
+
+Export a generated fabric without Mininet:
+  python3 topologies.py leafspine,leaves=8,spines=4,oversub=3 --export ls.json
+"""
+
+import argparse
+import json
+import random
+
+ROLES = {'c': 'core', 'a': 'aggregation', 'e': 'edge', 'h': 'host'}
+
+# Prepended to every switch and host-interface name of this process's fabric,
+# so several fabrics can share one kernel and OVS (set by fat_tree.isolate)
+NAME_PREFIX = ''
+
+
+class Fabric:
+    """Mininet-free builder with the parts of the Topo API the generators use."""
+
+    def __init__(self):
+        self._switches = []
+        self._hosts = []
+        self._links = []
+
+    def addSwitch(self, name, **opts):
+        self._switches.append(name)
+        return name
+
+    def addHost(self, name, **opts):
+        self._hosts.append(name)
+        return name
+
+    def addLink(self, node1, node2, **opts):
+        self._links.append((node1, node2, opts))
+
+    def switches(self, sort=True):
+        return list(self._switches)
+
+    def hosts(self, sort=True):
+        return list(self._hosts)
+
+    def links(self, sort=False, withKeys=False, withInfo=False):
+        if withInfo:
+            return list(self._links)
+        return [(a, b) for a, b, _ in self._links]
+
+
+def base_name(name):
+    """Node name without this process's NAME_PREFIX ('r2c1' -> 'c1')."""
+    return name[len(NAME_PREFIX):] if NAME_PREFIX and name.startswith(NAME_PREFIX) else name
+
+def role(name):
+    """Role letter of a node name: 'c', 'a', 'e' or 'h'."""
+    return base_name(name)[:1]
+
+def core_uplink(n1, n2, has_core=True):
+    """
+    True when traffic n1 -> n2 crosses a shaped core uplink: into the 'c'
+    tier from below, or any switch-to-switch hop in a fabric without one.
+    """
+    if role(n1) == 'h' or role(n2) == 'h':
+        return False
+    if not has_core:
+        return True
+    return role(n2) == 'c' and role(n1) != 'c'
+
+def _switches(t, prefix, count, first):
+    return [t.addSwitch(f'{prefix}{first + i}') for i in range(count)]
+
+def _hosts(t, switch, count, next_id, bw):
+    """Attach `count` hosts to `switch`; return the next free host number."""
+    for _ in range(count):
+        host = t.addHost(f'h{next_id}')
+        t.addLink(switch, host, bw=bw)
+        next_id += 1
+    return next_id
+
+
+def build_fat_tree(t, k=4, bw=10):
+    """k-ary fat-tree, identical to the original MyTopo layout."""
+    half = k // 2
+    core = _switches(t, 'c', half * half, 1)
+    agg = _switches(t, 'a', k * half, len(core) + 1)
+    edge = _switches(t, 'e', k * half, len(core) + len(agg) + 1)
+    for i, c_sw in enumerate(core):
+        start = i % half
+        for j in range(k):
+            t.addLink(c_sw, agg[start + j * half], bw=bw)
+    for i, a_sw in enumerate(agg):
+        group = i // half
+        for j in range(half):
+            t.addLink(a_sw, edge[group * half + j], bw=bw)
+    host_id = 1
+    for e_sw in edge:
+        host_id = _hosts(t, e_sw, 2, host_id, bw)
+
+def build_leaf_spine(t, leaves=4, spines=2, hosts_per_leaf=4, oversub=1.0, bw=10):
+    """
+    Two-tier leaf-spine. Each leaf has one uplink per spine, sized so that
+    host capacity / uplink capacity per leaf equals `oversub`.
+    """
+    spine = _switches(t, 'c', spines, 1)
+    leaf = _switches(t, 'e', leaves, spines + 1)
+    uplink = hosts_per_leaf * bw / (spines * oversub)
+    for l_sw in leaf:
+        for s_sw in spine:
+            t.addLink(l_sw, s_sw, bw=uplink)
+    host_id = 1
+    for l_sw in leaf:
+        host_id = _hosts(t, l_sw, hosts_per_leaf, host_id, bw)
+
+def build_vl2(t, da=4, di=4, hosts_per_tor=2, bw=10, uplink_factor=10):
+    """
+    VL2 Clos: DA/2 intermediate switches, DI aggregation switches and
+    DA*DI/4 ToRs. Every aggregation switch reaches every intermediate; each
+    ToR is dual-homed to one pair of aggregation switches. Switch-to-switch
+    links run `uplink_factor` times faster than host links.
+    """
+    inter = _switches(t, 'c', da // 2, 1)
+    agg = _switches(t, 'a', di, len(inter) + 1)
+    tors = _switches(t, 'e', da * di // 4, len(inter) + len(agg) + 1)
+    fast = bw * uplink_factor
+    for a_sw in agg:
+        for i_sw in inter:
+            t.addLink(a_sw, i_sw, bw=fast)
+    for i, tor in enumerate(tors):
+        group = i // (da // 2)
+        t.addLink(tor, agg[2 * group], bw=fast)
+        t.addLink(tor, agg[2 * group + 1], bw=fast)
+    host_id = 1
+    for tor in tors:
+        host_id = _hosts(t, tor, hosts_per_tor, host_id, bw)
+
+def jellyfish_edges(switches, degree, seed=1):
+    """
+    Random `degree`-regular graph over switch indices 0..switches-1, built
+    as in Jellyfish: join random pairs with free ports, then splice switches
+    left with two or more free ports into existing links.
+    """
+    rng = random.Random(seed)
+    free = {i: degree for i in range(switches)}
+    adj = {i: set() for i in range(switches)}
+    while True:
+        open_sw = [i for i, n in free.items() if n > 0]
+        pairs = [(a, b) for x, a in enumerate(open_sw) for b in open_sw[x + 1:] if b not in adj[a]]
+        if not pairs:
+            break
+        a, b = rng.choice(pairs)
+        adj[a].add(b)
+        adj[b].add(a)
+        free[a] -= 1
+        free[b] -= 1
+    for p in [i for i, n in free.items() if n >= 2]:
+        while free[p] >= 2:
+            links = [(x, y) for x in adj for y in adj[x]
+                     if x < y and p not in (x, y) and x not in adj[p] and y not in adj[p]]
+            if not links:
+                break
+            x, y = rng.choice(links)
+            adj[x].discard(y)
+            adj[y].discard(x)
+            for z in (x, y):
+                adj[p].add(z)
+                adj[z].add(p)
+            free[p] -= 2
+    return sorted((a, b) for a in adj for b in adj[a] if a < b)
+
+def build_jellyfish(t, switches=8, degree=3, hosts_per_switch=2, seed=1, bw=10):
+    """Jellyfish: `switches` ToRs wired as a random `degree`-regular graph."""
+    tors = _switches(t, 'e', switches, 1)
+    for a, b in jellyfish_edges(switches, degree, seed):
+        t.addLink(tors[a], tors[b], bw=bw)
+    host_id = 1
+    for tor in tors:
+        host_id = _hosts(t, tor, hosts_per_switch, host_id, bw)
+
+def build_bcube(t, n=4, levels=1, bw=10):
+    """
+    BCube(n, levels): n**(levels+1) servers and levels+1 rows of n**levels
+    n-port switches. Server relaying is done by a per-server 'e' switch,
+    since Mininet hosts do not forward; the server's NIC ports become that
+    switch's uplinks, one per level.
+    """
+    servers = n ** (levels + 1)
+    per_level = n ** levels
+    relays = _switches(t, 'e', servers, 1)
+    rows = [_switches(t, 'c', per_level, servers + 1 + l * per_level) for l in range(levels + 1)]
+    for s, relay in enumerate(relays):
+        for l in range(levels + 1):
+            # The level-l switch is the server address with digit l removed
+            high, low = divmod(s, n ** l)
+            t.addLink(relay, rows[l][(high // n) * n ** l + low], bw=bw)
+    host_id = 1
+    for relay in relays:
+        host_id = _hosts(t, relay, 1, host_id, bw)
+
+BUILDERS = {
+    'fattree':   build_fat_tree,
+    'leafspine': build_leaf_spine,
+    'vl2':       build_vl2,
+    'jellyfish': build_jellyfish,
+    'bcube':     build_bcube,
+}
+
+
+def parse_spec(spec):
+    """'leafspine,8,spines=4' -> ('leafspine', [8], {'spines': 4}) like `mn --topo`."""
+    def number(v):
+        for cast in (int, float):
+            try:
+                return cast(v)
+            except ValueError:
+                pass
+        return v
+    name, *parts = spec.split(',')
+    args = [number(p) for p in parts if '=' not in p]
+    kwargs = {k: number(v) for k, v in (p.split('=', 1) for p in parts if '=' in p)}
+    return name, args, kwargs
+
+def fabric(spec):
+    """Build a Fabric from a spec string; 'mytopo' is an alias of 'fattree'."""
+    name, args, kwargs = parse_spec(spec)
+    t = Fabric()
+    BUILDERS['fattree' if name == 'mytopo' else name](t, *args, **kwargs)
+    return t
+
+def export(topo):
+    """JSON-ready description of a Fabric or Mininet Topo."""
+    links = [{'a': a, 'b': b, 'bw': info.get('bw')} for a, b, info in topo.links(withInfo=True)]
+    ports = {}
+    for link in links:
+        for end in (link['a'], link['b']):
+            ports[end] = ports.get(end, 0) + 1
+    switches = topo.switches()
+    return {'hosts': topo.hosts(),
+            'switches': [{'name': s, 'role': ROLES.get(role(s), 'switch'), 'ports': ports.get(s, 0)}
+                         for s in switches],
+            'links': links,
+            'switch_ports': sum(ports.get(s, 0) for s in switches)}
+
+def main():
+    p = argparse.ArgumentParser(description="Generate a fabric and export it as JSON")
+    p.add_argument('spec',     type=str, help="e.g. fattree,k=8 or jellyfish,switches=20,degree=4")
+    p.add_argument('--export', type=str, default=None, help='Write the fabric to this JSON file')
+    args = p.parse_args()
+    desc = export(fabric(args.spec))
+    print(f"*** {args.spec}: {len(desc['hosts'])} hosts, {len(desc['switches'])} switches, "
+          f"{len(desc['links'])} links, {desc['switch_ports']} switch ports")
+    if args.export:
+        with open(args.export, 'w') as f:
+            json.dump(desc, f, indent=2)
+        print(f"*** Wrote {args.export}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+traffic_matrix.py: Time-bucketed sparse traffic matrices for whole-cluster replay
+
+A traffic matrix trace holds, for every time bucket, the bytes each host
+sends to each other host. Only non-zero entries are stored, one bucket at a
+time, as big-endian structs (gzip-compressed when the path ends in .gz):
+
+  header : b'TMX1' + uint32 hosts + float64 bucket_s
+  bucket : uint32 bucket index, uint32 entries      (indices increase)
+  entry  : uint16 src, uint16 dst, uint64 bytes     (hosts are h1..hN)
+
+Bucket i starts i * bucket_s seconds after the shared start time. Readers
+stream one bucket at a time, so traces of any length replay in constant
+memory. The orchestrator (run_traffic_matrix.py) shards a trace by source
+host, and each host's replay agent (traffic_replay.py --mode agent) sends
+its slice; flows_csv() then pairs agent releases with receiver completions
+into per-flow completion times.
+
+  python3 traffic_matrix.py convert flows.csv --bucket 0.01 --out cluster.tmx.gz
+  python3 traffic_matrix.py from-profile cifar_traffic_profile.csv --hosts 16 --ps 16 \
+      --pull --out ps16.tmx
+  python3 traffic_matrix.py info cluster.tmx.gz
+"""
+import argparse
+import csv
+import gzip
+import os
+import re
+import statistics
+import struct
+
+from replay_profile import iter_rows
+
+MAGIC = b'TMX1'
+HEADER = struct.Struct('>4sId')
+BUCKET = struct.Struct('>II')
+ENTRY = struct.Struct('>HHQ')
+
+CONNECT_RE = re.compile(r"\[Agent\] Connected to h(\d+) \(.*\) from port (\d+)")
+RELEASE_RE = re.compile(r"\[Agent\] \[(\d+)\] Released (\d+) bytes to h(\d+) at ([0-9]+\.[0-9]+)")
+ACCEPT_RE = re.compile(r"\[Server\] Connection from \('([0-9.]+)', (\d+)\)")
+DONE_RE = re.compile(r"\[Server\] (?:\[([0-9.]+):(\d+)\] )?Completed receiving (\d+) bytes .* at ([0-9]+\.[0-9]+)")
+
+
+def _open(path, mode):
+    return gzip.open(path, mode) if path.endswith('.gz') else open(path, mode)
+
+
+class TMWriter:
+    """Write buckets of (src, dst, bytes) entries in increasing bucket order."""
+
+    def __init__(self, path, hosts, bucket_s):
+        self.f = _open(path, 'wb')
+        self.f.write(HEADER.pack(MAGIC, hosts, bucket_s))
+        self.hosts = hosts
+        self.bucket_s = bucket_s
+        self.last = -1
+
+    def write_bucket(self, index, entries):
+        if index <= self.last:
+            raise ValueError(f"bucket {index} written after bucket {self.last}")
+        entries = [e for e in entries if e[2] > 0]
+        if not entries:
+            return
+        self.f.write(BUCKET.pack(index, len(entries)))
+        self.f.write(b''.join(ENTRY.pack(s, d, n) for s, d, n in entries))
+        self.last = index
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_header(path):
+    """(hosts, bucket_s) of a trace."""
+    with _open(path, 'rb') as f:
+        magic, hosts, bucket_s = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a traffic matrix trace (magic={magic!r})")
+    return hosts, bucket_s
+
+def iter_buckets(path):
+    """Yield (bucket index, [(src, dst, bytes), ...]) lazily, one bucket at a time."""
+    with _open(path, 'rb') as f:
+        magic, _, _ = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a traffic matrix trace (magic={magic!r})")
+        while True:
+            hdr = f.read(BUCKET.size)
+            if len(hdr) < BUCKET.size:
+                return
+            index, count = BUCKET.unpack(hdr)
+            body = f.read(count * ENTRY.size)
+            yield index, list(ENTRY.iter_unpack(body))
+
+
+def host_number(name):
+    """'h12' or '12' -> 12."""
+    return int(str(name).lstrip('h'))
+
+def convert_csv(csv_in, out, bucket_s, hosts=None):
+    """
+    Build a trace from time_s,src,dst,bytes rows (any order); flows that
+    fall in the same bucket between the same pair are merged.
+    """
+    buckets = {}
+    top = 0
+    with open(csv_in, newline='') as f:
+        for row in csv.DictReader(f):
+            s, d = host_number(row['src']), host_number(row['dst'])
+            b = int(float(row['time_s']) / bucket_s)
+            cell = buckets.setdefault(b, {})
+            cell[(s, d)] = cell.get((s, d), 0) + int(row['bytes'])
+            top = max(top, s, d)
+    with TMWriter(out, hosts or top, bucket_s) as w:
+        for b in sorted(buckets):
+            w.write_bucket(b, [(s, d, n) for (s, d), n in sorted(buckets[b].items())])
+    return out
+
+def from_profile(profile_csv, out, hosts, ps, bucket_s=0.01, pull=False):
+    """
+    Whole-cluster PS trace from a replay profile (CSV, JSON or .rprof): at
+    each row's cumulative time every worker pushes grad_bytes to the PS
+    (and, with pull, the PS sends grad_bytes back to every worker).
+    """
+    workers = [h for h in range(1, hosts + 1) if h != ps]
+    t = 0.0
+    with TMWriter(out, hosts, bucket_s) as w:
+        pending, current = [], None
+        for _, _, interval, size in iter_rows(profile_csv):
+            t += interval
+            b = int(t / bucket_s)
+            if current is not None and b != current:
+                w.write_bucket(current, merge(pending))
+                pending = []
+            current = b
+            pending += [(h, ps, size) for h in workers]
+            if pull:
+                pending += [(ps, h, size) for h in workers]
+        if pending:
+            w.write_bucket(current, merge(pending))
+    return out
+
+def merge(entries):
+    cell = {}
+    for s, d, n in entries:
+        cell[(s, d)] = cell.get((s, d), 0) + n
+    return [(s, d, n) for (s, d), n in sorted(cell.items())]
+
+def shard(path, out_dir):
+    """Split a trace by source host into out_dir/h<N>.tmx; return {host: path}."""
+    hosts, bucket_s = read_header(path)
+    os.makedirs(out_dir, exist_ok=True)
+    writers = {}
+    try:
+        for index, entries in iter_buckets(path):
+            by_src = {}
+            for s, d, n in entries:
+                by_src.setdefault(s, []).append((s, d, n))
+            for s, part in by_src.items():
+                if s not in writers:
+                    writers[s] = TMWriter(os.path.join(out_dir, f"h{s}.tmx"), hosts, bucket_s)
+                writers[s].write_bucket(index, part)
+    finally:
+        for w in writers.values():
+            w.close()
+    return {f"h{s}": w.f.name for s, w in writers.items()}
+
+def summary(path):
+    """Totals of a trace, plus {dst: set(src)} of the connections each receiver gets."""
+    hosts, bucket_s = read_header(path)
+    peers = {}
+    flows = total = 0
+    first = last = None
+    for index, entries in iter_buckets(path):
+        first = index if first is None else first
+        last = index
+        for s, d, n in entries:
+            peers.setdefault(f"h{d}", set()).add(f"h{s}")
+            flows += 1
+            total += n
+    duration = (last + 1) * bucket_s if last is not None else 0.0
+    return {'hosts': hosts, 'bucket_s': bucket_s, 'flows': flows, 'bytes': total,
+            'first_bucket': first, 'last_bucket': last, 'duration_s': duration,
+            'peers': peers}
+
+
+def flows_csv(agent_logs, server_logs, host_ips, start_at, out_csv):
+    """
+    Pair every flow an agent released with the matching completion at its
+    receiver and write per-flow completion times. Flows between one pair
+    share a connection, so the k-th release on it matches the k-th
+    completion logged for that connection.
+    """
+    ip_host = {ip: name for name, ip in host_ips.items()}
+    conn_pair, released = {}, {}
+    for src, log in agent_logs.items():
+        with open(log, errors='replace') as f:
+            for line in f:
+                m = CONNECT_RE.search(line)
+                if m:
+                    conn_pair[(host_ips[src], int(m.group(2)))] = (src, f"h{m.group(1)}")
+                    continue
+                m = RELEASE_RE.search(line)
+                if m:
+                    dst = f"h{m.group(3)}"
+                    released.setdefault((src, dst), []).append(
+                        (int(m.group(1)), int(m.group(2)), float(m.group(4))))
+    completed = {}
+    for dst, log in server_logs.items():
+        only = None
+        with open(log, errors='replace') as f:
+            for line in f:
+                m = ACCEPT_RE.search(line)
+                if m and only is None:
+                    only = (m.group(1), int(m.group(2)))
+                m = DONE_RE.search(line)
+                if not m:
+                    continue
+                key = (m.group(1), int(m.group(2))) if m.group(1) else only
+                pair = conn_pair.get(key, (ip_host.get(key[0]) if key else None, dst))
+                completed.setdefault(pair, []).append((int(m.group(3)), float(m.group(4))))
+
+    rows = []
+    for (src, dst), flows in sorted(released.items()):
+        done = completed.get((src, dst), [])
+        for i, (bucket, size, t_rel) in enumerate(flows):
+            got, t_done = done[i] if i < len(done) else (0, None)
+            rows.append({'bucket': bucket, 'src': src, 'dst': dst, 'bytes': size,
+                         'release_s': f"{t_rel - start_at:.6f}",
+                         'fct_s': '' if t_done is None or got < size else f"{t_done - t_rel:.6f}"})
+    rows.sort(key=lambda r: (r['bucket'], r['src'], r['dst']))
+    with open(out_csv, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['bucket', 'src', 'dst', 'bytes', 'release_s', 'fct_s'])
+        writer.writeheader()
+        writer.writerows(rows)
+    fcts = sorted(float(r['fct_s']) for r in rows if r['fct_s'])
+    return {'flows': len(rows), 'completed': len(fcts),
+            'mean_fct_s': statistics.mean(fcts) if fcts else None,
+            'p99_fct_s': fcts[min(len(fcts) - 1, int(0.99 * len(fcts)))] if fcts else None}
+
+
+def main():
+    p = argparse.ArgumentParser(description="Build and inspect traffic matrix traces")
+    sub = p.add_subparsers(dest='cmd', required=True)
+    c = sub.add_parser('convert', help='time_s,src,dst,bytes CSV -> trace')
+    c.add_argument('csv')
+    c.add_argument('--bucket', type=float, default=0.01, help='Bucket length in seconds')
+    c.add_argument('--hosts',  type=int,   default=None)
+    c.add_argument('--out',    required=True)
+    f = sub.add_parser('from-profile', help='Replay profile -> whole-cluster PS trace')
+    f.add_argument('csv')
+    f.add_argument('--hosts',  type=int,   default=16)
+    f.add_argument('--ps',     type=int,   default=16, help='PS host number')
+    f.add_argument('--pull',   action='store_true', help='Also send the model back to workers')
+    f.add_argument('--bucket', type=float, default=0.01)
+    f.add_argument('--out',    required=True)
+    s = sub.add_parser('shard', help='Split a trace per source host')
+    s.add_argument('trace')
+    s.add_argument('--out-dir', required=True)
+    i = sub.add_parser('info', help='Print trace totals')
+    i.add_argument('trace')
+    args = p.parse_args()
+
+    if args.cmd == 'convert':
+        convert_csv(args.csv, args.out, args.bucket, args.hosts)
+        print(f"Wrote {args.out}")
+    elif args.cmd == 'from-profile':
+        from_profile(args.csv, args.out, args.hosts, args.ps, args.bucket, args.pull)
+        print(f"Wrote {args.out}")
+    elif args.cmd == 'shard':
+        for host, path in sorted(shard(args.trace, args.out_dir).items()):
+            print(f"{host}: {path}")
+    else:
+        info = summary(args.trace)
+        print(f"{info['hosts']} hosts, {info['flows']} flows, {info['bytes']} bytes over "
+              f"{info['duration_s']:.3f}s in {info['bucket_s']}s buckets; "
+              f"{sum(len(v) for v in info['peers'].values())} host pairs")
+
+if __name__ == '__main__':
+    main()
@@ -12,68 +12,650 @@ Usage:
     python3 traffic_replay.py --mode client \
       --host <server_ip> --port 5000 \
       --csv /home/mininet/Code/cifar_traffic_profile.csv
+    (--csv also takes a binary profile from replay_profile.py, which is
+    memory-mapped instead of parsed)
+
+  Incast (one server, N burst workers released at the same instant):
+    python3 traffic_replay.py --mode server --port 5000 --connections N
+    python3 traffic_replay.py --mode burst \
+      --host <server_ip> --port 5000 --burst-bytes 248024 --start-at <epoch>
+
+  Striped transfer (each gradient split over M parallel connections, which
+  ECMP can hash onto different core paths; the server needs no extra flag):
+    python3 traffic_replay.py --mode client ... --stripes 4 --stripe-chunk 65536
+
+  Per-connection transport options (either mode) and TCP_INFO sampling
+  (client side), instead of host-wide sysctls:
+    python3 traffic_replay.py --mode client ... --cc dctcp --nodelay \
+      --sndbuf 262144 --notsent-lowat 16384 --tcp-info-interval 0.005
+
+  Parameter server with pulls and a sync policy (bsp: every worker pulls
+  once all N pushed round r; ssp: at most --staleness rounds ahead of the
+  slowest; asp: pull right after each push; local SGD: bsp with
+  --sync-every H on the workers). Workers can draw compute time per batch
+  from the forward/backward profile (see straggler.py and run_ps.py):
+    python3 traffic_replay.py --mode server --port 5000 --connections N --sync-policy ssp --staleness 2
+    python3 traffic_replay.py --mode client ... --sync --compute-model cifar_profile.json \
+      --slow-factor 1.5 --tail-prob 0.01 --seed 3
+
+  Traffic-matrix agent (one per host; follows its shard of a trace from
+  traffic_matrix.py against a shared start time, see run_traffic_matrix.py):
+    python3 traffic_replay.py --mode agent --tm shards/h3.tmx \
+      --hosts-map hosts.json --port 5000 --start-at <epoch>
 """
 
 import argparse
 import socket
-import csv
 import time
 import struct
 import sys
 import os
+import queue
+import random
+import threading
+import json
+import traffic_matrix
+import replay_profile
+import straggler
+
+# struct tcp_info up to tcpi_total_retrans (linux/tcp.h): 8 x u8, 24 x u32
+TCP_INFO_FMT = '<8B24I'
+TCP_INFO_FIELDS = {'unacked': 12, 'retrans': 15, 'rtt': 23, 'rttvar': 24,
+                   'snd_ssthresh': 25, 'snd_cwnd': 26, 'total_retrans': 31}
+TCP_NOTSENT_LOWAT = getattr(socket, 'TCP_NOTSENT_LOWAT', 25)
+
+# Seconds a message may stall mid-payload; idle gaps between messages never time out
+MESSAGE_TIMEOUT = 60
+
+# Striped subflows open with a 12-byte hello instead of a size header: the
+# magic takes the place of the header's top 4 bytes, which a real gradient
+# size never sets. Every chunk then carries (message, total, offset, length).
+STRIPE_MAGIC = b'STRP'
+STRIPE_HELLO = struct.Struct('>4sIHH')   # magic, session id, subflow, subflows
+STRIPE_CHUNK = struct.Struct('>IQQI')    # message index, total size, offset, length
+
+
+def configure_socket(sock, transport, role):
+    """
+    Apply a per-connection transport profile (dict from transport_options)
+    and print what the kernel actually accepted. Unsupported options are
+    reported and skipped rather than aborting the replay.
+    """
+    if not transport:
+        return
+    def setopt(level, opt, value, name):
+        try:
+            sock.setsockopt(level, opt, value)
+        except OSError as e:
+            print(f"[{role}] Cannot set {name}: {e}", file=sys.stderr)
+
+    if transport.get('cc'):
+        setopt(socket.IPPROTO_TCP, socket.TCP_CONGESTION, transport['cc'].encode(), 'TCP_CONGESTION')
+    if transport.get('sndbuf'):
+        setopt(socket.SOL_SOCKET, socket.SO_SNDBUF, transport['sndbuf'], 'SO_SNDBUF')
+    if transport.get('rcvbuf'):
+        setopt(socket.SOL_SOCKET, socket.SO_RCVBUF, transport['rcvbuf'], 'SO_RCVBUF')
+    if transport.get('nodelay'):
+        setopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1, 'TCP_NODELAY')
+    if transport.get('notsent_lowat'):
+        setopt(socket.IPPROTO_TCP, TCP_NOTSENT_LOWAT, transport['notsent_lowat'], 'TCP_NOTSENT_LOWAT')
+
+    cc = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_CONGESTION, 16).split(b'\x00')[0].decode()
+    print(f"[{role}] Transport: cc={cc} "
+          f"sndbuf={sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)} "
+          f"rcvbuf={sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)} "
+          f"nodelay={sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)} "
+          f"cork={int(bool(transport.get('cork')))} "
+          f"notsent_lowat={transport.get('notsent_lowat') or 0}")
+
+
+def read_tcp_info(sock):
+    """Selected struct tcp_info fields of a connected socket (rtt in usec)."""
+    raw = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, struct.calcsize(TCP_INFO_FMT))
+    values = struct.unpack(TCP_INFO_FMT, raw.ljust(struct.calcsize(TCP_INFO_FMT), b'\x00'))
+    return {name: values[i] for name, i in TCP_INFO_FIELDS.items()}
+
+
+class TcpInfoSampler:
+    """
+    Sample TCP_INFO every `interval` seconds while a message is being sent.
+
+    begin(idx) starts sampling for message idx and end() stops it and
+    returns a per-message summary. With `log_path`, every sample is also
+    appended to that CSV.
+    """
+
+    def __init__(self, sock, interval, log_path=None):
+        self.sock = sock
+        self.interval = interval
+        self.active = threading.Event()
+        self.lock = threading.Lock()
+        self.samples = []
+        self.idx = None
+        self.closed = False
+        self.log = open(log_path, 'w') if log_path else None
+        if self.log:
+            self.log.write("time,idx," + ",".join(TCP_INFO_FIELDS) + "\n")
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _sample(self):
+        try:
+            info = read_tcp_info(self.sock)
+        except OSError:
+            return
+        now = time.time()
+        with self.lock:
+            self.samples.append(info)
+            if self.log:
+                self.log.write(f"{now:.6f},{self.idx}," +
+                               ",".join(str(info[f]) for f in TCP_INFO_FIELDS) + "\n")
+
+    def _run(self):
+        while not self.closed:
+            if not self.active.wait(0.5):
+                continue
+            self._sample()
+            time.sleep(self.interval)
+
+    def begin(self, idx):
+        with self.lock:
+            self.samples = []
+            self.idx = idx
+        self._sample()
+        self.active.set()
+
+    def end(self):
+        self.active.clear()
+        self._sample()
+        with self.lock:
+            samples = self.samples
+        rtts = [s['rtt'] for s in samples]
+        return {
+            'samples': len(samples),
+            'cwnd_max': max(s['snd_cwnd'] for s in samples),
+            'cwnd_end': samples[-1]['snd_cwnd'],
+            'rtt_ms': sum(rtts) / len(rtts) / 1000,
+            'rttvar_ms': samples[-1]['rttvar'] / 1000,
+            'retrans': samples[-1]['total_retrans'] - samples[0]['total_retrans'],
+        } if samples else None
+
+    def close(self):
+        self.closed = True
+        self.active.set()
+        self.thread.join(timeout=1)
+        if self.log:
+            self.log.close()
+
+
+def send_message(sock, size, transport=None):
+    """Send one 8-byte size header plus payload, corking them into full segments if asked."""
+    cork = transport and transport.get('cork')
+    if cork:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+    sock.sendall(struct.pack('>Q', size))
+    sock.sendall(b'\x00' * size)
+    if cork:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 0)
+
+
+class StripedSender:
+    """
+    Client side of a striped transfer: `stripes` connections to the same
+    server, each from its own source port, pulling fixed-size chunks of the
+    current message from a shared queue. A subflow takes its next chunk only
+    once the previous one has left its send queue (TCP_NOTSENT_LOWAT is set
+    to the chunk size unless given), so faster paths carry more of each
+    message.
+    """
+
+    def __init__(self, host, port, stripes, chunk_bytes, transport=None):
+        self.count = stripes
+        self.chunk = chunk_bytes
+        self.zeros = bytes(chunk_bytes)
+        self.session = random.getrandbits(32)
+        self.queue = queue.Queue()
+        self.error = None
+        self.sent = [0] * stripes
+        self.busy = [0.0] * stripes
+        self.split = [0] * stripes
+        subflow_transport = dict(transport or {})
+        subflow_transport['notsent_lowat'] = subflow_transport.get('notsent_lowat') or chunk_bytes
+        self.socks = []
+        for j in range(stripes):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            configure_socket(sock, subflow_transport, "Client")
+            sock.settimeout(30)
+            sock.connect((host, port))
+            sock.sendall(STRIPE_HELLO.pack(STRIPE_MAGIC, self.session, j, stripes))
+            print(f"[Client] Subflow {j} connected from local port {sock.getsockname()[1]}")
+            self.socks.append(sock)
+        self.threads = [threading.Thread(target=self._run, args=(j,), daemon=True)
+                        for j in range(stripes)]
+        for t in self.threads:
+            t.start()
+
+    def _run(self, j):
+        sock = self.socks[j]
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            msg_idx, total, offset, length = item
+            try:
+                if self.error is None:
+                    t0 = time.monotonic()
+                    sock.sendall(STRIPE_CHUNK.pack(msg_idx, total, offset, length))
+                    sock.sendall(memoryview(self.zeros)[:length])
+                    self.busy[j] += time.monotonic() - t0
+                    self.sent[j] += length
+                    self.split[j] += length
+            except socket.error as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def send(self, idx, size):
+        """Stripe one message; returns bytes carried by each subflow once all are queued in TCP."""
+        self.split = [0] * self.count
+        for offset in range(0, max(size, 1), self.chunk):
+            self.queue.put((idx, size, offset, min(self.chunk, size - offset)))
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+        return list(self.split)
+
+    def close(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for t in self.threads:
+            t.join(timeout=5)
+        for j, sock in enumerate(self.socks):
+            mbps = self.sent[j] * 8 / self.busy[j] / 1e6 if self.busy[j] > 0 else 0.0
+            print(f"[Client] Subflow {j} (local port {sock.getsockname()[1]}): "
+                  f"{self.sent[j]} bytes, {mbps:.2f} Mbps while sending")
+            sock.close()
+
+
+def log_stripe_split(idx, split):
+    print(f"[Client] [{idx}] Stripe split: " + "/".join(str(b) for b in split))
+
+
+def log_tcp_info(idx, summary):
+    if summary:
+        print(f"[Client] [{idx}] TCP_INFO samples={summary['samples']} "
+              f"cwnd_max={summary['cwnd_max']} cwnd_end={summary['cwnd_end']} "
+              f"rtt_ms={summary['rtt_ms']:.3f} rttvar_ms={summary['rttvar_ms']:.3f} "
+              f"retrans={summary['retrans']}")
+
+
+def recv_exact(conn, n):
+    """Read exactly n bytes; returns fewer only if the peer closed."""
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = conn.recv(n - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return bytes(buf)
+
+
+class RoundBarrier:
+    """
+    Synchronization at the PS. Every push is answered with a pull: a size
+    header plus `pull_bytes` of model (as many bytes as were pushed when
+    None), sent once the policy lets that worker go on:
+
+      bsp  bulk-synchronous, after all `parties` workers pushed the round
+      ssp  stale-synchronous, as long as the worker is at most `staleness`
+           rounds ahead of the slowest one
+      asp  asynchronous, straight away
+
+    Local SGD is bsp with workers that push every H-th step. The spread
+    between the first and the last arrival of each round is logged as its
+    barrier wait. Each connection has its own pull queue and sender thread,
+    so the pulls of a round go out concurrently. The handler that completed
+    the round keeps reading its worker's next push.
+    """
+    STALENESS = {'bsp': 0, 'asp': None}
+
+    def __init__(self, parties, policy='bsp', staleness=1, pull_bytes=None):
+        self.parties = parties
+        self.policy = policy
+        self.staleness = self.STALENESS.get(policy, staleness)
+        self.pull_bytes = pull_bytes
+        self.pushed = {}    # connection -> rounds delivered
+        self.waiting = []   # (round, connection, pushed bytes) not yet pulled
+        self.rounds = {}    # round -> arrivals, until every worker delivered it
+        self.pulls = {}     # connection -> queue of pull sizes for its sender thread
+        self.lock = threading.Lock()
+
+    def arrive(self, conn, label, rnd, t, size):
+        with self.lock:
+            self.pushed[conn] = rnd + 1
+            self.waiting.append((rnd, conn, size))
+            self.rounds.setdefault(rnd, []).append((t, label))
+            done, ready = self._complete(), self._ready()
+        self._release(ready, done)
+
+    def leave(self, conn):
+        """A worker disconnected: stop waiting for it."""
+        with self.lock:
+            self.parties -= 1
+            self.pushed.pop(conn, None)
+            self.waiting = [w for w in self.waiting if w[1] is not conn]
+            pulls = self.pulls.pop(conn, None)
+            if pulls:
+                pulls.put(None)
+            done, ready = self._complete(), self._ready()
+        self._release(ready, done)
+
+    def _complete(self):
+        done = [(r, a) for r, a in sorted(self.rounds.items()) if len(a) >= self.parties]
+        for r, _ in done:
+            del self.rounds[r]
+        return done
+
+    def _ready(self):
+        if self.staleness is None:
+            ready, self.waiting = self.waiting, []
+            return ready
+        slowest = min(self.pushed.values()) if self.pushed and len(self.pushed) >= self.parties else 0
+        ready = [w for w in self.waiting if w[0] < slowest + self.staleness]
+        self.waiting = [w for w in self.waiting if w[0] >= slowest + self.staleness]
+        return ready
+
+    def _sender(self, conn):
+        """The pull queue of `conn`, starting its sender thread on first use."""
+        with self.lock:
+            pulls = self.pulls.get(conn)
+            if pulls is None and conn in self.pushed:
+                pulls = self.pulls[conn] = queue.Queue()
+                threading.Thread(target=self._send_pulls, args=(conn, pulls), daemon=True).start()
+        return pulls
+
+    def _send_pulls(self, conn, pulls):
+        while True:
+            size = pulls.get()
+            if size is None:
+                return
+            try:
+                send_message(conn, size)
+            except OSError:
+                return
+
+    def _release(self, ready, done):
+        for _, conn, size in ready:
+            pulls = self._sender(conn)
+            if pulls:
+                pulls.put(size if self.pull_bytes is None else self.pull_bytes)
+        for rnd, arrivals in done:
+            first = min(t for t, _ in arrivals)
+            last, slowest = max(arrivals)
+            mean_wait = sum(last - t for t, _ in arrivals) / len(arrivals)
+            print(f"[Server] Round {rnd}: {len(arrivals)} workers, barrier wait {last - first:.6f}s "
+                  f"(mean {mean_wait:.6f}s, first {first:.6f}, last {last:.6f}, slowest {slowest})")
+
+
+def handle_connection(conn, addr, tag="", first_header=None, barrier=None):
+    """
+    Receive length-prefixed gradient messages from one connected worker.
+
+    Only a stall inside a message times out (MESSAGE_TIMEOUT). The wait
+    for the next header is unbounded, since persistent connections (the
+    traffic-matrix agents, synchronous workers) may sit idle for as long as
+    the trace says.
+    """
+    label = f"{addr[0]}:{addr[1]}"
+    rnd = 0
+    try:
+        while True:
+            if first_header is not None:
+                hdr, first_header = first_header, None
+            else:
+                conn.settimeout(None)
+                try:
+                    hdr = recv_exact(conn, 8)
+                except socket.timeout:
+                    print(f"[Server] {tag}Timeout waiting for the next header")
+                    break
+                except OSError as e:
+                    print(f"[Server] {tag}Connection error waiting for the next header: {e}")
+                    break
+            if not hdr or len(hdr) < 8:
+                if not hdr:
+                    print(f"[Server] {tag}Connection closed by client")
+                else:
+                    print(f"[Server] {tag}Received incomplete header: {len(hdr)} bytes")
+                break
 
+            size = struct.unpack('>Q', hdr)[0]
+            t_recv = time.time()
+            print(f"[Server] {tag}Received header for {size} bytes at {t_recv:.6f}")
+            conn.settimeout(MESSAGE_TIMEOUT)
+
+            remaining = size
+            chunks_received = 0
+            while remaining > 0:
+                try:
+                    chunk = conn.recv(min(65536, remaining))
+                    chunks_received += 1
+                    if not chunk:
+                        print(f"[Server] {tag}Connection broken while receiving data")
+                        break
+                    remaining -= len(chunk)
+                except socket.timeout:
+                    print(f"[Server] {tag}Timeout while receiving data, {remaining} bytes left")
+                    break
+
+            t_complete = time.time()
+            print(f"[Server] {tag}Completed receiving {size-remaining} bytes (in {chunks_received} chunks) at {t_complete:.6f}")
+            if barrier and not remaining:
+                barrier.arrive(conn, label, rnd, t_complete, size)
+            rnd += 1
+    finally:
+        if barrier:
+            barrier.leave(conn)
+        conn.close()
+
+
+class StripedSession:
+    """
+    Server side of one striped transfer: reassemble every message from the
+    chunks arriving on `count` subflows and report completions in message
+    order, in the same format as a single connection.
+    """
+
+    def __init__(self, session_id, count, tag):
+        self.id = session_id
+        self.count = count
+        self.tag = tag
+        self.lock = threading.Lock()
+        self.messages = {}
+        self.next_report = 0
+        self.threads = []
+        self.bytes = [0] * count
+        self.busy = [0.0] * count
+
+    def add(self, conn, addr, index):
+        print(f"[Server] {self.tag}Subflow {index}/{self.count} of session {self.id:08x} from {addr}")
+        t = threading.Thread(target=self._receive, args=(conn, index), daemon=True)
+        t.start()
+        self.threads.append(t)
+
+    def _receive(self, conn, index):
+        conn.settimeout(60)
+        try:
+            while True:
+                hdr = recv_exact(conn, STRIPE_CHUNK.size)
+                if len(hdr) < STRIPE_CHUNK.size:
+                    break
+                msg_idx, total, offset, length = STRIPE_CHUNK.unpack(hdr)
+                with self.lock:
+                    msg = self.messages.get(msg_idx)
+                    if msg is None:
+                        t_recv = time.time()
+                        print(f"[Server] {self.tag}Received header for {total} bytes at {t_recv:.6f}")
+                        msg = self.messages[msg_idx] = {
+                            'buf': bytearray(total), 'total': total, 'received': 0, 'chunks': 0,
+                            'start': t_recv, 'done': None,
+                            'split': [0] * self.count, 'last': [0.0] * self.count}
+                view = memoryview(msg['buf'])[offset:offset + length]
+                got = 0
+                while got < length:
+                    n = conn.recv_into(view[got:])
+                    if not n:
+                        print(f"[Server] {self.tag}Subflow {index} broken while receiving data")
+                        return
+                    got += n
+                with self.lock:
+                    msg['received'] += length
+                    msg['chunks'] += 1
+                    msg['split'][index] += length
+                    msg['last'][index] = time.time()
+                    if msg['received'] >= msg['total'] and msg['done'] is None:
+                        msg['done'] = time.time()
+                        self._report()
+        except socket.timeout:
+            print(f"[Server] {self.tag}Timeout on subflow {index}")
+        finally:
+            conn.close()
+
+    def _report(self):
+        """Print completed messages in order (caller holds the lock)."""
+        while self.next_report in self.messages and self.messages[self.next_report]['done']:
+            msg = self.messages.pop(self.next_report)
+            for j in range(self.count):
+                if msg['split'][j]:
+                    self.bytes[j] += msg['split'][j]
+                    self.busy[j] += msg['last'][j] - msg['start']
+            print(f"[Server] {self.tag}Completed receiving {msg['received']} bytes "
+                  f"(in {msg['chunks']} chunks) at {msg['done']:.6f}")
+            print(f"[Server] {self.tag}Stripe split for message {self.next_report}: "
+                  + "/".join(str(b) for b in msg['split']))
+            self.next_report += 1
+
+    def join(self):
+        for t in self.threads:
+            t.join()
+        for j in range(self.count):
+            mbps = self.bytes[j] * 8 / self.busy[j] / 1e6 if self.busy[j] > 0 else 0.0
+            print(f"[Server] {self.tag}Subflow {j}: {self.bytes[j]} bytes, {mbps:.2f} Mbps while active")
+
+
+def run_server(port, connections=1, transport=None, sock=None, policy=None, staleness=1,
+               pull_bytes=None):
+    """
+    Accept `connections` workers and receive their gradients.
+
+    With a single connection (the default) the worker is served inline, as
+    in the original 2-node PS setup. With several, every worker gets its own
+    thread and log lines are tagged with the peer address so that
+    simultaneous pushes (incast) can be told apart.
+
+    The transport profile is applied to the listening socket, so accepted
+    connections inherit it (SO_RCVBUF must be set before listen() to affect
+    the window scale).
+
+    A worker that stripes its gradients counts as one of the `connections`;
+    its hello announces how many subflows to accept on its behalf.
+
+    With connections=0 the server is persistent: it keeps accepting workers
+    (each in its own thread) with no accept timeout until it is killed, as
+    the replay agent daemon does. `sock` is an already listening socket to
+    serve on instead of binding `port`.
+
+    With a sync `policy` ('bsp', 'ssp' or 'asp') every unstriped push of
+    the `connections` workers is answered with a pull of the model when
+    the policy allows (see RoundBarrier and the client's sync option).
+    """
+    s = sock or socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if sock is None:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        configure_socket(s, transport, "Server")
+    sessions = {}
+    lock = threading.Lock()
+    if policy and not connections:
+        print("[Server] --sync-policy needs a fixed number of connections; ignoring it")
+    barrier = RoundBarrier(connections, policy, staleness, pull_bytes) if policy and connections else None
+
+    def classify(conn, addr, tag, first):
+        """Route a connection by its first 8 bytes: size header or stripe hello."""
+        if first[:4] != STRIPE_MAGIC:
+            return lambda: handle_connection(conn, addr, tag, first_header=first, barrier=barrier)
+        _, sid, index, count = STRIPE_HELLO.unpack(first + recv_exact(conn, STRIPE_HELLO.size - 8))
+        with lock:
+            session = sessions.get(sid)
+            if session is None:
+                session = sessions[sid] = StripedSession(
+                    sid, count, tag if connections == 1 else f"[{addr[0]}:{sid:08x}] ")
+        session.add(conn, addr, index)
+        return None
+
+    def dispatch(conn, addr, tag, classified):
+        # no timeout: an agent connects at launch but may send its first
+        # message only after the lead time and an idle stretch of the trace
+        conn.settimeout(None)
+        handler = None
+        try:
+            handler = classify(conn, addr, tag, recv_exact(conn, 8))
+        except (socket.timeout, OSError) as e:
+            print(f"[Server] {tag}Failed to read first header: {e}")
+            conn.close()
+        finally:
+            classified.set()
+        if handler:
+            handler()
+
+    def expected():
+        return connections + sum(sess.count - 1 for sess in sessions.values())
 
-def run_server(port):
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     try:
-        s.bind(('0.0.0.0', port))
-        s.listen(1)
+        if sock is None:
+            s.bind(('0.0.0.0', port))
+            s.listen(max(16, connections))
         print(f"[Server] Listening on port {port}...")
         
         # Set a timeout for the accept call so we don't block forever
-        s.settimeout(300)  # 5 minutes timeout
+        if connections:
+            s.settimeout(300)  # 5 minutes timeout
         
+        workers, classified = [], []
+        accepted = 0
         try:
-            conn, addr = s.accept()
-            print(f"[Server] Connection from {addr}")
-            conn.settimeout(60)  # Set a timeout on data reception
-            try:
-                while True:
-                    hdr = conn.recv(8)
-                    if not hdr or len(hdr) < 8:
-                        if not hdr:
-                            print("[Server] Connection closed by client")
-                        else:
-                            print(f"[Server] Received incomplete header: {len(hdr)} bytes")
+            while True:
+                if connections and accepted >= expected():
+                    # Every connection must be identified first: a late stripe
+                    # hello raises the number still to accept
+                    for ev in classified:
+                        ev.wait()
+                    if accepted >= expected():
                         break
-                    
-                    size = struct.unpack('>Q', hdr)[0]
-                    t_recv = time.time()
-                    print(f"[Server] Received header for {size} bytes at {t_recv:.6f}")
-                    
-                    remaining = size
-                    chunks_received = 0
-                    while remaining > 0:
-                        try:
-                            chunk = conn.recv(min(65536, remaining))
-                            chunks_received += 1
-                            if not chunk:
-                                print("[Server] Connection broken while receiving data")
-                                break
-                            remaining -= len(chunk)
-                        except socket.timeout:
-                            print(f"[Server] Timeout while receiving data, {remaining} bytes left")
-                            break
-                    
-                    t_complete = time.time()
-                    print(f"[Server] Completed receiving {size-remaining} bytes (in {chunks_received} chunks) at {t_complete:.6f}")
-            finally:
-                conn.close()
+                conn, addr = s.accept()
+                accepted += 1
+                print(f"[Server] Connection from {addr}")
+                if connections == 1 and accepted == 1:
+                    conn.settimeout(None)
+                    handler = classify(conn, addr, "", recv_exact(conn, 8))
+                    if handler:
+                        handler()
+                    continue
+                ev = threading.Event()
+                t = threading.Thread(target=dispatch,
+                                     args=(conn, addr, f"[{addr[0]}:{addr[1]}] ", ev),
+                                     daemon=True)
+                t.start()
+                workers.append(t)
+                classified.append(ev)
         except socket.timeout:
             print("[Server] Timeout waiting for client connection")
         except Exception as e:
             print(f"[Server] Error during connection: {e}")
+        for t in workers:
+            t.join()
+        for session in sessions.values():
+            session.join()
     except OSError as e:
         print(f"[Server] Could not bind to port {port}: {e}", file=sys.stderr)
     finally:
@@ -81,48 +663,91 @@ def run_server(port):
     print("[Server] Shut down")
 
 
-def run_client(host, port, csv_file):
+def run_client(host, port, csv_file, transport=None, tcp_info_interval=None, tcp_info_log=None,
+               stripes=1, stripe_chunk=65536, compute=None, sync=False, sync_every=1):
+    """
+    Replay a profile: sleep each row's interval_s, then push its gradient.
+
+    compute (a dict of straggler.ComputeModel options) replaces interval_s
+    with compute times drawn from a forward/backward profile. With sync the
+    worker pulls the model after every push (the server answers when its
+    sync policy allows) before computing the next batch. sync_every=H is
+    local SGD: only every H-th step is pushed, the others stay local.
+    """
     print(f"[Client] Connecting to {host}:{port}...")
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if stripes == 1:
+        configure_socket(sock, transport, "Client")
     
     # Set a timeout for connection attempts
     sock.settimeout(30)
+    sampler = striped = None
     
     try:
-        sock.connect((host, port))
-        print("[Client] Connected")
+        if stripes > 1:
+            striped = StripedSender(host, port, stripes, stripe_chunk, transport)
+        else:
+            sock.connect((host, port))
+        print("[Client] Connected" + ("" if striped else f" from port {sock.getsockname()[1]}"))
+        if sync and striped:
+            print("[Client] --sync is not supported with striping; ignoring it")
+            sync = False
+        model = straggler.ComputeModel(**compute) if compute else None
+        if tcp_info_interval and not striped:
+            sampler = TcpInfoSampler(sock, tcp_info_interval, tcp_info_log)
         
-        # Verify CSV file exists and has content
+        # Verify the profile exists
         if not os.path.exists(csv_file):
-            print(f"[Client] Error: CSV file {csv_file} not found", file=sys.stderr)
+            print(f"[Client] Error: profile {csv_file} not found", file=sys.stderr)
             sock.close()
             return
             
-        row_count = 0
+        row_count = step = 0
         try:
-            with open(csv_file, newline='') as f:
-                reader = csv.DictReader(f)
-                for idx, row in enumerate(reader):
-                    try:
-                        interval = float(row['interval_s'])
-                        size = int(row['grad_bytes'])
-                        
-                        print(f"[Client] [{idx}] Sleeping {interval:.4f}s before sending {size} bytes")
-                        time.sleep(interval)
-                        
-                        # send 8-byte header then payload
-                        sock.sendall(struct.pack('>Q', size))
-                        sock.sendall(b'\x00' * size)
-                        t_send = time.time()
-                        print(f"[Client] [{idx}] Sent {size} bytes at {t_send:.6f}")
-                        row_count += 1
-                    except (ValueError, KeyError) as e:
-                        print(f"[Client] Error parsing row {idx}: {e}", file=sys.stderr)
-                    except socket.error as e:
-                        print(f"[Client] Socket error at row {idx}: {e}", file=sys.stderr)
-                        break
+            # Parsed (CSV) or memory-mapped (.rprof) before the paced loop starts
+            for idx, interval, size in replay_profile.schedule(csv_file, log="[Client] "):
+                try:
+                    step += 1
+                    t_sleep = time.time()
+                    tail = False
+                    if model:
+                        interval, tail = model.sample()
+                    if model or sync:
+                        print(f"[Client] [{idx}] Compute {interval:.6f}s from {t_sleep:.6f}"
+                              f"{' (tail)' if tail else ''}")
+                    print(f"[Client] [{idx}] Sleeping {interval:.4f}s before sending {size} bytes")
+                    time.sleep(interval)
+                    lag = time.time() - t_sleep - interval
+                    print(f"[Client] [{idx}] Woke {max(lag, 0) * 1000:.3f}ms late")
+                    if step % sync_every:
+                        print(f"[Client] [{idx}] Local step")
+                        continue
+
+                    # send 8-byte header then payload
+                    if sampler:
+                        sampler.begin(idx)
+                    split = striped.send(idx, size) if striped else send_message(sock, size, transport)
+                    t_send = time.time()
+                    print(f"[Client] [{idx}] Sent {size} bytes at {t_send:.6f}")
+                    if sampler:
+                        log_tcp_info(idx, sampler.end())
+                    if striped:
+                        log_stripe_split(idx, split)
+                    row_count += 1
+                    if sync:
+                        hdr = recv_exact(sock, 8)
+                        if len(hdr) < 8:
+                            print(f"[Client] [{idx}] Server closed before the pull", file=sys.stderr)
+                            break
+                        pulled = len(recv_exact(sock, struct.unpack('>Q', hdr)[0]))
+                        t_release = time.time()
+                        print(f"[Client] [{idx}] Released at {t_release:.6f} "
+                              f"after {t_release - t_send:.6f}s, pulled {pulled} bytes")
+                except socket.error as e:
+                    print(f"[Client] Socket error at row {idx}: {e}", file=sys.stderr)
+                    break
         except Exception as e:
-            print(f"[Client] Error reading CSV: {e}", file=sys.stderr)
+            print(f"[Client] Error reading profile: {e}", file=sys.stderr)
         
         print(f"[Client] Processed {row_count} gradient exchanges")
     except socket.timeout:
@@ -130,25 +755,228 @@ def run_client(host, port, csv_file):
     except socket.error as e:
         print(f"[Client] Connection error: {e}", file=sys.stderr)
     finally:
+        if sampler:
+            sampler.close()
+        if striped:
+            striped.close()
+        sock.close()
+    print("[Client] Done sending")
+
+
+def run_burst(host, port, size, start_at, transport=None, tcp_info_interval=None,
+              tcp_info_log=None, stripes=1, stripe_chunk=65536):
+    """
+    Incast worker: connect early, then release one `size`-byte gradient at
+    the absolute wall-clock time `start_at`.
+
+    All Mininet hosts share the VM clock, so giving every worker the same
+    `start_at` acts as a barrier and the bursts hit the receiver together.
+    """
+    print(f"[Client] Connecting to {host}:{port}...")
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if stripes == 1:
+        configure_socket(sock, transport, "Client")
+    sock.settimeout(30)
+    sampler = striped = None
+    try:
+        if stripes > 1:
+            striped = StripedSender(host, port, stripes, stripe_chunk, transport)
+        else:
+            sock.connect((host, port))
+        print("[Client] Connected")
+        if tcp_info_interval and not striped:
+            sampler = TcpInfoSampler(sock, tcp_info_interval, tcp_info_log)
+        delay = start_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            print(f"[Client] Missed barrier by {-delay:.6f}s", file=sys.stderr)
+        t_release = time.time()
+        print(f"[Client] Released burst at {t_release:.6f}")
+        if sampler:
+            sampler.begin(0)
+        split = striped.send(0, size) if striped else send_message(sock, size, transport)
+        t_send = time.time()
+        print(f"[Client] [0] Sent {size} bytes at {t_send:.6f}")
+        if sampler:
+            log_tcp_info(0, sampler.end())
+        if striped:
+            log_stripe_split(0, split)
+    except socket.timeout:
+        print(f"[Client] Timeout connecting to {host}:{port}", file=sys.stderr)
+    except socket.error as e:
+        print(f"[Client] Connection error: {e}", file=sys.stderr)
+    finally:
+        if sampler:
+            sampler.close()
+        if striped:
+            striped.close()
         sock.close()
     print("[Client] Done sending")
 
 
+def run_agent(shard, hosts_map, port, start_at, transport=None):
+    """
+    Traffic-matrix agent: replay this host's shard of a bucketed trace.
+
+    One persistent connection per destination is opened up front (a first
+    pass over the shard finds them), each drained by its own sender thread,
+    so a slow receiver never holds back releases to the others. The shard is
+    then streamed a bucket at a time; bucket i is released at
+    start_at + i * bucket_s. `hosts_map` maps host names to 'ip' or
+    'ip:port' (the latter lets several agents share one machine).
+    """
+    _, bucket_s = traffic_matrix.read_header(shard)
+    dests = sorted({d for _, entries in traffic_matrix.iter_buckets(shard) for _, d, _ in entries})
+    links, threads = {}, []
+
+    def sender(dst, sock, q):
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            bucket, size = item
+            try:
+                send_message(sock, size, transport)
+            except socket.error as e:
+                print(f"[Agent] Socket error sending bucket {bucket} to h{dst}: {e}", file=sys.stderr)
+                return
+            print(f"[Agent] [{bucket}] Sent {size} bytes to h{dst} at {time.time():.6f}")
+
+    try:
+        for d in dests:
+            ip, _, p = hosts_map[f"h{d}"].partition(':')
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            configure_socket(sock, transport, "Agent")
+            sock.settimeout(30)
+            sock.connect((ip, int(p or port)))
+            sock.settimeout(None)
+            print(f"[Agent] Connected to h{d} ({ip}:{p or port}) from port {sock.getsockname()[1]}")
+            links[d] = (sock, queue.Queue())
+            t = threading.Thread(target=sender, args=(d, *links[d]), daemon=True)
+            t.start()
+            threads.append(t)
+    except (socket.error, KeyError) as e:
+        print(f"[Agent] Could not reach every destination: {e}", file=sys.stderr)
+
+    released = 0
+    if links:
+        for bucket, entries in traffic_matrix.iter_buckets(shard):
+            delay = start_at + bucket * bucket_s - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -bucket_s:
+                print(f"[Agent] [{bucket}] Woke {-delay * 1000:.3f}ms late")
+            for _, d, size in entries:
+                if d not in links:
+                    continue
+                print(f"[Agent] [{bucket}] Released {size} bytes to h{d} at {time.time():.6f}")
+                links[d][1].put((bucket, size))
+                released += 1
+    for sock, q in links.values():
+        q.put(None)
+    for t in threads:
+        t.join()
+    for sock, _ in links.values():
+        sock.close()
+    print(f"[Agent] Released {released} flows to {len(links)} destinations")
+    print("[Agent] Done sending")
+
+
+def transport_options(args):
+    """Collect the per-connection transport flags; None when none are given."""
+    transport = {'cc': args.cc, 'sndbuf': args.sndbuf, 'rcvbuf': args.rcvbuf,
+                 'nodelay': args.nodelay, 'cork': args.cork,
+                 'notsent_lowat': args.notsent_lowat}
+    return transport if any(transport.values()) else None
+
+
 def main():
     parser = argparse.ArgumentParser(description="Mininet gradient-exchange traffic replay")
-    parser.add_argument('--mode', choices=['server','client'], required=True)
+    parser.add_argument('--mode', choices=['server','client','burst','agent'], required=True)
     parser.add_argument('--host', type=str, help="Server IP (for client mode)")
     parser.add_argument('--port', type=int, default=5000, help="Port to use")
-    parser.add_argument('--csv', type=str, help="Path to traffic CSV (for client mode)")
+    parser.add_argument('--csv', type=str,
+                        help="Traffic profile, CSV or binary .rprof (for client mode)")
+    parser.add_argument('--connections', type=int, default=1,
+                        help="Number of workers the server accepts (server mode)")
+    parser.add_argument('--burst-bytes', type=int, default=248024,
+                        help="Gradient burst size (burst mode)")
+    parser.add_argument('--start-at', type=float, default=None,
+                        help="Absolute epoch time to release the burst (burst mode) "
+                             "or bucket 0 of the trace (agent mode)")
+    parser.add_argument('--tm', type=str, default=None,
+                        help="This host's traffic-matrix shard (agent mode)")
+    parser.add_argument('--hosts-map', type=str, default=None,
+                        help="JSON file mapping host names to 'ip' or 'ip:port' (agent mode)")
+    parser.add_argument('--cc', type=str, default=None,
+                        help="Per-socket congestion control (TCP_CONGESTION), e.g. cubic, dctcp, bbr")
+    parser.add_argument('--sndbuf', type=int, default=None, help="SO_SNDBUF in bytes")
+    parser.add_argument('--rcvbuf', type=int, default=None, help="SO_RCVBUF in bytes")
+    parser.add_argument('--nodelay', action='store_true', help="Disable Nagle (TCP_NODELAY)")
+    parser.add_argument('--cork', action='store_true',
+                        help="Cork header and payload into full segments (TCP_CORK)")
+    parser.add_argument('--notsent-lowat', type=int, default=None,
+                        help="TCP_NOTSENT_LOWAT in bytes")
+    parser.add_argument('--tcp-info-interval', type=float, default=None,
+                        help="Sample TCP_INFO every N seconds during each send (client/burst)")
+    parser.add_argument('--tcp-info-log', type=str, default=None,
+                        help="CSV file for every TCP_INFO sample")
+    parser.add_argument('--stripes', type=int, default=1,
+                        help="Split each gradient over this many parallel connections (client/burst)")
+    parser.add_argument('--stripe-chunk', type=int, default=65536,
+                        help="Chunk size pulled by striped subflows, in bytes")
+    parser.add_argument('--sync-policy', choices=['bsp', 'ssp', 'asp'], default=None,
+                        help="Answer every push with a model pull: bulk-synchronous, stale-synchronous "
+                             "or asynchronous (server mode)")
+    parser.add_argument('--staleness', type=int, default=1,
+                        help="Rounds a worker may run ahead of the slowest one (ssp)")
+    parser.add_argument('--pull-bytes', type=int, default=None,
+                        help="Model bytes per pull (default: the size of the push)")
+    parser.add_argument('--sync', action='store_true',
+                        help="Pull the model after every push before computing on (client mode)")
+    parser.add_argument('--sync-every', type=int, default=1,
+                        help="Local SGD: push only every H-th step (client mode)")
+    parser.add_argument('--compute-model', type=str, default=None,
+                        help="Draw per-batch compute time from this forward/backward profile "
+                             "(e.g. cifar_profile.json) instead of interval_s (client mode)")
+    parser.add_argument('--slow-factor', type=float, default=1.0,
+                        help="Persistent slowdown of this worker's compute time")
+    parser.add_argument('--tail-prob', type=float, default=0.0,
+                        help="Probability that a batch's compute time gets a heavy-tail stall")
+    parser.add_argument('--tail-alpha', type=float, default=1.5,
+                        help="Pareto shape of the stall factor (smaller is heavier)")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for the compute-time draws")
     args = parser.parse_args()
+    transport = transport_options(args)
 
     if args.mode == 'server':
-        run_server(args.port)
+        run_server(args.port, args.connections, transport, policy=args.sync_policy,
+                   staleness=args.staleness, pull_bytes=args.pull_bytes)
     elif args.mode == 'client':
         if not args.host or not args.csv:
             print("[Error] --host and --csv are required in client mode", file=sys.stderr)
             sys.exit(1)
-        run_client(args.host, args.port, args.csv)
+        compute = None
+        if args.compute_model:
+            compute = {'profile': args.compute_model, 'slow_factor': args.slow_factor,
+                       'tail_prob': args.tail_prob, 'tail_alpha': args.tail_alpha, 'seed': args.seed}
+        run_client(args.host, args.port, args.csv, transport,
+                   args.tcp_info_interval, args.tcp_info_log, args.stripes, args.stripe_chunk,
+                   compute, args.sync, args.sync_every)
+    elif args.mode == 'burst':
+        if not args.host or args.start_at is None:
+            print("[Error] --host and --start-at are required in burst mode", file=sys.stderr)
+            sys.exit(1)
+        run_burst(args.host, args.port, args.burst_bytes, args.start_at, transport,
+                  args.tcp_info_interval, args.tcp_info_log, args.stripes, args.stripe_chunk)
+    elif args.mode == 'agent':
+        if not args.tm or not args.hosts_map or args.start_at is None:
+            print("[Error] --tm, --hosts-map and --start-at are required in agent mode", file=sys.stderr)
+            sys.exit(1)
+        with open(args.hosts_map) as f:
+            hosts_map = json.load(f)
+        run_agent(args.tm, hosts_map, args.port, args.start_at, transport)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+comm_hooks.py: Gradient-compression DDP comm hooks with traffic accounting
+
+Every hook returned by make_hook() records, per bucket:
+  - payload bytes handed to the collective (after compression)
+  - estimated bytes this rank puts on the wire for that collective
+    (ring all-reduce: 2(N-1)/N x payload, ring all-gather: (N-1) x payload)
+  - encode and decode CPU time (thread CPU time of the compression and
+    decompression code, excluding the collective itself)
+
+Available compressors: none (plain fp32 all-reduce), fp16, powersgd, topk.
+"""
+import math
+import time
+import torch
+import torch.distributed as dist
+from torch.distributed.algorithms.ddp_comm_hooks import powerSGD_hook as powerSGD
+
+COMPRESSORS = ('none', 'fp16', 'powersgd', 'topk')
+
+
+class CommStats:
+    """Per-iteration accumulator of bytes and codec time across all buckets."""
+
+    def __init__(self):
+        self.iterations = 0
+        self.payload_bytes = 0
+        self.wire_bytes = 0
+        self.raw_bytes = 0
+        self.encode_s = 0.0
+        self.decode_s = 0.0
+
+    def add(self, raw, payload, wire, encode_s=0.0):
+        self.raw_bytes += raw
+        self.payload_bytes += payload
+        self.wire_bytes += int(wire)
+        self.encode_s += encode_s
+
+    def add_decode(self, decode_s):
+        self.decode_s += decode_s
+
+    def end_iteration(self):
+        self.iterations += 1
+
+    def summary(self):
+        """Means per iteration since the last reset()."""
+        n = max(1, self.iterations)
+        return {
+            'iterations': self.iterations,
+            'raw_bytes_per_iter': self.raw_bytes / n,
+            'payload_bytes_per_iter': self.payload_bytes / n,
+            'wire_bytes_per_iter': self.wire_bytes / n,
+            'compression_ratio': self.raw_bytes / self.payload_bytes if self.payload_bytes else 1.0,
+            'encode_ms_per_iter': self.encode_s / n * 1000,
+            'decode_ms_per_iter': self.decode_s / n * 1000,
+        }
+
+    def reset(self):
+        self.__init__()
+
+
+def _ring_allreduce(payload, world):
+    return 2 * (world - 1) / world * payload
+
+
+def allreduce_hook(stats, group=None):
+    """Uncompressed fp32 all-reduce (DDP's default), with accounting."""
+    world = dist.get_world_size(group)
+
+    def hook(state, bucket):
+        buf = bucket.buffer()
+        nbytes = buf.numel() * buf.element_size()
+        stats.add(nbytes, nbytes, _ring_allreduce(nbytes, world))
+        tensor = buf.div_(world)
+        fut = dist.all_reduce(tensor, group=group, async_op=True).get_future()
+        return fut.then(lambda f: f.value()[0])
+    return None, hook
+
+
+def fp16_hook(stats, group=None):
+    """Cast each bucket to fp16 for the all-reduce and back to fp32 afterwards."""
+    world = dist.get_world_size(group)
+
+    def hook(state, bucket):
+        t0 = time.thread_time()
+        buf = bucket.buffer()
+        compressed = buf.to(torch.float16).div_(world)
+        raw = buf.numel() * buf.element_size()
+        payload = compressed.numel() * compressed.element_size()
+        stats.add(raw, payload, _ring_allreduce(payload, world), time.thread_time() - t0)
+        fut = dist.all_reduce(compressed, group=group, async_op=True).get_future()
+
+        def decode(f):
+            t1 = time.thread_time()
+            buf.copy_(f.value()[0])
+            stats.add_decode(time.thread_time() - t1)
+            return buf
+        return fut.then(decode)
+    return None, hook
+
+
+def powersgd_hook(stats, group=None, rank=2, start_iter=10):
+    """
+    PowerSGD low-rank compression (torch's implementation).
+
+    The payload is computed from the bucket's tensor shapes with the same
+    compress/skip rule PowerSGD applies. Its orthogonalization and
+    decompression run inside PowerSGD's own future callbacks, so they are
+    counted in the all-reduce time rather than in decode_ms.
+    """
+    world = dist.get_world_size(group)
+    state = powerSGD.PowerSGDState(process_group=group,
+                                   matrix_approximation_rank=rank,
+                                   start_powerSGD_iter=start_iter)
+
+    def payload_of(bucket):
+        buf = bucket.buffer()
+        if state.iter < state.start_powerSGD_iter:
+            return buf.numel() * buf.element_size()
+        elems = 0
+        for grad in bucket.gradients():
+            if grad.ndimension() <= 1:
+                elems += grad.numel()
+                continue
+            n = grad.shape[0]
+            m = grad.numel() // n
+            r = min(n, m, state.matrix_approximation_rank)
+            if n * m > (n + m) * r * state.min_compression_rate:
+                elems += (n + m) * r
+            else:
+                elems += grad.numel()
+        return elems * buf.element_size()
+
+    def hook(state_, bucket):
+        buf = bucket.buffer()
+        raw = buf.numel() * buf.element_size()
+        payload = payload_of(bucket)
+        t0 = time.thread_time()
+        fut = powerSGD.powerSGD_hook(state_, bucket)
+        stats.add(raw, payload, _ring_allreduce(payload, world), time.thread_time() - t0)
+        return fut
+    return state, hook
+
+
+def topk_hook(stats, group=None, ratio=0.01):
+    """
+    Top-k sparsification with error feedback.
+
+    Each rank keeps the k largest-magnitude entries of (gradient + residual)
+    and all-gathers them as one float32 tensor of [values | int32 indices];
+    the dropped mass is carried to the next iteration as the residual.
+    """
+    world = dist.get_world_size(group)
+    residuals = {}
+
+    def hook(state, bucket):
+        t0 = time.thread_time()
+        buf = bucket.buffer()
+        idx = bucket.index()
+        flat = buf.clone()
+        residual = residuals.get(idx)
+        if residual is not None and residual.numel() == flat.numel():
+            flat.add_(residual)
+        k = max(1, math.ceil(flat.numel() * ratio))
+        _, indices = flat.abs().topk(k, sorted=False)
+        values = flat[indices]
+        flat[indices] = 0
+        residuals[idx] = flat
+        packed = torch.cat([values, indices.to(torch.int32).view(torch.float32)])
+        raw = buf.numel() * buf.element_size()
+        payload = packed.numel() * packed.element_size()
+        stats.add(raw, payload, (world - 1) * payload, time.thread_time() - t0)
+
+        gathered = [torch.empty_like(packed) for _ in range(world)]
+        fut = dist.all_gather(gathered, packed, group=group, async_op=True).get_future()
+
+        def decode(f):
+            t1 = time.thread_time()
+            buf.zero_()
+            for part in gathered:
+                buf.index_add_(0, part[k:].view(torch.int32).long(), part[:k])
+            buf.div_(world)
+            stats.add_decode(time.thread_time() - t1)
+            return buf
+        return fut.then(decode)
+    return None, hook
+
+
+def make_hook(name, stats, group=None, topk_ratio=0.01, powersgd_rank=2, powersgd_start_iter=10):
+    """Return (state, hook) for model.register_comm_hook()."""
+    if name == 'none':
+        return allreduce_hook(stats, group)
+    if name == 'fp16':
+        return fp16_hook(stats, group)
+    if name == 'powersgd':
+        return powersgd_hook(stats, group, powersgd_rank, powersgd_start_iter)
+    if name == 'topk':
+        return topk_hook(stats, group, topk_ratio)
+    raise ValueError(f"Unknown compressor {name!r}; choose from {COMPRESSORS}")
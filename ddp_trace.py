@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+ddp_trace.py: Bucket-level DDP communication traces and replay schedules
+
+train.py --trace registers a comm hook that records, for every all-reduce
+bucket, its size and start/end time, plus the data/forward/backward/optimizer
+phases of every iteration. Records are fixed-size little-endian structs
+appended to a binary file:
+
+  header : b'DDPT' + uint16 version
+  record : uint8 kind, uint32 epoch, uint32 batch, uint32 bucket,
+           uint64 nbytes, float64 start_s, float64 end_s
+
+Times are seconds relative to the start of the iteration (the end of the
+previous one, so data loading is included). Convert a trace into a
+bucket-aware replay schedule for traffic_replay.py:
+
+  python3 ddp_trace.py trace_rank0.bin --out cifar_bucket_profile.csv
+"""
+import argparse
+import csv
+import struct
+import sys
+import time
+
+MAGIC = b'DDPT'
+VERSION = 1
+HEADER = struct.Struct('<4sH')
+RECORD = struct.Struct('<BIIIQdd')
+
+DATA, FORWARD, BACKWARD, OPTIMIZER, BUCKET = range(5)
+KIND_NAMES = {DATA: 'data', FORWARD: 'forward', BACKWARD: 'backward',
+              OPTIMIZER: 'optimizer', BUCKET: 'bucket'}
+
+
+class TraceWriter:
+    """Append phase and bucket records for one rank to a binary trace."""
+
+    def __init__(self, path):
+        self.f = open(path, 'wb', buffering=1 << 20)
+        self.f.write(HEADER.pack(MAGIC, VERSION))
+        self.epoch = 0
+        self.batch = 0
+        self.origin = time.perf_counter()
+
+    def begin_iteration(self, epoch, batch):
+        """Start a new iteration, recording the data-loading phase before it."""
+        self.epoch, self.batch = epoch, batch
+        self.phase(DATA, self.origin, time.perf_counter())
+
+    def end_iteration(self):
+        self.origin = time.perf_counter()
+
+    def phase(self, kind, start, end):
+        self.f.write(RECORD.pack(kind, self.epoch, self.batch, 0, 0,
+                                 start - self.origin, end - self.origin))
+
+    def bucket(self, index, nbytes, start, end):
+        self.f.write(RECORD.pack(BUCKET, self.epoch, self.batch, index, nbytes,
+                                 start - self.origin, end - self.origin))
+
+    def close(self):
+        self.f.close()
+
+
+def traced_hook(writer, inner):
+    """
+    Wrap a DDP comm hook so every bucket's size and timing is recorded.
+
+    The start time is taken when DDP hands the bucket to the hook (i.e. while
+    backward is still running for later buckets), the end time when the
+    collective's future completes.
+    """
+    def hook(state, bucket):
+        start = time.perf_counter()
+        buf = bucket.buffer()
+        nbytes = buf.numel() * buf.element_size()
+        index = bucket.index()
+        fut = inner(state, bucket)
+
+        def done(f):
+            writer.bucket(index, nbytes, start, time.perf_counter())
+            return f.value()
+        return fut.then(done)
+    return hook
+
+
+def read_trace(path):
+    """Yield (kind, epoch, batch, bucket, nbytes, start_s, end_s) tuples."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path}: not a DDP trace (magic={magic!r}, version={version})")
+    body = memoryview(data)[HEADER.size:]
+    usable = len(body) - len(body) % RECORD.size
+    return RECORD.iter_unpack(body[:usable])
+
+
+def to_schedule(records):
+    """
+    Turn trace records into replay rows, one per all-reduce bucket.
+
+    Each iteration is laid on a continuous timeline whose length is the time
+    its optimizer phase ended; every bucket is placed at its own start offset
+    inside the iteration. interval_s is the gap to the previous bucket, so
+    the existing replay client reproduces the overlap of communication with
+    backward instead of one monolithic transfer per batch.
+    """
+    iterations = {}
+    for kind, epoch, batch, bucket, nbytes, start, end in records:
+        it = iterations.setdefault((epoch, batch), {'length': 0.0, 'buckets': []})
+        if kind == BUCKET:
+            it['buckets'].append((start, bucket, nbytes))
+        it['length'] = max(it['length'], end)
+
+    rows = []
+    t_iter = 0.0
+    t_prev = 0.0
+    for (epoch, batch), it in sorted(iterations.items()):
+        for start, bucket, nbytes in sorted(it['buckets']):
+            t_send = t_iter + start
+            rows.append({'epoch': epoch, 'batch': batch,
+                         'interval_s': max(0.0, t_send - t_prev),
+                         'grad_bytes': nbytes, 'bucket': bucket})
+            t_prev = max(t_prev, t_send)
+        t_iter += it['length']
+    return rows
+
+
+def summarize(records):
+    phases = {}
+    buckets = {}
+    for kind, epoch, batch, bucket, nbytes, start, end in records:
+        if kind == BUCKET:
+            b = buckets.setdefault(bucket, [0, 0, 0.0])
+            b[0] += 1
+            b[1] = nbytes
+            b[2] += end - start
+        else:
+            p = phases.setdefault(KIND_NAMES[kind], [0, 0.0])
+            p[0] += 1
+            p[1] += end - start
+    for name, (n, total) in phases.items():
+        print(f"{name:>10}: {n} iterations, mean {total / n * 1000:.3f} ms")
+    for index, (n, nbytes, total) in sorted(buckets.items()):
+        print(f"bucket {index:>3}: {nbytes} bytes, mean all-reduce {total / n * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a DDP bucket trace to a replay schedule")
+    parser.add_argument('trace', type=str, help='Binary trace written by train.py --trace')
+    parser.add_argument('--out', type=str, default=None, help='Replay schedule CSV to write')
+    parser.add_argument('--summary', action='store_true', help='Print per-phase/bucket means')
+    args = parser.parse_args()
+
+    records = list(read_trace(args.trace))
+    if args.summary or not args.out:
+        summarize(records)
+    if args.out:
+        rows = to_schedule(records)
+        with open(args.out, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['epoch', 'batch', 'interval_s',
+                                                   'grad_bytes', 'bucket'])
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Wrote {len(rows)} bucket transfers to {args.out}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
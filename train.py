@@ -4,15 +4,165 @@ train.py: Distributed CIFAR-10 training using PyTorch DDP over Mininet
 Reverted to real CIFAR-10 + ResNet
 """
 import os
+import csv
+import json
 import time
 import argparse
+import statistics
 import torch
 import torch.distributed as dist
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Dataset
 from torch.utils.data.distributed import DistributedSampler
 from torchvision import datasets, transforms, models
+import comm_hooks
+import ddp_trace
+
+CIFAR_MEAN = (0.4914, 0.4822, 0.4465)
+CIFAR_STD  = (0.2023, 0.1994, 0.2010)
+CIFAR_ROOT = '/home/mininet/data'
+
+
+class ShmCIFAR10(Dataset):
+    """
+    CIFAR-10 served from one uint8 tensor shared by every rank on the machine.
+
+    Layout of the backing file: int64 sample count, then N*32*32*3 HWC
+    image bytes, then N label bytes. Images are converted and normalized on
+    access, so no DataLoader worker processes are needed.
+    """
+    def __init__(self, buf):
+        n = int.from_bytes(bytes(buf[:8].tolist()), 'little')
+        self.images = buf[8:8 + n * 3072].view(n, 32, 32, 3)
+        self.labels = buf[8 + n * 3072:8 + n * 3073]
+        self.mean = torch.tensor(CIFAR_MEAN).view(3, 1, 1)
+        self.std  = torch.tensor(CIFAR_STD).view(3, 1, 1)
+
+    def __len__(self):
+        return self.labels.numel()
+
+    def __getitem__(self, idx):
+        img = self.images[idx].permute(2, 0, 1).float().div_(255)
+        return img.sub_(self.mean).div_(self.std), int(self.labels[idx])
+
+
+class SyntheticCIFAR10(Dataset):
+    """Random CIFAR-shaped tensors generated once; no I/O, no augmentation."""
+    def __init__(self, length, pool=256, seed=0):
+        g = torch.Generator().manual_seed(seed)
+        self.length = length
+        self.images = torch.randn(pool, 3, 32, 32, generator=g)
+        self.labels = torch.randint(0, 10, (pool,), generator=g)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, idx):
+        idx = idx % self.images.shape[0]
+        return self.images[idx], int(self.labels[idx])
+
+
+def load_shared_cifar10(path, timeout=600):
+    """
+    Map the preloaded CIFAR-10 tensor at `path`, creating it if needed.
+
+    The first rank to grab `path`.lock decodes the dataset once and
+    publishes it with an atomic rename; every other rank waits for the file
+    and maps the same pages read-only. The lock is removed even when
+    decoding fails, and waiting ranks then fail instead of timing out.
+    """
+    if not os.path.exists(path):
+        try:
+            fd = os.open(path + '.lock', os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            fd = None
+        if fd is not None:
+            os.close(fd)
+            tmp = path + '.tmp'
+            try:
+                ds = datasets.CIFAR10(root=CIFAR_ROOT, train=True, download=False)
+                n = len(ds.targets)
+                with open(tmp, 'wb') as f:
+                    f.write(n.to_bytes(8, 'little'))
+                    f.write(ds.data.tobytes())
+                    f.write(bytes(ds.targets))
+                os.replace(tmp, path)
+            finally:
+                # never leave a lock behind for later runs to wait on
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                os.remove(path + '.lock')
+        else:
+            deadline = time.time() + timeout
+            while not os.path.exists(path):
+                if not os.path.exists(path + '.lock') and not os.path.exists(path):
+                    raise RuntimeError(f"The rank decoding {path} failed; see its log")
+                if time.time() > deadline:
+                    raise TimeoutError(f"Shared dataset {path} never appeared after {timeout}s; "
+                                       f"if no rank is decoding it, remove the stale {path}.lock")
+                time.sleep(0.5)
+    size = os.path.getsize(path)
+    return ShmCIFAR10(torch.from_file(path, shared=False, size=size, dtype=torch.uint8))
+
+
+def build_dataset(args):
+    """Return (dataset, DataLoader kwargs) for the selected --data-mode."""
+    if args.data_mode == 'synthetic':
+        return SyntheticCIFAR10(args.synthetic_samples), {'num_workers': 0}
+    if args.data_mode == 'shm':
+        return load_shared_cifar10(args.shm_path), {'num_workers': 0}
+    transform = transforms.Compose([
+        transforms.ToTensor(),
+        transforms.Normalize(CIFAR_MEAN, CIFAR_STD),
+    ])
+    train_dataset = datasets.CIFAR10(
+        root=CIFAR_ROOT,
+        train=True,
+        download=False,
+        transform=transform
+    )
+    return train_dataset, {'num_workers': 2, 'pin_memory': True}
+
+
+def build_eval_dataset(args):
+    """Held-out set for time-to-accuracy; synthetic mode evaluates on noise."""
+    if args.data_mode == 'synthetic':
+        return SyntheticCIFAR10(10000, seed=1)
+    transform = transforms.Compose([
+        transforms.ToTensor(),
+        transforms.Normalize(CIFAR_MEAN, CIFAR_STD),
+    ])
+    return datasets.CIFAR10(root=CIFAR_ROOT, train=False, download=False, transform=transform)
+
+
+def evaluate(model, loader):
+    """Top-1 accuracy over all ranks' shards of the eval set."""
+    model.eval()
+    counts = torch.zeros(2)
+    with torch.no_grad():
+        for inputs, targets in loader:
+            preds = model(inputs).argmax(dim=1)
+            counts[0] += (preds == targets).sum().item()
+            counts[1] += targets.numel()
+    dist.all_reduce(counts)
+    model.train()
+    return (counts[0] / counts[1]).item() if counts[1] else 0.0
+
+def apply_tuned_config(args):
+    """Override DDP options with the winner stored for --net_profile, if any."""
+    if not args.tuned_config or not os.path.exists(args.tuned_config):
+        return
+    with open(args.tuned_config) as f:
+        tuned = json.load(f).get(args.net_profile)
+    if not tuned:
+        print(f"No tuned DDP config for profile {args.net_profile!r}", flush=True)
+        return
+    best = tuned['config']
+    args.bucket_cap_mb = best['bucket_cap_mb']
+    args.gradient_as_bucket_view = best['gradient_as_bucket_view']
+    args.static_graph = best['static_graph']
+    print(f"Using tuned DDP config for {args.net_profile!r}: {best}", flush=True)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -22,9 +172,51 @@ def main():
     parser.add_argument('--world_size',  type=int,   required=True, help='Total number of processes')
     parser.add_argument('--master_addr', type=str,   required=True, help='IP of rank 0 (master)')
     parser.add_argument('--master_port', type=int,   required=True, help='Port for initialization')
+    parser.add_argument('--ifname',      type=str,   default=None,
+                        help='Interface for gloo (default: h<rank+1>-eth0)')
+    parser.add_argument('--progress_every', type=int, default=0,
+                        help='Every rank prints a PROGRESS line every N steps (0: off)')
     parser.add_argument('--epochs',      type=int,   default=5,    help='Number of epochs')
     parser.add_argument('--batch_size',  type=int,   default=64,   help='Batch size per process')
+    parser.add_argument('--trace',       type=str,   default=None,
+                        help='Write a binary bucket/phase trace (use {rank} in the path)')
+    parser.add_argument('--data_mode',   choices=['disk', 'shm', 'synthetic'], default='disk',
+                        help='disk: CIFAR-10 via DataLoader workers; shm: preloaded once into '
+                             'a shared-memory tensor; synthetic: random tensors, no I/O')
+    parser.add_argument('--shm_path',    type=str,   default='/dev/shm/cifar10_train.u8',
+                        help='Backing file of the shared dataset (shm mode)')
+    parser.add_argument('--synthetic_samples', type=int, default=50000,
+                        help='Samples per epoch in synthetic mode')
+    parser.add_argument('--model',       choices=['resnet18', 'resnet34', 'resnet50', 'resnet101'],
+                        default='resnet18', help='Model (sets gradient size)')
+    parser.add_argument('--compression', choices=comm_hooks.COMPRESSORS, default='none',
+                        help='DDP comm hook used for gradient exchange')
+    parser.add_argument('--topk_ratio',  type=float, default=0.01,
+                        help='Fraction of gradient entries kept by top-k')
+    parser.add_argument('--powersgd_rank', type=int, default=2,
+                        help='Matrix approximation rank for PowerSGD')
+    parser.add_argument('--powersgd_start_iter', type=int, default=10,
+                        help='Iterations of plain all-reduce before PowerSGD starts')
+    parser.add_argument('--target_acc',  type=float, default=None,
+                        help='Report wall time until eval accuracy reaches this value (0-1)')
+    parser.add_argument('--metrics_csv', type=str,   default=None,
+                        help='Rank 0 writes per-epoch time, accuracy and traffic here')
+    parser.add_argument('--bucket_cap_mb', type=float, default=25,
+                        help='DDP gradient bucket size in MB')
+    parser.add_argument('--gradient_as_bucket_view', action='store_true',
+                        help='Let gradients alias DDP bucket storage')
+    parser.add_argument('--static_graph', action='store_true',
+                        help='Declare the DDP graph static')
+    parser.add_argument('--tuned_config', type=str,  default=None,
+                        help='Tuning file written by autotune_ddp.py')
+    parser.add_argument('--net_profile', type=str,   default=None,
+                        help='Network profile key to look up in --tuned_config')
+    parser.add_argument('--max_steps',   type=int,   default=None,
+                        help='Stop after this many iterations (trial windows)')
+    parser.add_argument('--warmup_steps', type=int,  default=5,
+                        help='Iterations excluded from the steady-state step time')
     args = parser.parse_args()
+    apply_tuned_config(args)
 
     # Debug: received arguments
     print(
@@ -36,7 +228,7 @@ def main():
     # Set environment variables for Gloo
     os.environ['MASTER_ADDR'] = args.master_addr
     os.environ['MASTER_PORT'] = str(args.master_port)
-    os.environ['GLOO_SOCKET_IFNAME'] = f"h{args.rank+1}-eth0"
+    os.environ['GLOO_SOCKET_IFNAME'] = args.ifname or f"h{args.rank+1}-eth0"
 
     # Initialize process group
     init_method = f"tcp://{args.master_addr}:{args.master_port}"
@@ -53,18 +245,8 @@ def main():
             f">>> Entering training loop for {args.epochs} epochs", flush=True
         )
 
-    # Data transforms and dataset
-    transform = transforms.Compose([
-        transforms.ToTensor(),
-        transforms.Normalize((0.4914, 0.4822, 0.4465),
-                             (0.2023, 0.1994, 0.2010)),
-    ])
-    train_dataset = datasets.CIFAR10(
-        root='/home/mininet/data',
-        train=True,
-        download=False,
-        transform=transform
-    )
+    # Dataset
+    train_dataset, loader_kwargs = build_dataset(args)
     sampler = DistributedSampler(
         train_dataset, num_replicas=args.world_size, rank=args.rank
     )
@@ -72,13 +254,43 @@ def main():
         train_dataset,
         batch_size=args.batch_size,
         sampler=sampler,
-        num_workers=2,
-        pin_memory=True
+        **loader_kwargs
     )
 
     # Model, criterion, optimizer
-    model = models.resnet18(num_classes=10)
-    model = nn.parallel.DistributedDataParallel(model)
+    model = getattr(models, args.model)(num_classes=10)
+    model = nn.parallel.DistributedDataParallel(
+        model,
+        bucket_cap_mb=args.bucket_cap_mb,
+        gradient_as_bucket_view=args.gradient_as_bucket_view,
+        static_graph=args.static_graph
+    )
+    tracer = None
+    stats = comm_hooks.CommStats()
+    if args.trace or args.metrics_csv or args.compression != 'none':
+        state, hook = comm_hooks.make_hook(
+            args.compression, stats,
+            topk_ratio=args.topk_ratio,
+            powersgd_rank=args.powersgd_rank,
+            powersgd_start_iter=args.powersgd_start_iter
+        )
+        if args.trace:
+            tracer = ddp_trace.TraceWriter(args.trace.format(rank=args.rank))
+            hook = ddp_trace.traced_hook(tracer, hook)
+        model.register_comm_hook(state=state, hook=hook)
+    eval_loader = None
+    if args.target_acc is not None or args.metrics_csv:
+        eval_dataset = build_eval_dataset(args)
+        eval_loader = DataLoader(
+            eval_dataset,
+            batch_size=256,
+            sampler=DistributedSampler(eval_dataset, num_replicas=args.world_size,
+                                       rank=args.rank, shuffle=False)
+        )
+    metrics = []
+    time_to_acc = None
+    step_times = []
+    step = 0
     criterion = nn.CrossEntropyLoss()
     optimizer = optim.SGD(
         model.parameters(), lr=0.01, momentum=0.9
@@ -87,26 +299,92 @@ def main():
     # Training loop
     start_time = time.time()
     for epoch in range(args.epochs):
+        if args.max_steps is not None and step >= args.max_steps:
+            break
         if args.rank == 0:
             print(f"--- Starting epoch {epoch+1}/{args.epochs}", flush=True)
         sampler.set_epoch(epoch)
         total_loss = 0.0
-        for inputs, targets in loader:
+        n_batches = 0
+        epoch_start = time.time()
+        stats.reset()
+        if tracer:
+            tracer.end_iteration()
+        for batch, (inputs, targets) in enumerate(loader):
+            if args.max_steps is not None and step >= args.max_steps:
+                break
+            t_step = time.perf_counter()
+            if tracer:
+                tracer.begin_iteration(epoch + 1, batch)
+                t0 = time.perf_counter()
             optimizer.zero_grad()
             outputs = model(inputs)
             loss = criterion(outputs, targets)
+            if tracer:
+                t1 = time.perf_counter()
             loss.backward()
+            if tracer:
+                t2 = time.perf_counter()
             optimizer.step()
+            if tracer:
+                t3 = time.perf_counter()
+                tracer.phase(ddp_trace.FORWARD, t0, t1)
+                tracer.phase(ddp_trace.BACKWARD, t1, t2)
+                tracer.phase(ddp_trace.OPTIMIZER, t2, t3)
+                tracer.end_iteration()
+            stats.end_iteration()
             total_loss += loss.item()
+            n_batches += 1
+            step += 1
+            if step > args.warmup_steps:
+                step_times.append(time.perf_counter() - t_step)
+            if args.progress_every and step % args.progress_every == 0:
+                print(f"PROGRESS rank={args.rank} epoch={epoch+1} step={step}", flush=True)
+        epoch_time = time.time() - epoch_start
+        acc = evaluate(model, eval_loader) if eval_loader else None
+        if acc is not None and time_to_acc is None and args.target_acc is not None \
+                and acc >= args.target_acc:
+            time_to_acc = time.time() - start_time
         if args.rank == 0:
-            avg_loss = total_loss / len(loader)
+            avg_loss = total_loss / max(1, n_batches)
             print(f"Epoch {epoch+1}, Avg Loss: {avg_loss:.4f}", flush=True)
+            traffic = stats.summary()
+            print(
+                f"Epoch {epoch+1} time: {epoch_time:.2f}s"
+                + (f", Acc: {acc:.4f}" if acc is not None else "")
+                + f", wire: {traffic['wire_bytes_per_iter'] / 1e6:.3f} MB/iter"
+                f" (x{traffic['compression_ratio']:.1f} compression)"
+                f", encode: {traffic['encode_ms_per_iter']:.2f} ms/iter"
+                f", decode: {traffic['decode_ms_per_iter']:.2f} ms/iter",
+                flush=True
+            )
+            metrics.append(dict(epoch=epoch + 1, epoch_time_s=round(epoch_time, 4),
+                                avg_loss=round(avg_loss, 6),
+                                accuracy='' if acc is None else round(acc, 6),
+                                elapsed_s=round(time.time() - start_time, 4),
+                                compression=args.compression, **traffic))
 
     # Synchronize and finalize
+    if tracer:
+        tracer.close()
     dist.barrier()
     if args.rank == 0:
         elapsed = time.time() - start_time
         print(f"All done! Total training time: {elapsed:.2f}s", flush=True)
+        if args.target_acc is not None:
+            if time_to_acc is None:
+                print(f"Target accuracy {args.target_acc:.4f} not reached", flush=True)
+            else:
+                print(f"Time-to-accuracy ({args.target_acc:.4f}): {time_to_acc:.2f}s", flush=True)
+        if step_times:
+            print(f"STEP_TIME mean_s={statistics.mean(step_times):.6f} "
+                  f"median_s={statistics.median(step_times):.6f} steps={len(step_times)}",
+                  flush=True)
+        if args.metrics_csv and metrics:
+            with open(args.metrics_csv, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(metrics[0].keys()))
+                writer.writeheader()
+                writer.writerows(metrics)
     dist.destroy_process_group()
 
 if __name__ == '__main__':
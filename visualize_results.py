@@ -2,11 +2,25 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+import json
 import os
 
 # Define paths to result directories
 results_path = "results"
 
+# Runs whose fidelity.json (written by Code/fidelity.py) marks them invalid were
+# bottlenecked by the emulator rather than the network and are left out
+def run_is_valid(directory):
+    fidelity_file = os.path.join(results_path, directory, "fidelity.json")
+    if not os.path.exists(fidelity_file):
+        return True
+    with open(fidelity_file) as f:
+        verdict = json.load(f)
+    if not verdict.get("valid", True):
+        print(f"Skipping {directory}: {'; '.join(verdict.get('reasons', []))}")
+        return False
+    return True
+
 # Function to load latency data
 def load_latency_data(directory):
     latency_file = os.path.join(results_path, directory, "latencies.csv")
@@ -64,6 +78,8 @@ throughput_data = {}
 latency_stats = {}
 
 for name, directory in directories.items():
+    if not run_is_valid(directory):
+        continue
     df = load_latency_data(directory)
     if df is not None:
         latency_data[name] = df["latency_s"].values